@@ -0,0 +1,178 @@
+"""
+ASGI against WSGI benchmark of read-heavy pages at high concurrency.
+
+Run from sms/ directory:
+    pytest benchmarks/bench_asgi.py -s
+
+Both applications are driven in process, without a network server: the ASGI application
+(sms.asgi, as uvicorn would call it) with SMS_BENCH_CONCURRENCY concurrent requests on one event loop,
+the WSGI application (sms.wsgi) from a pool of SMS_BENCH_CONCURRENCY threads, like a threaded WSGI server.
+Every page is requested SMS_BENCH_REQUESTS times (default 500) against a generated school of size
+SMS_BENCH_SIZE (default 'medium'). Each page is measured three ways: synchronous view under WSGI,
+synchronous view under ASGI and its async version under ASGI. Results are saved to
+benchmarks/results/asgi.json.
+
+Numbers depend heavily on the database: SQLite serializes access, PostgreSQL with a connection per
+worker shows the difference better.
+"""
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.urls import reverse
+
+from main_app.synthetic import seed
+
+HERE = Path(__file__).resolve().parent
+SIZE = os.environ.get('SMS_BENCH_SIZE', 'medium')
+CONCURRENCY = int(os.environ.get('SMS_BENCH_CONCURRENCY', 50))
+REQUESTS = int(os.environ.get('SMS_BENCH_REQUESTS', 500))
+RESULTS_DIR = Path(os.environ.get('SMS_BENCH_RESULTS', HERE / 'results'))
+HOST = 'testserver'
+
+# label -> (synchronous url name, async url name, kwargs built from the seeded school)
+PAGES = {
+    'index': ('index', 'async-index', lambda school: {}),
+    'teacher-list': ('teacher-list', 'async-teacher-list', lambda school: {}),
+    'student-list': ('student-list', 'async-student-list', lambda school: {}),
+    'class-list': ('class-list', 'async-class-list', lambda school: {}),
+    'student-details': ('student-details', 'async-student-details',
+                        lambda school: {'student_id': school.student_id}),
+    'class-details': ('class-details', 'async-class-details', lambda school: {'class_id': school.class_id}),
+}
+
+
+def run_wsgi(application, path, cookie):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    result = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(status[0].split()[0])
+
+
+async def run_asgi(application, path, cookie):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': (HOST, 80),
+    }
+    body_sent = False
+    status = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # client never disconnects, the handler cancels this wait when the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def wsgi_rps(path, cookie):
+    application = get_wsgi_application()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        start = time.perf_counter()
+        statuses = list(pool.map(lambda _: run_wsgi(application, path, cookie), range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+    return REQUESTS / elapsed, statuses
+
+
+def asgi_rps(path, cookie):
+    application = get_asgi_application()
+
+    async def load():
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def one():
+            async with semaphore:
+                return await run_asgi(application, path, cookie)
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(one() for _ in range(REQUESTS)))
+        return REQUESTS / (time.perf_counter() - start), statuses
+
+    return asyncio.run(load())
+
+
+# data has to be committed, requests are served by other threads with their own connections
+@pytest.mark.django_db(transaction=True)
+def test_asgi_against_wsgi(client, django_user_model, settings):
+    # sync pages would be served from the page cache, async ones are not cached
+    settings.PAGE_CACHE_TIMEOUT = 0
+    school = seed(SIZE)
+    user = django_user_model.objects.create_user(username='bench', password='bench')
+    client.force_login(user)
+    cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    results = {}
+    for label, (sync_name, async_name, kwargs) in PAGES.items():
+        sync_path = reverse(sync_name, kwargs=kwargs(school))
+        async_path = reverse(async_name, kwargs=kwargs(school))
+        measured = {
+            'wsgi_sync': wsgi_rps(sync_path, cookie),
+            'asgi_sync': asgi_rps(sync_path, cookie),
+            'asgi_async': asgi_rps(async_path, cookie),
+        }
+        for mode, (rps, statuses) in measured.items():
+            assert set(statuses) == {200}, f'{label} {mode}: {sorted(set(statuses))}'
+        results[label] = {mode: round(rps, 1) for mode, (rps, _) in measured.items()}
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    (RESULTS_DIR / 'asgi.json').write_text(json.dumps({
+        'size': SIZE,
+        'counts': school.counts,
+        'concurrency': CONCURRENCY,
+        'requests': REQUESTS,
+        'database': connection.vendor,
+        'results': results,
+    }, indent=2))
+
+    print(f'\n{SIZE}, {REQUESTS} requests per page, concurrency {CONCURRENCY}, requests per second')
+    print(f'{"page":<18}{"wsgi sync":>11}{"asgi sync":>11}{"asgi async":>12}')
+    for label, result in results.items():
+        print(f'{label:<18}{result["wsgi_sync"]:>11.1f}{result["asgi_sync"]:>11.1f}{result["asgi_async"]:>12.1f}')
@@ -0,0 +1,88 @@
+"""
+Session and authentication benchmark: queries made by a logged in request before the view runs.
+
+Run from sms/ directory:
+    pytest benchmarks/bench_auth.py -s
+
+Pages of a small generated school are requested SMS_BENCH_REPEAT times (default 20) by a client which
+logged in once, for every combination of session engine and user cache (AUTH_USER_CACHE_TIMEOUT). The page
+cache is turned off, so the difference between modes is the cost of reading the session and the user.
+Results are saved to benchmarks/results/auth.json.
+"""
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main_app.synthetic import seed
+
+HERE = Path(__file__).resolve().parent
+REPEAT = int(os.environ.get('SMS_BENCH_REPEAT', 20))
+RESULTS_DIR = Path(os.environ.get('SMS_BENCH_RESULTS', HERE / 'results'))
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+USER_CACHE_TIMEOUTS = (0, 30)
+PAGES = ('index', 'class-list', 'student-list')
+
+
+def measure(client, path):
+    queries, timings = [], []
+    for _ in range(REPEAT):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, f'{path}: {response.status_code}'
+        queries.append(len(captured))
+    return {'queries': statistics.median(queries), 'median_ms': round(statistics.median(timings), 3)}
+
+
+def test_auth_modes(db, settings, django_user_model):
+    school = seed('small')
+    django_user_model.objects.create_user(username='bench', password='bench')
+    paths = {name: reverse(name) for name in PAGES}
+    paths['class-details'] = reverse('class-details', kwargs={'class_id': school.class_id})
+    settings.PAGE_CACHE_TIMEOUT = 0
+    # one login per mode, more than the username bucket allows
+    settings.LOGIN_THROTTLE = {}
+
+    results = {}
+    for engine, engine_path in SESSION_ENGINES.items():
+        for timeout in USER_CACHE_TIMEOUTS:
+            settings.SESSION_ENGINE = engine_path
+            settings.AUTH_USER_CACHE_TIMEOUT = timeout
+            cache.clear()
+            client = Client()
+            assert client.post(reverse('login'), {'uname': 'bench', 'psw': 'bench'}).status_code == 302
+            mode = f'{engine}+user_cache' if timeout else engine
+            results[mode] = {label: measure(client, path) for label, path in paths.items()}
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    (RESULTS_DIR / 'auth.json').write_text(json.dumps({
+        'repeat': REPEAT,
+        'database': connection.vendor,
+        'results': results,
+    }, indent=2))
+
+    baseline = results['db']
+    print(f'\n{"mode":<28}' + ''.join(f'{label:>22}' for label in paths))
+    for mode, pages in results.items():
+        cells = [f'{pages[label]["queries"]:g}q/{pages[label]["median_ms"]:.2f}ms' for label in paths]
+        print(f'{mode:<28}' + ''.join(f'{cell:>22}' for cell in cells))
+    print('queries saved per request against db sessions: ' + ', '.join(
+        f'{mode} {baseline["index"]["queries"] - pages["index"]["queries"]:g}' for mode, pages in results.items()))
+
+    best = results['cached_db+user_cache']
+    for label in paths:
+        assert best[label]['queries'] <= baseline[label]['queries'] - 2, label
@@ -0,0 +1,67 @@
+"""
+Search benchmark: indexed name keys against icontains scans.
+
+Run from sms/ directory:
+    pytest benchmarks/bench_search.py -s
+Number of seeded people can be changed with SMS_BENCH_PEOPLE (default 100000).
+"""
+import os
+import random
+import statistics
+import time
+
+import pytest
+from django.db.models import Q
+
+from main_app.models import Student
+from main_app.search import search
+
+PEOPLE = int(os.environ.get('SMS_BENCH_PEOPLE', 100_000))
+REPEAT = 20
+
+FIRST_NAMES = ['Łukasz', 'Jan', 'Anna', 'Małgorzata', 'Paweł', 'Zofia', 'Michał', 'Agnieszka', 'Krzysztof', 'Ewa',
+               'Tomasz', 'Katarzyna', 'Piotr', 'Joanna', 'Wojciech', 'Magdalena', 'Jakub', 'Żaneta', 'Marcin', 'Ola']
+SYLLABLES = ['ko', 'wal', 'ski', 'no', 'wak', 'wiś', 'niew', 'zie', 'liń', 'dąb', 'row', 'ska', 'pa', 'łec',
+             'szy', 'mań', 'czyk', 'kie', 'wicz', 'jan', 'ów', 'ża', 'cio', 'rek', 'bro', 'gór', 'ny', 'ści']
+QUERIES = ['lukasz', 'Kowal', 'zofia dab', 'Wisniewska', 'malgorzta', 'szymanski']
+
+
+def _last_name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()[:32]
+
+
+@pytest.fixture
+def people(db):
+    rng = random.Random(2022)
+    batch = []
+    for _ in range(PEOPLE):
+        student = Student(first_name=rng.choice(FIRST_NAMES), last_name=_last_name(rng), gender='M', age=17)
+        student.update_search_key()
+        batch.append(student)
+    Student.objects.bulk_create(batch, batch_size=5000)
+    return PEOPLE
+
+
+def _icontains(query):
+    condition = Q()
+    for word in query.split():
+        condition &= Q(first_name__icontains=word) | Q(last_name__icontains=word)
+    return list(Student.objects.filter(condition)[:20])
+
+
+def _median_ms(function, query):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def test_search_against_icontains(people):
+    print(f'\n{people} people, median of {REPEAT} runs')
+    print(f'{"query":<14}{"indexed ms":>12}{"icontains ms":>14}{"hits":>6}')
+    for query in QUERIES:
+        indexed = _median_ms(lambda q: search(Student, q), query)
+        scan = _median_ms(_icontains, query)
+        print(f'{query:<14}{indexed:>12.2f}{scan:>14.2f}{len(search(Student, query)):>6}')
@@ -0,0 +1,195 @@
+"""
+View benchmark: every URL of sms/urls.py against generated schools of growing size.
+
+Run from sms/ directory:
+    pytest benchmarks/bench_views.py -s
+
+For every URL the number of queries and the median wall time of SMS_BENCH_REPEAT requests (default 5) are
+saved to benchmarks/results/views_<size>.json. Sizes come from SMS_BENCH_SIZES (default 'small,medium',
+see main_app.synthetic.SIZES). When a baseline file exists in SMS_BENCH_BASELINE directory (default
+benchmarks/baseline), the run fails if any page makes more queries than in the baseline and reports pages
+which got slower than SMS_BENCH_TOLERANCE times (default 1.5). A run is promoted to the baseline by copying
+its result files there. Cached pages (PAGE_CACHE_TIMEOUT) are measured without the cache, SMS_BENCH_PAGE_CACHE=1
+keeps it on and then medians show cache hits.
+"""
+import json
+import os
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import django
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from main_app.api import RESOURCES
+from main_app.exports import EXPORTS
+from main_app.synthetic import SIZES, seed
+
+HERE = Path(__file__).resolve().parent
+SIZES_TO_RUN = os.environ.get('SMS_BENCH_SIZES', 'small,medium').split(',')
+REPEAT = int(os.environ.get('SMS_BENCH_REPEAT', 5))
+RESULTS_DIR = Path(os.environ.get('SMS_BENCH_RESULTS', HERE / 'results'))
+BASELINE_DIR = Path(os.environ.get('SMS_BENCH_BASELINE', HERE / 'baseline'))
+TOLERANCE = float(os.environ.get('SMS_BENCH_TOLERANCE', 1.5))
+PAGE_CACHE = os.environ.get('SMS_BENCH_PAGE_CACHE') == '1'
+# differences below this are noise, whatever the ratio
+MIN_SLOWDOWN_MS = 5
+
+SKIPPED = {'favicon.ico'}
+
+# url name -> list of (label, kwargs) built from the seeded school
+URL_KWARGS = {
+    'teacher-delete': lambda school: [('', {'pk': school.teacher_id})],
+    'student-delete': lambda school: [('', {'pk': school.student_id})],
+    'student-details': lambda school: [('', {'student_id': school.student_id})],
+    'async-student-details': lambda school: [('', {'student_id': school.student_id})],
+    'class-modify': lambda school: [('', {'pk': school.class_id})],
+    'class-details': lambda school: [('', {'class_id': school.class_id})],
+    'async-class-details': lambda school: [('', {'class_id': school.class_id})],
+    'roll-call': lambda school: [('', {'class_id': school.class_id})],
+    'gradebook': lambda school: [('', {'class_id': school.class_id})],
+    'class-grades': lambda school: [('', {'class_id': school.class_id})],
+    'archive-details': lambda school: [],
+    # the seeded school has no background jobs
+    'job-details': lambda school: [],
+    'job-status': lambda school: [],
+    'job-retry': lambda school: [],
+    'job-download': lambda school: [],
+    'export': lambda school: [(f':{kind}', {'kind': kind}) for kind in EXPORTS],
+    'api-list': lambda school: [(f':{name}', {'resource': name}) for name in RESOURCES],
+}
+
+# url name -> query string, for pages which show nothing interesting without parameters
+URL_QUERY = {
+    'search': lambda school: 'q=nowak',
+    'attendance-report': lambda school: f'school_class={school.class_id}',
+    'grades-list': lambda school: f'school_class={school.class_id}',
+    'class-grades': lambda school: f'subject={school.subject_id}',
+}
+
+
+def _named_patterns(patterns, namespace=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace == 'admin':
+                continue
+            yield from _named_patterns(pattern.url_patterns, f'{namespace}{pattern.namespace}:'
+                                       if pattern.namespace else namespace)
+        elif isinstance(pattern, URLPattern):
+            yield pattern, f'{namespace}{pattern.name}' if pattern.name else None
+
+
+def urls(school):
+    """
+    Function that lists all URLs of the project with arguments pointing to seeded rows
+    :param school: SyntheticSchool
+    :return: list of (label, path)
+    """
+    result = []
+    for pattern, name in _named_patterns(get_resolver().url_patterns):
+        if str(pattern.pattern) in SKIPPED:
+            continue
+        assert name, f'URL {pattern.pattern} has no name, it can not be benchmarked'
+        if pattern.pattern.converters:
+            assert name in URL_KWARGS, f'Add arguments of URL {name} to URL_KWARGS'
+            variants = URL_KWARGS[name](school)
+        else:
+            variants = [('', {})]
+        query = URL_QUERY[name](school) if name in URL_QUERY else ''
+        for suffix, kwargs in variants:
+            path = reverse(name, kwargs=kwargs)
+            result.append((f'{name}{suffix}', f'{path}?{query}' if query else path))
+    return result
+
+
+def measure(client, user, path):
+    """
+    Function that requests the page REPEAT times, the first request is also used to count queries
+    :return: dict with status, queries and timings in milliseconds
+    """
+    timings = []
+    queries = None
+    status = None
+    for _ in range(REPEAT):
+        # logout/ ends the session, every request starts logged in
+        client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            else:
+                response.content
+            timings.append((time.perf_counter() - start) * 1000)
+        if queries is None:
+            queries, status = len(captured), response.status_code
+    return {
+        'path': path,
+        'status': status,
+        'queries': queries,
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def compare(results, baseline):
+    """
+    Function that compares results with baseline
+    :return: (pages with more queries, pages slower than tolerance), lists of messages
+    """
+    more_queries, slower = [], []
+    for label, result in results.items():
+        before = baseline.get(label)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            more_queries.append(f'{label}: {before["queries"]} -> {result["queries"]} queries')
+        if result['median_ms'] > before['median_ms'] * TOLERANCE \
+                and result['median_ms'] - before['median_ms'] > MIN_SLOWDOWN_MS:
+            slower.append(f'{label}: {before["median_ms"]:.1f} -> {result["median_ms"]:.1f} ms')
+    return more_queries, slower
+
+
+@pytest.mark.parametrize('size', SIZES_TO_RUN)
+def test_views(size, client, django_user_model, db, settings):
+    assert size in SIZES, f'Unknown size {size}, available: {", ".join(SIZES)}'
+    if not PAGE_CACHE:
+        settings.PAGE_CACHE_TIMEOUT = 0
+    school = seed(size)
+    user = django_user_model.objects.create_user(username='bench', password='bench')
+
+    results = {label: measure(client, user, path) for label, path in urls(school)}
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    report = {
+        'size': size,
+        'counts': school.counts,
+        'repeat': REPEAT,
+        'created': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    (RESULTS_DIR / f'views_{size}.json').write_text(json.dumps(report, indent=2))
+
+    print(f'\n{size}: {", ".join(f"{v} {k}" for k, v in school.counts.items())}')
+    print(f'{"url":<28}{"status":>7}{"queries":>9}{"median ms":>11}')
+    for label, result in results.items():
+        print(f'{label:<28}{result["status"]:>7}{result["queries"]:>9}{result["median_ms"]:>11.2f}')
+
+    errors = [f'{label}: {result["status"]}' for label, result in results.items() if result['status'] >= 500]
+    assert not errors, f'Pages failed: {errors}'
+
+    baseline_file = BASELINE_DIR / f'views_{size}.json'
+    if baseline_file.exists():
+        more_queries, slower = compare(results, json.loads(baseline_file.read_text())['results'])
+        for message in slower:
+            print(f'slower than baseline: {message}')
+        assert not more_queries, f'More queries than in baseline: {more_queries}'
@@ -0,0 +1,159 @@
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
+
+from .models import Grades, PresenceList, SchoolClass, Student, Subject, Teacher
+from .pagination import InvalidCursor, KeysetPaginator, get_page_size
+from .versioning import model_versions
+
+API_VERSION = 'v1'
+
+
+@dataclass
+class Resource:
+    """
+    Collection exposed by the API.
+
+    Attributes
+    model : Model
+        model of the collection
+    fields : dict
+        name in json -> ORM path, rows are read with .values()
+    relations : dict
+        name in json -> (through model, column pointing to the model, column with related ids)
+    filters : dict
+        query param -> ORM lookup, exact match
+    depends_on : tuple
+        models whose changes invalidate ETag of the collection
+    """
+    model: type
+    fields: dict
+    relations: dict = field(default_factory=dict)
+    filters: dict = field(default_factory=dict)
+    depends_on: tuple = ()
+
+    def values(self, names):
+        plain = [self.fields[name] for name in names if self.fields[name] == name]
+        expressions = {name: F(self.fields[name]) for name in names if self.fields[name] != name}
+        return self.model.objects.values(*plain, **expressions)
+
+    def relation_ids(self, name, ids):
+        through, source, target = self.relations[name]
+        related = defaultdict(list)
+        for source_id, target_id in through.objects.filter(**{f'{source}__in': ids}) \
+                .values_list(source, target).order_by(source, target):
+            related[source_id].append(target_id)
+        return related
+
+
+RESOURCES = {
+    'students': Resource(
+        model=Student,
+        fields={'id': 'id', 'first_name': 'first_name', 'last_name': 'last_name', 'gender': 'gender', 'age': 'age',
+                'school_class_id': 'school_class_id', 'class_name': 'school_class__name',
+                'class_year': 'school_class__year'},
+        filters={'school_class': 'school_class_id'},
+        depends_on=(Student, SchoolClass),
+    ),
+    'teachers': Resource(
+        model=Teacher,
+        fields={'id': 'id', 'first_name': 'first_name', 'last_name': 'last_name', 'gender': 'gender'},
+        relations={'subjects': (Teacher.subject.through, 'teacher_id', 'subject_id')},
+        depends_on=(Teacher,),
+    ),
+    'classes': Resource(
+        model=SchoolClass,
+        fields={'id': 'id', 'name': 'name', 'year': 'year'},
+        filters={'year': 'year'},
+        depends_on=(SchoolClass,),
+    ),
+    'subjects': Resource(
+        model=Subject,
+        fields={'id': 'id', 'name': 'name'},
+        depends_on=(Subject,),
+    ),
+    'grades': Resource(
+        model=Grades,
+        fields={'id': 'id', 'grade': 'grade', 'weight': 'weight', 'date': 'date', 'subject_id': 'subject_id',
+                'subject_name': 'subject__name', 'student_id': 'student_id'},
+        relations={'topics': (Grades.topic.through, 'grades_id', 'schoolsubjecttopics_id')},
+        filters={'subject': 'subject_id', 'date': 'date', 'student': 'student_id'},
+        depends_on=(Grades, Subject),
+    ),
+    'presence': Resource(
+        model=PresenceList,
+        fields={'id': 'id', 'student_id': 'student_id', 'day': 'day', 'present': 'present'},
+        filters={'student': 'student_id', 'day': 'day'},
+        depends_on=(PresenceList,),
+    ),
+}
+
+
+class ApiListView(LoginRequiredMixin, View):
+    """
+    Read-only json collection: /api/v1/<resource>?fields=a,b&cursor=...&page_size=...
+
+    Rows are serialized straight from .values(), related ids are fetched with one query per relation
+    and page. ETag and Last-Modified come from model version stamps kept in cache, so a conditional
+    request for unchanged collection is answered with 304 before any query for the data.
+    """
+    raise_exception = True
+
+    def get(self, request, resource):
+        if resource not in RESOURCES:
+            raise Http404('Nieznany zasób')
+        resource = RESOURCES[resource]
+
+        available = list(resource.fields) + list(resource.relations)
+        names = request.GET['fields'].split(',') if request.GET.get('fields') else available
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            return HttpResponseBadRequest(f'Nieznane pola: {", ".join(unknown)}')
+
+        versions = model_versions(*resource.depends_on).values()
+        last_modified = max(versions) // 10 ** 9
+        etag = '"{}"'.format(hashlib.md5(
+            f'{API_VERSION}:{request.path}:{request.GET.urlencode()}:{sorted(versions)}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        columns = [name for name in names if name in resource.fields]
+        queryset = resource.values(set(columns) | {'id'})
+        try:
+            for param, lookup in resource.filters.items():
+                if param in request.GET:
+                    queryset = queryset.filter(**{lookup: request.GET[param]})
+            page = KeysetPaginator(queryset, ['id'], get_page_size(request)).page(request.GET.get('cursor'))
+        except (InvalidCursor, ValueError, ValidationError):
+            return HttpResponseBadRequest('Nieprawidłowy kursor lub filtr')
+
+        ids = [row['id'] for row in page.object_list]
+        relations = {name: resource.relation_ids(name, ids) for name in names if name in resource.relations}
+        results = []
+        for row in page.object_list:
+            item = {name: row[name] for name in columns}
+            for name, related in relations.items():
+                item[name] = related[row['id']]
+            results.append(item)
+
+        next_url = None
+        if page.has_next:
+            query = request.GET.copy()
+            query['cursor'] = page.next_cursor
+            next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+        response = JsonResponse({'results': results, 'next': next_url}, encoder=DjangoJSONEncoder)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
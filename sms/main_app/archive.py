@@ -0,0 +1,138 @@
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import connections, transaction
+
+from . import counters, versioning
+from .models import ArchivedStudent, GradeAverage, Grades, PresenceList, SchoolClass, StatCounter, Student, Subject
+
+BATCH_SIZE = 500
+
+
+@dataclass
+class ArchiveReport:
+    classes: int = 0
+    students: int = 0
+    grades: int = 0
+    presence: int = 0
+
+    def add(self, other):
+        self.classes += other.classes
+        self.students += other.students
+        self.grades += other.grades
+        self.presence += other.presence
+
+
+def _delete(queryset):
+    """
+    Deletes rows with one DELETE ... WHERE id IN (SELECT ...), without loading them and without signals
+    (QuerySet.delete would send them for counted models). Counters, averages and version stamps which signals
+    would update are handled by the caller.
+    """
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    meta = queryset.model._meta
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(meta.db_table)} WHERE {quote(meta.pk.column)} IN ({sql})', params)
+        return cursor.rowcount
+
+
+def _archived(student, grades, presence):
+    school_class = student.school_class
+    return ArchivedStudent(
+        original_id=student.pk,
+        first_name=student.first_name,
+        last_name=student.last_name,
+        gender=student.gender,
+        age=student.age,
+        class_name=school_class.name if school_class else '',
+        class_year=school_class.year if school_class else 0,
+        grades=grades,
+        presence=presence,
+    )
+
+
+def _archive_batch(student_ids):
+    report = ArchiveReport()
+    with transaction.atomic():
+        students = list(Student.objects.filter(pk__in=student_ids).select_related('school_class').order_by('id'))
+        student_ids = [student.pk for student in students]
+        if not students:
+            return report
+
+        topics = defaultdict(list)
+        for grade_id, name in Grades.topic.through.objects.filter(grades__student_id__in=student_ids) \
+                .values_list('grades_id', 'schoolsubjecttopics__name').order_by('id'):
+            topics[grade_id].append(name)
+        grades = defaultdict(list)
+        for grade_id, student_id, day, subject, grade, weight in Grades.objects.filter(student_id__in=student_ids) \
+                .values_list('id', 'student_id', 'date', 'subject__name', 'grade', 'weight').order_by('date', 'id'):
+            grades[student_id].append([day.isoformat(), subject, grade, weight, topics[grade_id]])
+        presence = defaultdict(list)
+        days = set()
+        for student_id, day, present in PresenceList.objects.filter(student_id__in=student_ids) \
+                .values_list('student_id', 'day', 'present').order_by('day'):
+            presence[student_id].append([day.isoformat(), present])
+            days.add(day)
+
+        ArchivedStudent.objects.bulk_create([
+            _archived(student, grades[student.pk], presence[student.pk]) for student in students
+        ])
+
+        _delete(Grades.topic.through.objects.filter(grades__student_id__in=student_ids))
+        report.grades = _delete(Grades.objects.filter(student_id__in=student_ids))
+        report.presence = _delete(PresenceList.objects.filter(student_id__in=student_ids))
+        _delete(GradeAverage.objects.filter(student_id__in=student_ids))
+        _delete(Subject.student.through.objects.filter(student_id__in=student_ids))
+        report.students = _delete(Student.objects.filter(pk__in=student_ids))
+
+        counters.increment('students', -report.students)
+        counters.increment('grades', -report.grades)
+        # presence counters of these days are counted again on next read
+        StatCounter.objects.filter(name__in=[name for day in days for name in counters.presence_names(day)]) \
+            .delete()
+        versioning.bump(Student, Grades, PresenceList, Subject)
+    return report
+
+
+def archive_students(student_ids, batch_size=BATCH_SIZE):
+    """
+    Function that moves students with their grades and attendance to ArchivedStudent and deletes them from
+    active tables. Every batch is one short transaction, so a student with years of history (or a whole
+    class) never holds locks for long and an interrupted run can simply be repeated.
+    :param student_ids: ids of students
+    :param batch_size: students per transaction
+    :return: ArchiveReport
+    """
+    student_ids = list(student_ids)
+    report = ArchiveReport()
+    for start in range(0, len(student_ids), batch_size):
+        report.add(_archive_batch(student_ids[start:start + batch_size]))
+    return report
+
+
+def graduated_classes(until_year=None):
+    """
+    Function that returns graduated classes (see main_app.rollover) which can be archived
+    :param until_year: only classes with year up to this one
+    :return: QuerySet of SchoolClass
+    """
+    classes = SchoolClass.objects.filter(graduated=True).order_by('year', 'name')
+    if until_year is not None:
+        classes = classes.filter(year__lte=until_year)
+    return classes
+
+
+def archive_class(school_class, batch_size=BATCH_SIZE):
+    """
+    Function that archives all students of the class in batches and then deletes the class
+    :param school_class: SchoolClass
+    :param batch_size: students per transaction
+    :return: ArchiveReport
+    """
+    report = archive_students(Student.objects.filter(school_class=school_class).values_list('id', flat=True),
+                              batch_size=batch_size)
+    school_class.delete()
+    report.classes = 1
+    return report
@@ -0,0 +1,133 @@
+"""
+Async versions of read-only views, served under /async/ next to the synchronous ones.
+
+Under ASGI they do not hold a worker thread while waiting for the database. Querysets are fully
+evaluated with the async ORM before rendering, templates must not trigger any query.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import AccessMixin
+from django.http import Http404
+from django.shortcuts import render
+from django.views import View
+
+from . import counters
+from .models import GradeAverage, SchoolClass, Student
+from .pagination import InvalidCursor, KeysetPaginationMixin
+from .views import SchoolClassListView, StudentListView, TeacherListView
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """
+    LoginRequiredMixin for async views, the user is loaded from session outside of the event loop.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncBaseView(AsyncLoginRequiredMixin, View):
+    """
+    Dashboard, counters come from the counter table in one query (see main_app.counters).
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    async def get(self, request):
+        ctx = await sync_to_async(counters.dashboard)()
+        return render(request, '__base__.html', ctx)
+
+
+class AsyncKeysetListView(AsyncLoginRequiredMixin, KeysetPaginationMixin, View):
+    """
+    Keyset paginated list, configured like the synchronous ListView: queryset, template_name,
+    context_object_name, sort_options and default_sort.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    queryset = None
+    template_name = None
+    context_object_name = None
+
+    async def get(self, request):
+        try:
+            page = await self.get_paginator(self.queryset.all()).apage(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Nieprawidłowy kursor strony')
+        context = {
+            'object_list': page.object_list,
+            self.context_object_name: page.object_list,
+            **self.get_pagination_context(page),
+        }
+        return render(request, self.template_name, context)
+
+
+class AsyncTeacherListView(AsyncKeysetListView):
+    queryset = TeacherListView.queryset
+    template_name = TeacherListView.template_name
+    context_object_name = TeacherListView.context_object_name
+    sort_options = TeacherListView.sort_options
+    default_sort = TeacherListView.default_sort
+
+
+class AsyncStudentListView(AsyncKeysetListView):
+    queryset = StudentListView.queryset
+    template_name = StudentListView.template_name
+    context_object_name = StudentListView.context_object_name
+    sort_options = StudentListView.sort_options
+    default_sort = StudentListView.default_sort
+
+
+class AsyncSchoolClassListView(AsyncKeysetListView):
+    queryset = SchoolClassListView.queryset
+    template_name = SchoolClassListView.template_name
+    context_object_name = SchoolClassListView.context_object_name
+    sort_options = SchoolClassListView.sort_options
+    default_sort = SchoolClassListView.default_sort
+
+
+class AsyncStudentDetailsView(AsyncLoginRequiredMixin, View):
+    """
+    Details of the student. Queries of the async ORM run one after another in the single thread-sensitive
+    executor, so they are awaited in turn, the event loop stays free meanwhile.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    async def get(self, request, student_id):
+        averages = GradeAverage.objects.filter(student_id=student_id) \
+            .select_related('subject').order_by('-school_year', '-term', 'subject__name')
+        context = {
+            'student': await aget_object_or_404(Student.objects.all(), pk=student_id),
+            'grade_averages': await _alist(averages),
+        }
+        return render(request, 'student_details.html', context)
+
+
+class AsyncStudentClassDetailsView(AsyncLoginRequiredMixin, View):
+    """
+    Students of the class, the class and its students are queried one after another (see
+    AsyncStudentDetailsView).
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    async def get(self, request, class_id):
+        context = {
+            'class': await aget_object_or_404(SchoolClass.objects.all(), pk=class_id),
+            'students': await _alist(Student.objects.filter(school_class=class_id)),
+        }
+        return render(request, 'class_details.html', context)
@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from . import counters, partitions, versioning
+from .models import PresenceList, Student
+
+PERIODS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def save_roll_call(day, presence):
+    """
+    Function that saves attendance of many students with a single upsert, into the partition of the month
+    when PresenceList is partitioned
+    :param day: date of the roll call
+    :param presence: dict student id -> present
+    :return: None
+    """
+    entries = [PresenceList(student_id=student_id, day=day, present=present)
+               for student_id, present in presence.items()]
+    partitions.ensure_partitions(day)
+    with transaction.atomic():
+        PresenceList.objects.bulk_create(entries, update_conflicts=True,
+                                         unique_fields=['student', 'day'], update_fields=['present'])
+        counters.reconcile(counters.presence_names(day))
+    versioning.bump(PresenceList)
+
+
+def entries(school_class=None, student=None, date_from=None, date_to=None):
+    """
+    Function that returns presence entries filtered by class, student and date range
+    :return: QuerySet
+    """
+    queryset = PresenceList.objects.all()
+    if school_class:
+        queryset = queryset.filter(student__school_class=school_class)
+    if student:
+        queryset = queryset.filter(student=student)
+    if date_from:
+        queryset = queryset.filter(day__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(day__lte=date_to)
+    return queryset
+
+
+def _with_rates(rows):
+    rows = list(rows)
+    for row in rows:
+        row['rate'] = round(100 * row['attended'] / row['total'], 1) if row['total'] else None
+    return rows
+
+
+def _counts(queryset, *group_by):
+    return queryset.values(*group_by).annotate(
+        total=Count('id'),
+        attended=Count('id', filter=Q(present=True)),
+        missed=Count('id', filter=Q(present=False)),
+    )
+
+
+def student_rates(school_class=None, date_from=None, date_to=None):
+    """
+    Function that returns attendance rate of every student, aggregated by the database
+    :return: list of dicts with student data, total, attended, missed and rate
+    """
+    rows = _counts(entries(school_class, None, date_from, date_to),
+                   'student_id', 'student__first_name', 'student__last_name')
+    return _with_rates(rows.order_by('student__last_name', 'student__first_name', 'student_id'))
+
+
+def class_rates(date_from=None, date_to=None):
+    """
+    Function that returns attendance rate of every class, aggregated by the database
+    :return: list of dicts with class data, total, attended, missed and rate
+    """
+    rows = _counts(entries(None, None, date_from, date_to),
+                   'student__school_class_id', 'student__school_class__name', 'student__school_class__year')
+    return _with_rates(rows.order_by('-student__school_class__year', 'student__school_class__name'))
+
+
+def breakdown(period='week', school_class=None, student=None, date_from=None, date_to=None):
+    """
+    Function that returns attendance grouped by week or month
+    :param period: 'week' or 'month'
+    :return: list of dicts with period, total, attended, missed and rate
+    """
+    queryset = entries(school_class, student, date_from, date_to).annotate(period=PERIODS[period]('day'))
+    return _with_rates(_counts(queryset, 'period').order_by('period'))
+
+
+def absence_streaks(school_class=None, date_from=None, date_to=None, min_length=2):
+    """
+    Function that finds the longest series of absences in a row of each student. Entries are streamed
+    ordered by (student, day) from the unique index, so memory does not depend on the number of entries.
+    :param min_length: shortest series included in the result
+    :return: list of dicts with student, length, first and last day and whether series still lasts
+    """
+    rows = entries(school_class, None, date_from, date_to).order_by('student_id', 'day') \
+        .values_list('student_id', 'day', 'present').iterator(chunk_size=5000)
+
+    streaks = {}
+    current_student, length, start = None, 0, None
+    for student_id, day, present in rows:
+        if student_id != current_student:
+            current_student, length, start = student_id, 0, None
+        if present is False:
+            if not length:
+                start = day
+            length += 1
+            best = streaks.get(student_id)
+            if length >= min_length and (best is None or length > best['length']):
+                streaks[student_id] = {'length': length, 'start': start, 'end': day}
+        else:
+            length = 0
+        if student_id in streaks:
+            streaks[student_id]['ongoing'] = bool(length) and streaks[student_id]['end'] == day
+
+    students = Student.objects.in_bulk(streaks)
+    result = [dict(student=students[student_id], **streak) for student_id, streak in streaks.items()]
+    return sorted(result, key=lambda streak: -streak['length'])
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import connection, transaction
+
+PREFIX = 'auth_user'
+
+
+def _key(user_id):
+    return f'{PREFIX}:{user_id}'
+
+
+def forget_user(user_id):
+    """
+    Function that removes the user from the shared cache, so every process reads it again. Inside a transaction
+    it is removed again after commit, a request running meanwhile could have cached the old row.
+    :param user_id: User id
+    :return: None
+    """
+    cache.delete(_key(user_id))
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend which keeps authenticated users in the default cache for AUTH_USER_CACHE_TIMEOUT seconds,
+    so a logged in request does not query auth_user. The cache is shared by worker processes (see CACHES),
+    entries are dropped on logout and on every save of the user (password change, deactivation).
+    """
+
+    def get_user(self, user_id):
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return super().get_user(user_id)
+
+        # every request unpickles its own copy, views may change attributes of request.user
+        user = cache.get(_key(user_id))
+        if user is not None:
+            return user
+
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(_key(user_id), user, timeout)
+        return user
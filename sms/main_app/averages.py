@@ -0,0 +1,126 @@
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import GradeAverage, Grades, term_of
+
+
+def term_range(school_year, term):
+    """
+    Function that returns first and last day of the term
+    :param school_year: year in which school year starts
+    :param term: 1 or 2
+    :return: (first day, last day)
+    """
+    if term == 1:
+        return datetime.date(school_year, 9, 1), datetime.date(school_year + 1, 1, 31)
+    return datetime.date(school_year + 1, 2, 1), datetime.date(school_year + 1, 8, 31)
+
+
+def _totals(queryset, *group_by):
+    return queryset.values(*group_by).annotate(
+        grade_count=Count('id'),
+        weight_sum=Sum('weight'),
+        weighted_sum=Sum(F('grade') * F('weight'), output_field=FloatField()),
+    ).order_by()
+
+
+def _average(student_id, subject_id, school_year, term, grade_count, weight_sum, weighted_sum):
+    return GradeAverage(
+        student_id=student_id, subject_id=subject_id, school_year=school_year, term=term,
+        grade_count=grade_count, weight_sum=weight_sum, weighted_sum=weighted_sum,
+        average=weighted_sum / weight_sum,
+    )
+
+
+def affected_keys(student_ids, subject_id, day):
+    """
+    Function that returns keys of GradeAverage rows which depend on a grade
+    :param student_ids: students of the grade
+    :param subject_id: subject of the grade
+    :param day: date of the grade
+    :return: set of (student_id, subject_id, school_year, term)
+    """
+    school_year, term = term_of(day)
+    return {(student_id, subject_id, school_year, term) for student_id in student_ids}
+
+
+def refresh(keys):
+    """
+    Function that recalculates given GradeAverage rows from grades. Only grades of these students, subjects
+    and terms are aggregated, so the cost does not depend on the size of the whole grade history.
+    :param keys: iterable of (student_id, subject_id, school_year, term)
+    :return: None
+    """
+    groups = defaultdict(set)
+    for student_id, subject_id, school_year, term in keys:
+        groups[(subject_id, school_year, term)].add(student_id)
+
+    with transaction.atomic():
+        for (subject_id, school_year, term), student_ids in groups.items():
+            first_day, last_day = term_range(school_year, term)
+            totals = _totals(
+                Grades.objects.filter(subject_id=subject_id, student__in=student_ids,
+                                      date__range=(first_day, last_day)),
+                'student',
+            )
+            averages = [_average(row['student'], subject_id, school_year, term,
+                                 row['grade_count'], row['weight_sum'], row['weighted_sum'])
+                        for row in totals if row['weight_sum']]
+            # upsert, concurrent refreshes of the same key must not both insert it
+            GradeAverage.objects.bulk_create(
+                averages, update_conflicts=True, unique_fields=['student', 'subject', 'school_year', 'term'],
+                update_fields=['grade_count', 'weight_sum', 'weighted_sum', 'average'],
+            )
+            GradeAverage.objects.filter(subject_id=subject_id, school_year=school_year, term=term,
+                                        student__in=student_ids - {a.student_id for a in averages}).delete()
+
+
+def rebuild(batch_size=2000):
+    """
+    Function that drops and recalculates all GradeAverage rows
+    :param batch_size: rows per insert
+    :return: number of GradeAverage rows
+    """
+    summary = defaultdict(lambda: [0, 0, 0])
+    rows = _totals(Grades.objects.annotate(month=TruncMonth('date')),
+                   'student', 'subject', 'month')
+    for row in rows.iterator():
+        key = (row['student'], row['subject'], *term_of(row['month']))
+        summary[key][0] += row['grade_count']
+        summary[key][1] += row['weight_sum']
+        summary[key][2] += row['weighted_sum']
+
+    with transaction.atomic():
+        GradeAverage.objects.all().delete()
+        GradeAverage.objects.bulk_create(
+            (_average(*key, *totals) for key, totals in summary.items() if totals[1]),
+            batch_size=batch_size,
+        )
+    return len(summary)
+
+
+def class_averages(school_class, school_year, term):
+    """
+    Function that returns weighted averages of the class per subject, read from GradeAverage rows
+    :param school_class: SchoolClass or its id
+    :param school_year: year in which school year starts
+    :param term: 1 or 2
+    :return: list of dicts with subject__name, average and grade_count
+    """
+    rows = GradeAverage.objects.filter(school_year=school_year, term=term)
+    if school_class:
+        rows = rows.filter(student__school_class=school_class)
+    rows = rows.values('subject__name').annotate(
+        total_weight=Sum('weight_sum'),
+        total_weighted=Sum('weighted_sum'),
+        total_count=Sum('grade_count'),
+    ).filter(~Q(total_weight=0)).order_by('subject__name')
+    return [
+        {'subject__name': row['subject__name'], 'grade_count': row['total_count'],
+         'average': row['total_weighted'] / row['total_weight']}
+        for row in rows
+    ]
@@ -0,0 +1,156 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Grades, PresenceList, SchoolClass, StatCounter, Student, Subject, Teacher
+
+MODEL_COUNTERS = {
+    'teachers': Teacher,
+    'students': Student,
+    'classes': SchoolClass,
+    'subjects': Subject,
+    'grades': Grades,
+}
+
+PRESENCE_PREFIX = 'presence:'
+
+
+def counter_name(model):
+    """
+    Function that returns name of the counter of model rows
+    :param model: model class
+    :return: name or None if model is not counted
+    """
+    for name, counted in MODEL_COUNTERS.items():
+        if counted is model:
+            return name
+    return None
+
+
+def presence_names(day):
+    """
+    Function that returns names of counters of all and present entries of presence list on given day
+    :param day: date
+    :return: (total counter name, present counter name)
+    """
+    return f'{PRESENCE_PREFIX}{day.isoformat()}:total', f'{PRESENCE_PREFIX}{day.isoformat()}:present'
+
+
+def _store(values):
+    if not values:
+        return
+    now = timezone.now()
+    StatCounter.objects.bulk_create([StatCounter(name=name, value=value) for name, value in values.items()],
+                                    ignore_conflicts=True)
+    for name, value in values.items():
+        StatCounter.objects.filter(name=name).update(value=value, updated=now)
+
+
+def estimate(model):
+    """
+    Function that returns row estimate of the planner, cheap alternative for COUNT(*) on PostgreSQL
+    :param model: model class
+    :return: estimated number of rows or None when not available
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def _exact(name):
+    if name in MODEL_COUNTERS:
+        return MODEL_COUNTERS[name].objects.count()
+    day, kind = name[len(PRESENCE_PREFIX):].split(':')
+    entries = PresenceList.objects.filter(day=datetime.date.fromisoformat(day))
+    if kind == 'present':
+        entries = entries.filter(present=True)
+    return entries.count()
+
+
+def reconcile(names=None, days=1):
+    """
+    Function that replaces cached counters with exact counts, fixes drift left by bulk operations
+    :param names: counter names, by default model counters and presence counters of last days
+    :param days: number of last days of presence counters reconciled when names are not given
+    :return: dict of reconciled values
+    """
+    if names is None:
+        today = timezone.localdate()
+        names = list(MODEL_COUNTERS)
+        values = {name: _exact(name) for name in names}
+        since = today - datetime.timedelta(days=days - 1)
+        for day in (since + datetime.timedelta(days=i) for i in range(days)):
+            values.update(dict.fromkeys(presence_names(day), 0))
+        rows = PresenceList.objects.filter(day__gte=since).values('day').annotate(
+            total=Count('id'), attended=Count('id', filter=Q(present=True))).order_by()
+        for row in rows:
+            total_name, present_name = presence_names(row['day'])
+            values[total_name], values[present_name] = row['total'], row['attended']
+        StatCounter.objects.filter(name__startswith=PRESENCE_PREFIX,
+                                   name__lt=f'{PRESENCE_PREFIX}{since.isoformat()}').delete()
+    else:
+        values = {name: _exact(name) for name in names}
+    _store(values)
+    return values
+
+
+def increment(name, delta=1):
+    """
+    Function that atomically changes cached counter, missing counter is seeded with exact count
+    :param name: counter name
+    :param delta: change
+    :return: None
+    """
+    if not delta:
+        return
+    updated = StatCounter.objects.filter(name=name).update(value=F('value') + delta, updated=timezone.now())
+    if not updated:
+        reconcile([name])
+
+
+def read(names):
+    """
+    Function that reads cached counters in one query. Missing model counters are filled with planner
+    estimate (PostgreSQL, COUNTER_USE_ESTIMATE setting) or exact count and stored for next requests.
+    :param names: counter names
+    :return: dict name -> value
+    """
+    values = dict(StatCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    missing = {}
+    for name in names:
+        if name in values:
+            continue
+        value = None
+        if name in MODEL_COUNTERS and getattr(settings, 'COUNTER_USE_ESTIMATE', True):
+            value = estimate(MODEL_COUNTERS[name])
+        missing[name] = _exact(name) if value is None else value
+    _store(missing)
+    values.update(missing)
+    return values
+
+
+def dashboard(day=None):
+    """
+    Function that returns counters shown on the dashboard, without aggregating any table
+    :param day: date of attendance rate, today by default
+    :return: dict
+    """
+    total_name, present_name = presence_names(day or timezone.localdate())
+    values = read(list(MODEL_COUNTERS) + [total_name, present_name])
+    total = values[total_name]
+    return {
+        'teacher_counter': values['teachers'],
+        'student_counter': values['students'],
+        'class_counter': values['classes'],
+        'subject_counter': values['subjects'],
+        'grade_counter': values['grades'],
+        'attendance_rate': round(100 * values[present_name] / total, 1) if total else None,
+    }
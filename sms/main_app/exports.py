@@ -0,0 +1,154 @@
+import csv
+from collections import defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Grades, PresenceList
+
+DEFAULT_CHUNK_SIZE = 2000
+
+GRADE_COLUMNS = ('id', 'date', 'grade', 'subject', 'topics', 'student_id', 'student')
+PRESENCE_COLUMNS = ('id', 'day', 'present', 'student_id', 'student', 'class_name', 'class_year')
+
+
+class Echo:
+    """
+    Pseudo-buffer for csv.writer, returns written line instead of keeping it in memory.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _batches(iterator, size):
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _date_range(lookup, date_from=None, date_to=None):
+    filters = {}
+    if date_from:
+        filters[f'{lookup}__gte'] = date_from
+    if date_to:
+        filters[f'{lookup}__lte'] = date_to
+    return filters
+
+
+def grade_rows(school_class=None, subject=None, date_from=None, date_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generator of grades with subject, topics and student. Grades are read with a server-side cursor,
+    topics are fetched once per chunk, so memory does not depend on size of the table.
+    :return: generator of dicts with GRADE_COLUMNS keys
+    """
+    queryset = Grades.objects.filter(**_date_range('date', date_from, date_to))
+    if subject:
+        queryset = queryset.filter(subject=subject)
+    if school_class:
+        queryset = queryset.filter(student__school_class=school_class)
+    rows = queryset.order_by('id').values(
+        'id', 'date', 'grade', 'subject__name', 'student_id', 'student__first_name', 'student__last_name',
+    ).iterator(chunk_size=chunk_size)
+
+    for batch in _batches(rows, chunk_size):
+        ids = [row['id'] for row in batch]
+        topics = defaultdict(list)
+        for grade_id, name in Grades.topic.through.objects.filter(grades_id__in=ids) \
+                .values_list('grades_id', 'schoolsubjecttopics__name'):
+            topics[grade_id].append(name)
+        for row in batch:
+            yield {
+                'id': row['id'],
+                'date': row['date'],
+                'grade': row['grade'],
+                'subject': row['subject__name'],
+                'topics': topics[row['id']],
+                'student_id': row['student_id'],
+                'student': f'{row["student__first_name"]} {row["student__last_name"]}',
+            }
+
+
+def presence_rows(school_class=None, subject=None, date_from=None, date_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generator of presence list entries with student and class names, read with a server-side cursor.
+    Presence is not recorded per subject, so subject filter is ignored.
+    :return: generator of dicts with PRESENCE_COLUMNS keys
+    """
+    queryset = PresenceList.objects.filter(**_date_range('day', date_from, date_to))
+    if school_class:
+        queryset = queryset.filter(student__school_class=school_class)
+    rows = queryset.order_by('id').values_list(
+        'id', 'day', 'present', 'student_id', 'student__first_name', 'student__last_name',
+        'student__school_class__name', 'student__school_class__year',
+    ).iterator(chunk_size=chunk_size)
+
+    for pk, day, present, student_id, first_name, last_name, class_name, class_year in rows:
+        yield {
+            'id': pk,
+            'day': day,
+            'present': present,
+            'student_id': student_id,
+            'student': f'{first_name} {last_name}',
+            'class_name': class_name,
+            'class_year': class_year,
+        }
+
+
+EXPORTS = {
+    'grades': (grade_rows, GRADE_COLUMNS),
+    'presence': (presence_rows, PRESENCE_COLUMNS),
+}
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return '; '.join(str(v) for v in value)
+    return value
+
+
+def csv_lines(rows, columns):
+    """
+    Generator of csv encoded lines, header first
+    :param rows: iterable of dicts
+    :param columns: keys of dicts written as columns
+    :return: generator of strings
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[column]) for column in columns])
+
+
+def jsonl_lines(rows, columns):
+    """
+    Generator of json lines, one object per row
+    :param rows: iterable of dicts
+    :param columns: keys of dicts written to json objects
+    :return: generator of strings
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode({column: row[column] for column in columns}) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def export_lines(kind, fmt, chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """
+    Function that returns lazy generator of encoded export
+    :param kind: key of EXPORTS
+    :param fmt: key of FORMATS
+    :param chunk_size: rows fetched from database at once
+    :param filters: school_class, subject, date_from, date_to
+    :return: generator of strings
+    """
+    row_function, columns = EXPORTS[kind]
+    line_function, _ = FORMATS[fmt]
+    return line_function(row_function(chunk_size=chunk_size, **filters), columns)
@@ -0,0 +1,168 @@
+import datetime
+
+from django import forms
+
+from .models import SchoolClass, SchoolSubjectTopics, Subject, validate_grades
+
+
+class RosterImportForm(forms.Form):
+    KIND_CHOICES = [
+        ('students', 'Uczniowie'),
+        ('teachers', 'Nauczyciele'),
+    ]
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES, label='Rodzaj danych')
+    file = forms.FileField(label='Plik CSV/XLSX')
+    dry_run = forms.BooleanField(required=False, label='Tylko sprawdź poprawność')
+
+
+class ExportFilterForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    school_class = forms.ModelChoiceField(queryset=SchoolClass.objects.all(), required=False)
+    subject = forms.ModelChoiceField(queryset=Subject.objects.all(), required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'csv'
+
+    def filters(self):
+        return {name: self.cleaned_data[name] for name in ('school_class', 'subject', 'date_from', 'date_to')}
+
+
+class RollCallForm(forms.Form):
+    """
+    Attendance of the whole class on one day, one field per student named student_<id>.
+    """
+    PRESENCE_CHOICES = [
+        ('1', 'Obecny'),
+        ('0', 'Nieobecny'),
+    ]
+
+    def __init__(self, students, presence=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        presence = presence or {}
+        self.students = list(students)
+        for student in self.students:
+            present = presence.get(student.id, True)
+            self.fields[f'student_{student.id}'] = forms.ChoiceField(
+                choices=self.PRESENCE_CHOICES, widget=forms.RadioSelect,
+                initial='0' if present is False else '1',
+                label=f'{student.first_name} {student.last_name}',
+            )
+
+    def rows(self):
+        return [(student, self[f'student_{student.id}']) for student in self.students]
+
+    def presence(self):
+        return {student.id: self.cleaned_data[f'student_{student.id}'] == '1' for student in self.students}
+
+
+class AttendanceReportForm(forms.Form):
+    PERIOD_CHOICES = [
+        ('week', 'Tygodnie'),
+        ('month', 'Miesiące'),
+    ]
+
+    school_class = forms.ModelChoiceField(queryset=SchoolClass.objects.order_by('-year', 'name'), required=False,
+                                          label='Klasa')
+    date_from = forms.DateField(required=False, label='Od')
+    date_to = forms.DateField(required=False, label='Do')
+    period = forms.ChoiceField(choices=PERIOD_CHOICES, required=False, label='Podział')
+
+    def clean_period(self):
+        return self.cleaned_data['period'] or 'week'
+
+
+class GradebookForm(forms.Form):
+    TERM_CHOICES = [
+        (1, 'Semestr 1'),
+        (2, 'Semestr 2'),
+    ]
+
+    subject = forms.ModelChoiceField(queryset=Subject.objects.order_by('name'), required=False, label='Przedmiot')
+    school_year = forms.IntegerField(required=False, min_value=2000, label='Rok szkolny')
+    term = forms.TypedChoiceField(choices=TERM_CHOICES, coerce=int, required=False, label='Semestr')
+
+
+class ReportCardsForm(forms.Form):
+    TERM_CHOICES = [
+        (1, 'Semestr 1'),
+        (2, 'Semestr 2'),
+    ]
+    FORMAT_CHOICES = [
+        ('html', 'HTML'),
+        ('pdf', 'PDF'),
+    ]
+
+    year = forms.IntegerField(min_value=2000, label='Rok klas')
+    school_year = forms.IntegerField(min_value=2000, label='Rok szkolny')
+    term = forms.TypedChoiceField(choices=TERM_CHOICES, coerce=int, label='Semestr')
+    formats = forms.MultipleChoiceField(choices=FORMAT_CHOICES, initial=['html'], widget=forms.CheckboxSelectMultiple,
+                                        label='Formaty')
+
+
+class RolloverForm(forms.Form):
+    from_year = forms.IntegerField(min_value=2020, label='Rok klas do przeniesienia')
+    dry_run = forms.BooleanField(required=False, initial=True, label='Tylko pokaż zmiany')
+
+
+class ClassGradesForm(forms.Form):
+    """
+    Subject, topic, date and weight shared by grades of the whole class. Only topics of the chosen subject
+    are offered.
+    """
+    subject = forms.ModelChoiceField(queryset=Subject.objects.order_by('name'), label='Przedmiot')
+    topic = forms.ModelChoiceField(queryset=SchoolSubjectTopics.objects.none(), required=False, label='Temat')
+    date = forms.DateField(initial=datetime.date.today, label='Data')
+    weight = forms.IntegerField(min_value=1, max_value=10, initial=1, label='Waga')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        subject = self.data.get(self.add_prefix('subject')) or self.initial.get('subject')
+        if subject:
+            try:
+                self.fields['topic'].queryset = SchoolSubjectTopics.objects.filter(subjects=subject).order_by('name')
+            except (TypeError, ValueError):
+                pass
+
+
+class StudentGradeForm(forms.Form):
+    student = forms.IntegerField(widget=forms.HiddenInput)
+    grade = forms.FloatField(required=False, validators=[validate_grades], label='Ocena',
+                             widget=forms.NumberInput(attrs={'step': '0.5', 'min': 1, 'max': 6}))
+
+
+class BaseStudentGradeFormSet(forms.BaseFormSet):
+    """
+    One form per student of the class, students are given in the order of rows.
+    """
+
+    def __init__(self, students, *args, **kwargs):
+        self.students = list(students)
+        kwargs['initial'] = [{'student': student.pk} for student in self.students]
+        super().__init__(*args, **kwargs)
+
+    def rows(self):
+        return list(zip(self.students, self.forms))
+
+    def clean(self):
+        if any(self.errors):
+            return
+        students = {student.pk for student in self.students}
+        if any(form.cleaned_data.get('student') not in students for form in self.forms):
+            raise forms.ValidationError('Lista uczniów klasy zmieniła się, odśwież stronę.')
+        if not self.grades():
+            raise forms.ValidationError('Nie wpisano żadnej oceny.')
+
+    def grades(self):
+        return {form.cleaned_data['student']: form.cleaned_data['grade'] for form in self.forms
+                if form.cleaned_data.get('grade') is not None}
+
+
+StudentGradeFormSet = forms.formset_factory(StudentGradeForm, formset=BaseStudentGradeFormSet, extra=0)
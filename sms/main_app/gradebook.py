@@ -0,0 +1,117 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from . import averages, counters, versioning
+from .averages import term_range
+from .models import Grades, SchoolSubjectTopics, Student
+
+NO_TOPIC = None
+
+
+@dataclass
+class GradebookRow:
+    student: Student
+    cells: list
+    average: float = None
+    grade_count: int = 0
+
+
+@dataclass
+class Gradebook:
+    """
+    Grades of one class in one subject and term: students as rows, topics as columns. Each cell is a list
+    of grades, a grade with many topics is shown in each of their columns but counted once in the average.
+    """
+    topics: list
+    rows: list
+    topic_averages: list = field(default_factory=list)
+
+    @property
+    def has_grades(self):
+        return any(row.grade_count for row in self.rows)
+
+
+def _weighted(grades):
+    weight_sum = sum(weight for _, weight in grades)
+    if not weight_sum:
+        return None
+    return sum(grade * weight for grade, weight in grades) / weight_sum
+
+
+def build(school_class, subject, school_year, term):
+    """
+    Function that builds the gradebook matrix with four queries, whatever the number of students and topics:
+    students, topics, grades of the class and topics of these grades. The matrix is pivoted in Python.
+    :param school_class: SchoolClass or id
+    :param subject: Subject or id
+    :param school_year: year in which school year starts
+    :param term: 1 or 2
+    :return: Gradebook
+    """
+    students = list(Student.objects.filter(school_class=school_class).order_by('last_name', 'first_name', 'id'))
+    topics = list(SchoolSubjectTopics.objects.filter(subjects=subject).order_by('name', 'id'))
+
+    date_from, date_to = term_range(school_year, term)
+    class_grades = Grades.objects.filter(student__school_class=school_class, subject=subject,
+                                         date__range=(date_from, date_to))
+    grade_rows = list(class_grades.values_list('student_id', 'id', 'grade', 'weight').order_by('date', 'id'))
+
+    grade_topics = defaultdict(list)
+    for grade_id, topic_id in Grades.topic.through.objects.filter(grades__in=class_grades) \
+            .values_list('grades_id', 'schoolsubjecttopics_id'):
+        grade_topics[grade_id].append(topic_id)
+
+    column = {topic.pk: i for i, topic in enumerate(topics)}
+    columns = list(topics)
+    if any(not any(t in column for t in grade_topics[grade_id]) for _, grade_id, _, _ in grade_rows):
+        columns.append(NO_TOPIC)
+        column[NO_TOPIC] = len(topics)
+
+    cells = defaultdict(lambda: [[] for _ in columns])
+    student_grades = defaultdict(list)
+    topic_grades = [[] for _ in columns]
+    for student_id, grade_id, grade, weight in grade_rows:
+        student_grades[student_id].append((grade, weight))
+        positions = [column[t] for t in grade_topics[grade_id] if t in column] or [column[NO_TOPIC]]
+        for position in positions:
+            cells[student_id][position].append(grade)
+            topic_grades[position].append((grade, weight))
+
+    rows = [
+        GradebookRow(
+            student=student,
+            cells=cells[student.pk],
+            average=_weighted(student_grades[student.pk]),
+            grade_count=len(student_grades[student.pk]),
+        )
+        for student in students
+    ]
+    return Gradebook(topics=columns, rows=rows, topic_averages=[_weighted(grades) for grades in topic_grades])
+
+
+def save_class_grades(subject, topic, day, weight, grades):
+    """
+    Function that saves grades of many students (e.g. a test of the whole class) in one transaction: one
+    bulk insert of grades, one of their topics, then averages and counters which signals would update
+    :param subject: Subject
+    :param topic: SchoolSubjectTopics or None
+    :param day: date of the grades
+    :param weight: weight of every grade
+    :param grades: dict student id -> grade
+    :return: list of created Grades
+    """
+    with transaction.atomic():
+        created = Grades.objects.bulk_create([
+            Grades(student_id=student_id, subject=subject, grade=grade, weight=weight, date=day)
+            for student_id, grade in grades.items()
+        ])
+        if topic is not None:
+            Grades.topic.through.objects.bulk_create([
+                Grades.topic.through(grades_id=grade.pk, schoolsubjecttopics_id=topic.pk) for grade in created
+            ])
+        averages.refresh(averages.affected_keys(grades, subject.pk, day))
+        counters.increment('grades', len(created))
+        versioning.bump(Grades)
+    return created
@@ -0,0 +1,384 @@
+"""
+Background jobs kept in the Job table, no broker is needed.
+
+Views queue a job with enqueue and return at once with its id, 'manage.py run_worker' processes claim
+queued jobs and run them. On PostgreSQL a job is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of workers take different jobs without waiting for each other. SQLite has no row locks: a worker
+takes the job with a conditional UPDATE (status still 'queued'), the losing worker tries the next one.
+
+A failed job is queued again with a growing delay until it used max_attempts of its kind. Imports and the
+rollover run once by default, a retry after a partly committed import would add its rows twice. Errors of
+the data (bad file, wrong year) fail the job at once. A running worker refreshes heartbeat of its job,
+jobs of a worker which died are queued again after JOB_STALE_TIMEOUT.
+"""
+import datetime
+import io
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import zipfile
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .exports import EXPORTS, FORMATS, export_lines
+from .models import Job, SchoolClass, Subject
+from .report_cards import COMPLETE_MARKER, ReportCardError, generate_class
+from .rollover import RolloverError, rollover
+from .roster import IMPORTERS, RosterFormatError, read_rows, write_error_report
+
+logger = logging.getLogger('main_app.jobs')
+
+# row errors of an import kept in the result, all of them are in the csv report
+ERROR_PREVIEW = 50
+
+
+class JobError(Exception):
+    """
+    Error of the job's data, the job fails without retries.
+    """
+    pass
+
+
+PERMANENT_ERRORS = (JobError, RosterFormatError, RolloverError, ReportCardError)
+
+
+def retry_delay():
+    return getattr(settings, 'JOB_RETRY_DELAY', 30)
+
+
+def stale_timeout():
+    return getattr(settings, 'JOB_STALE_TIMEOUT', 300)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Progress:
+    """
+    Callable given to handlers, saves progress of the job at most once per interval seconds.
+    """
+
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self._saved = 0
+
+    def __call__(self, done=None, total=None, message=''):
+        if total:
+            self.job.progress = min(99, int(done * 100 / total))
+        self.job.message = message[:200]
+        now = time.monotonic()
+        if now - self._saved < self.interval:
+            return
+        self._saved = now
+        Job.objects.filter(pk=self.job.pk).update(progress=self.job.progress, message=self.job.message,
+                                                  heartbeat=timezone.now())
+
+
+class Heartbeat(threading.Thread):
+    """
+    Refreshes heartbeat of the running job from its own thread (and database connection), also while
+    the handler is inside one long query or transaction.
+    """
+
+    def __init__(self, job, interval):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job.pk, status=Job.RUNNING).update(heartbeat=timezone.now())
+                except DatabaseError:
+                    # e.g. SQLite locked by the handler, the next beat will try again
+                    pass
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.join()
+
+
+# HANDLERS, called with (job, progress), return json serializable result
+
+def _counted(rows, progress, every=500):
+    for number, row in enumerate(rows, start=1):
+        if number % every == 0:
+            progress(message=f'Wczytano {number} wierszy')
+        yield row
+
+
+def run_roster_import(job, progress):
+    params = job.params
+    if params.get('kind') not in IMPORTERS:
+        raise JobError(f'Nieznany rodzaj importu: {params.get("kind")}')
+    with job.input.open('rb') as upload:
+        rows = read_rows(upload, params.get('filename') or job.input.name)
+        report = IMPORTERS[params['kind']](_counted(rows, progress), dry_run=params.get('dry_run', False))
+    if report.errors:
+        errors = io.StringIO()
+        write_error_report(report, errors)
+        job.output.save(f'job-{job.pk}-errors.csv', ContentFile(errors.getvalue().encode()), save=False)
+    return {
+        'created': report.created,
+        'failed': report.failed,
+        'dry_run': params.get('dry_run', False),
+        'errors': [[error.line, error.errors] for error in report.errors[:ERROR_PREVIEW]],
+    }
+
+
+def _instance(model, pk):
+    if pk is None:
+        return None
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        # without the filter the export would contain everything
+        raise JobError(f'{model._meta.verbose_name} {pk} nie istnieje')
+    return instance
+
+
+def run_export(job, progress):
+    params = job.params
+    if params.get('kind') not in EXPORTS or params.get('format') not in FORMATS:
+        raise JobError('Nieznany rodzaj lub format eksportu')
+    filters = {
+        'school_class': _instance(SchoolClass, params.get('school_class')),
+        'subject': _instance(Subject, params.get('subject')),
+        'date_from': datetime.date.fromisoformat(params['date_from']) if params.get('date_from') else None,
+        'date_to': datetime.date.fromisoformat(params['date_to']) if params.get('date_to') else None,
+    }
+    rows = 0
+    with tempfile.TemporaryFile('w+b') as output:
+        for line in export_lines(params['kind'], params['format'], **filters):
+            output.write(line.encode())
+            rows += 1
+            if rows % 5000 == 0:
+                progress(message=f'Zapisano {rows} wierszy')
+        output.seek(0)
+        job.output.save(f'{params["kind"]}-{job.pk}.{params["format"]}', File(output), save=False)
+    return {'lines': rows}
+
+
+def run_report_cards(job, progress):
+    params = job.params
+    classes = list(SchoolClass.objects.filter(year=params['year']).order_by('name').values_list('id', flat=True))
+    if not classes:
+        raise JobError(f'Nie ma klas z roku {params["year"]}')
+    directory = tempfile.mkdtemp(prefix=f'job-{job.pk}-')
+    written = 0
+    try:
+        for number, class_id in enumerate(classes, start=1):
+            result = generate_class(class_id, params['school_year'], params['term'], directory,
+                                    tuple(params.get('formats') or ('html',)))
+            written += result.written + result.skipped
+            progress(number, len(classes), f'Klasa {number} z {len(classes)}')
+        with tempfile.TemporaryFile() as archive:
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as package:
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        if not name.startswith(COMPLETE_MARKER):
+                            path = os.path.join(root, name)
+                            package.write(path, os.path.relpath(path, directory))
+            archive.seek(0)
+            job.output.save(f'report-cards-{job.pk}.zip', File(archive), save=False)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'classes': len(classes), 'report_cards': written}
+
+
+def run_rollover(job, progress):
+    report = rollover(job.params['from_year'])
+    return {
+        'from_year': report.from_year,
+        'to_year': report.to_year,
+        'moved_students': report.moved_students,
+        'created': report.created,
+        'graduated': [move.source.name for move in report.graduated],
+        'skipped': [[school_class.name, error] for school_class, error in report.skipped],
+    }
+
+
+@dataclass
+class JobKind:
+    label: str
+    handler: object
+    max_attempts: int = 3
+
+
+JOBS = {
+    'roster-import': JobKind('Import uczniów i nauczycieli', run_roster_import, max_attempts=1),
+    'export': JobKind('Eksport danych', run_export),
+    'report-cards': JobKind('Świadectwa', run_report_cards),
+    'rollover': JobKind('Nowy rok szkolny', run_rollover, max_attempts=1),
+}
+
+
+# QUEUE
+
+def enqueue(kind, params=None, user=None, input_file=None, filename=None):
+    """
+    Function that queues a job, the caller returns at once and shows the job by its id
+    :param kind: key of JOBS
+    :param params: json serializable dict passed to the handler
+    :param user: User who queued the job
+    :param input_file: uploaded file saved with the job, e.g. roster to import
+    :param filename: name of input_file
+    :return: Job
+    """
+    if kind not in JOBS:
+        raise JobError(f'Nieznany rodzaj zadania: {kind}')
+    job = Job(kind=kind, params=params or {}, max_attempts=JOBS[kind].max_attempts,
+              created_by=user if user is not None and user.is_authenticated else None)
+    if input_file is not None:
+        job.input.save(filename or getattr(input_file, 'name', 'input'), input_file, save=False)
+    job.save()
+    return job
+
+
+def claim(worker):
+    """
+    Function that takes the oldest queued job which is due and marks it as running
+    :param worker: name of the worker
+    :return: Job or None when the queue is empty
+    """
+    now = timezone.now()
+    queued = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'id')
+    changes = {'status': Job.RUNNING, 'worker': worker, 'attempts': F('attempts') + 1, 'started': now,
+               'heartbeat': now, 'finished': None}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = queued.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            Job.objects.filter(pk=job_id).update(**changes)
+        return Job.objects.get(pk=job_id)
+
+    # without row locks several candidates are read, the first one still queued is taken
+    for job_id in queued.values_list('id', flat=True)[:10]:
+        if Job.objects.filter(pk=job_id, status=Job.QUEUED).update(**changes):
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def _finish(job, worker, **changes):
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=worker).update(heartbeat=None, **changes)
+
+
+def run(job, worker=None):
+    """
+    Function that runs a claimed job and saves its result, error or next attempt
+    :param job: Job returned by claim
+    :param worker: name used in claim, the job is not touched when it was taken over in the meantime
+    :return: Job status after the run
+    """
+    worker = worker or job.worker
+    kind = JOBS.get(job.kind)
+    try:
+        if kind is None:
+            raise JobError(f'Nieznany rodzaj zadania: {job.kind}')
+        with Heartbeat(job, max(1, stale_timeout() / 5)):
+            result = kind.handler(job, Progress(job))
+    except Exception as error:
+        now = timezone.now()
+        permanent = isinstance(error, PERMANENT_ERRORS)
+        if not permanent:
+            logger.exception('job %s failed', job)
+        message = str(error) if permanent else traceback.format_exc()
+        if not permanent and job.attempts < job.max_attempts:
+            delay = retry_delay() * 2 ** (job.attempts - 1)
+            _finish(job, worker, status=Job.QUEUED, error=message, run_after=now + datetime.timedelta(seconds=delay),
+                    message=f'Ponowna próba za {delay} s')
+            return Job.QUEUED
+        _finish(job, worker, status=Job.FAILED, error=message, finished=now, output=job.output.name or '')
+        return Job.FAILED
+
+    _finish(job, worker, status=Job.DONE, result=result, error='', progress=100, message='',
+            finished=timezone.now(), output=job.output.name or '')
+    return Job.DONE
+
+
+def requeue_stale():
+    """
+    Function that returns running jobs without heartbeat for JOB_STALE_TIMEOUT to the queue, or fails them
+    when they have no attempts left
+    :return: (requeued, failed)
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat__lt=now - datetime.timedelta(seconds=stale_timeout()))
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, run_after=now, heartbeat=None,
+        message='Worker przestał odpowiadać, zadanie wraca do kolejki')
+    failed = stale.update(status=Job.FAILED, finished=now, heartbeat=None, error='Worker przestał odpowiadać')
+    return requeued, failed
+
+
+def retry(job):
+    """
+    Function that queues a failed job again with one more attempt
+    :param job: Job
+    :return: bool, False when the job has not failed
+    """
+    return bool(Job.objects.filter(pk=job.pk, status=Job.FAILED).update(
+        status=Job.QUEUED, run_after=timezone.now(), max_attempts=F('attempts') + 1, progress=0, message='',
+        error='', finished=None))
+
+
+def _release_connection():
+    # never inside a transaction, e.g. of a test which runs the worker in process
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def work(worker=None, burst=False, poll=1.0, max_jobs=None, stop=None):
+    """
+    Function that runs queued jobs in a loop, it is the body of 'manage.py run_worker'
+    :param worker: name of the worker, host:pid by default
+    :param burst: return when no job is due instead of waiting for new ones
+    :param poll: seconds between checks of an empty queue
+    :param max_jobs: return after this many jobs
+    :param stop: threading.Event, set by signal handlers to stop after the current job
+    :return: number of jobs run
+    """
+    worker = worker or worker_name()
+    stop = stop or threading.Event()
+    processed = 0
+    checked = 0
+    while not stop.is_set():
+        if time.monotonic() - checked > stale_timeout() / 5:
+            requeue_stale()
+            checked = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            _release_connection()
+            stop.wait(poll)
+            continue
+        run(job, worker)
+        processed += 1
+        # a failed handler may leave the connection unusable, the next job gets a fresh one when needed
+        _release_connection()
+        if max_jobs and processed >= max_jobs:
+            break
+    return processed
@@ -0,0 +1,482 @@
+"""
+Load test of a running server: simulated users log in through LoginView and repeat scenarios of teachers
+and admins, concurrency grows in stages until the server stops keeping up.
+
+Requests are made with a small HTTP/1.1 client on asyncio streams, every simulated user has its own
+keep-alive connection and cookies, like a browser. Data of the scenarios (classes, students, subjects)
+is read from the database of the settings, so the server has to use the same database.
+"""
+import asyncio
+import datetime
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.urls import Resolver404, resolve, reverse
+
+from .models import SchoolClass, SchoolSubjectTopics, Student
+
+GRADES = [1, 2, 3, 3.5, 4, 4.5, 5, 6]
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class LoadTestError(Exception):
+    pass
+
+
+class HttpClient:
+    """
+    HTTP/1.1 client of one simulated user, keeps one connection open and stores cookies (session, csrf).
+    """
+
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+        self._reader = self._writer = None
+        self._received = False
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    def _head(self, method, path, body):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive',
+                 'User-Agent: sms-load-test']
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(f'{name}={value}' for name, value in self.cookies.items()))
+        if body is not None:
+            lines += ['Content-Type: application/x-www-form-urlencoded', f'Content-Length: {len(body)}',
+                      f'X-CSRFToken: {self.cookies.get("csrftoken", "")}']
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _read_response(self, method):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionResetError('connection closed by the server')
+        self._received = True
+        status = int(line.split()[1])
+        headers = []
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip().lower(), value.strip()))
+        values = dict(headers)
+
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            body = b''
+        elif values.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b';')[0], 16)
+                if not size:
+                    while (await self._reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in values:
+            body = await self._reader.readexactly(int(values['content-length']))
+        else:
+            body = await self._reader.read()
+            values['connection'] = 'close'
+        return status, headers, values, body
+
+    def _store_cookies(self, headers):
+        for name, value in headers:
+            if name != 'set-cookie':
+                continue
+            for key, morsel in SimpleCookie(value).items():
+                if not morsel.value or morsel['max-age'] == '0' or '1970' in morsel['expires']:
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+
+    async def request(self, method, path, data=None):
+        """
+        Function that sends one request and reads the whole response. A kept-alive connection which
+        the server closed in the meantime is opened again once. A POST is sent again only when no byte
+        of the response came, after a broken response it could have been handled already.
+        :param method: 'GET', 'POST'...
+        :param path: path with query string
+        :param data: form fields (dict or list of pairs) sent urlencoded with the csrf token
+        :return: (status, headers dict, body)
+        """
+        body = None if data is None else urlencode(data, doseq=True).encode()
+        for attempt in (1, 2):
+            reused = self._writer is not None
+            self._received = False
+            if not reused:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self._writer.write(self._head(method, path, body) + (body or b''))
+                await self._writer.drain()
+                status, headers, values, content = await self._read_response(method)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if not reused or attempt == 2 or (self._received and method not in IDEMPOTENT_METHODS):
+                    raise
+        self._store_cookies(headers)
+        if values.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, values, content
+
+
+def percentile(values, q):
+    """
+    Function that returns the nearest-rank percentile
+    :param values: sorted list of numbers
+    :param q: percentile 0-100
+    :return: number, None for an empty list
+    """
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+@dataclass
+class UrlStats:
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+    throttled: int = 0
+    statuses: Counter = field(default_factory=Counter)
+
+    def summary(self, seconds):
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        return {
+            'requests': requests,
+            'rps': round(requests / seconds, 2) if seconds else None,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'errors': self.errors,
+            'error_rate': round(self.errors / requests, 4) if requests else 0,
+            'throttled': self.throttled,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+class Recorder:
+    """
+    Latencies and errors of requests grouped by url name from sms/urls.py.
+    """
+
+    def __init__(self):
+        self.urls = {}
+        self._names = {}
+
+    def url_name(self, path):
+        path = urlsplit(path).path
+        if path not in self._names:
+            try:
+                self._names[path] = resolve(path).url_name or path
+            except Resolver404:
+                self._names[path] = path
+        return self._names[path]
+
+    def record(self, path, milliseconds, status, ok):
+        stats = self.urls.setdefault(self.url_name(path), UrlStats())
+        stats.latencies.append(round(milliseconds, 2))
+        stats.statuses[status] += 1
+        if status == 429:
+            stats.throttled += 1
+        elif not ok:
+            stats.errors += 1
+
+    def total(self):
+        total = UrlStats()
+        for stats in self.urls.values():
+            total.latencies += stats.latencies
+            total.errors += stats.errors
+            total.throttled += stats.throttled
+            total.statuses.update(stats.statuses)
+        return total
+
+
+@dataclass
+class Targets:
+    """
+    Ids used by the scenarios: classes with their students and subjects with their topics.
+    """
+    classes: list
+    subjects: list
+    students: list
+
+    @classmethod
+    def load(cls):
+        students = {}
+        for student_id, class_id in Student.objects.filter(school_class__isnull=False) \
+                .values_list('id', 'school_class_id').order_by('id'):
+            students.setdefault(class_id, []).append(student_id)
+        topics = {}
+        for topic_id, subject_id in SchoolSubjectTopics.objects.values_list('id', 'subjects_id').order_by('id'):
+            topics.setdefault(subject_id, []).append(topic_id)
+        classes = [(class_id, students[class_id]) for class_id in
+                   SchoolClass.objects.filter(pk__in=students).order_by('id').values_list('id', flat=True)]
+        if not classes or not topics:
+            raise LoadTestError('Brak klas z uczniami lub przedmiotów z tematami, uruchom najpierw seed_school')
+        return cls(classes=classes, subjects=sorted(topics.items()),
+                   students=[student_id for _, ids in classes for student_id in ids])
+
+
+def prepare_users(count, prefix, password):
+    """
+    Function that creates missing accounts prefix1..prefixN, all of them get one password hash
+    :param count: number of accounts
+    :param prefix: username prefix
+    :param password: password of new accounts
+    :return: list of usernames
+    """
+    names = [f'{prefix}{number}' for number in range(1, count + 1)]
+    existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+    password_hash = make_password(password)
+    User.objects.bulk_create([User(username=name, password=password_hash) for name in names if name not in existing])
+    return names
+
+
+class VirtualUser:
+    """
+    Simulated user: logs in once and then repeats the scenario of its role.
+    """
+
+    def __init__(self, number, role, username, password, client, targets, think_time, seed):
+        self.number = number
+        self.role = role
+        self.username = username
+        self.password = password
+        self.client = client
+        self.targets = targets
+        self.think_time = think_time
+        self.rng = random.Random(seed * 100003 + number)
+        self.logged_in = False
+        self.recorder = None
+
+    async def call(self, method, path, data=None, expect=200):
+        """
+        Function that makes a request and records its latency, any other status than expect is an error
+        :return: (status, headers, body), status 0 when the request failed without a response
+        """
+        start = time.perf_counter()
+        try:
+            status, headers, body = await asyncio.wait_for(self.client.request(method, path, data),
+                                                           self.client.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            await self.client.close()
+            status, headers, body = 0, {}, b''
+        self.recorder.record(path, (time.perf_counter() - start) * 1000, status, status == expect)
+        if not status:
+            # server is down or refuses connections, do not spin
+            await asyncio.sleep(0.1)
+        return status, headers, body
+
+    async def think(self):
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+    async def login(self, deadline):
+        """
+        Function that logs in through LoginView, a throttled attempt (429) is repeated after Retry-After
+        :param deadline: loop time after which it gives up
+        :return: bool
+        """
+        loop = asyncio.get_running_loop()
+        path = reverse('login')
+        while loop.time() < deadline:
+            await self.call('GET', path)
+            status, headers, _ = await self.call('POST', path, {'uname': self.username, 'psw': self.password},
+                                                 expect=302)
+            if status == 302:
+                self.logged_in = True
+                return True
+            if status != 429:
+                return False
+            await asyncio.sleep(min(int(headers.get('retry-after', 1)), max(0, deadline - loop.time())))
+        return False
+
+    async def teacher(self):
+        class_id, students = self.rng.choice(self.targets.classes)
+        await self.call('GET', reverse('class-details', kwargs={'class_id': class_id}))
+        await self.think()
+        path = reverse('grades-add')
+        await self.call('GET', path)
+        await self.think()
+        subject_id, topics = self.rng.choice(self.targets.subjects)
+        await self.call('POST', path, {
+            'student': self.rng.choice(students),
+            'subject': subject_id,
+            'topic': [self.rng.choice(topics)],
+            'grade': self.rng.choice(GRADES),
+            'weight': self.rng.randint(1, 5),
+            'date': datetime.date.today().isoformat(),
+        }, expect=302)
+        await self.think()
+
+    async def admin(self):
+        await self.call('GET', reverse('student-list') + self.rng.choice(['', '?sort=class']))
+        await self.think()
+        await self.call('GET', reverse('student-details', kwargs={'student_id': self.rng.choice(self.targets.students)}))
+        await self.think()
+        await self.call('GET', reverse('class-list'))
+        await self.think()
+
+
+SCENARIOS = {
+    'teacher': VirtualUser.teacher,
+    'admin': VirtualUser.admin,
+}
+
+
+def parse_mix(value):
+    """
+    Function that parses weights of scenarios, e.g. 'teacher=3,admin=1'
+    :param value: str
+    :return: dict role -> weight
+    """
+    mix = {}
+    for part in filter(None, (part.strip() for part in value.split(','))):
+        role, _, weight = part.partition('=')
+        if role not in SCENARIOS:
+            raise LoadTestError(f'Nieznany scenariusz: {role}, dostępne: {", ".join(SCENARIOS)}')
+        try:
+            mix[role] = float(weight or 1)
+        except ValueError:
+            raise LoadTestError(f'Nieprawidłowa waga scenariusza {role}: {weight}')
+    if not mix or sum(mix.values()) <= 0:
+        raise LoadTestError('Podaj co najmniej jeden scenariusz z dodatnią wagą')
+    return mix
+
+
+def assign_roles(count, mix):
+    """
+    Function that splits count users between roles proportionally to weights
+    :return: list of roles
+    """
+    total = sum(mix.values())
+    quotas = {role: weight / total * count for role, weight in mix.items()}
+    roles = []
+    for number in range(count):
+        # the role furthest behind its share so far, so every prefix of users keeps the mix
+        role = max(quotas, key=lambda name: quotas[name] * (number + 1) / count - roles.count(name))
+        roles.append(role)
+    return roles
+
+
+@dataclass
+class StageReport:
+    concurrency: int
+    seconds: float
+    urls: dict
+    total: dict
+    failed: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {'concurrency': self.concurrency, 'seconds': self.seconds, 'total': self.total,
+                'urls': self.urls, 'failed': self.failed}
+
+
+def _report(concurrency, seconds, recorder):
+    return StageReport(
+        concurrency=concurrency,
+        seconds=round(seconds, 2),
+        urls={name: stats.summary(seconds) for name, stats in sorted(recorder.urls.items())},
+        total=recorder.total().summary(seconds),
+    )
+
+
+async def _stage(users, duration):
+    recorder = Recorder()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def repeat(user):
+        user.recorder = recorder
+        scenario = SCENARIOS[user.role]
+        while loop.time() < deadline:
+            await scenario(user)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(repeat(user) for user in users))
+    return recorder, time.perf_counter() - start
+
+
+async def run(url, targets, stages, duration, usernames, password, mix, think_time=0.5, timeout=10, login_timeout=300,
+              max_error_rate=0.01, max_p95=1000, seed=2022, progress=None):
+    """
+    Function that logs in simulated users and runs stages of growing concurrency, it stops after
+    the first stage with error rate above max_error_rate or p95 latency above max_p95
+    :param url: root of the server, e.g. http://127.0.0.1:8000
+    :param targets: Targets, loaded before the event loop starts
+    :param stages: numbers of concurrent users, ascending
+    :param duration: seconds of every stage
+    :param usernames: accounts, simulated users use them in turns
+    :param password: password of the accounts
+    :param mix: dict role -> weight, see SCENARIOS
+    :param think_time: mean pause between requests of one user in seconds
+    :param timeout: seconds for one request
+    :param login_timeout: seconds for logging in all users, throttled logins wait for Retry-After
+    :param max_error_rate: fraction of failed requests, 0 disables the check
+    :param max_p95: milliseconds, 0 disables the check
+    :param seed: seed of random choices
+    :param progress: callable('login' or 'stage', StageReport) called after the login and every stage
+    :return: (login StageReport, list of StageReport)
+    """
+    parts = urlsplit(url)
+    if parts.scheme != 'http' or not parts.hostname:
+        raise LoadTestError(f'Obsługiwany jest tylko adres http://host:port, podano {url}')
+    if not stages or not usernames:
+        raise LoadTestError('Podaj liczbę użytkowników i co najmniej jeden etap')
+
+    count = max(stages)
+    roles = assign_roles(count, mix)
+    users = [VirtualUser(number, roles[number], usernames[number % len(usernames)], password,
+                         HttpClient(parts.hostname, parts.port or 80, timeout), targets, think_time, seed)
+             for number in range(count)]
+    loop = asyncio.get_running_loop()
+    try:
+        recorder = Recorder()
+        for user in users:
+            user.recorder = recorder
+        start = time.perf_counter()
+        deadline = loop.time() + login_timeout
+        await asyncio.gather(*(user.login(deadline) for user in users))
+        login = _report(count, time.perf_counter() - start, recorder)
+        failed = [user.username for user in users if not user.logged_in]
+        login.failed = sorted(set(failed))
+        if progress:
+            progress('login', login)
+        if failed:
+            return login, []
+
+        reports = []
+        for concurrency in stages:
+            recorder, seconds = await _stage(users[:concurrency], duration)
+            report = _report(concurrency, seconds, recorder)
+            if max_error_rate and report.total['error_rate'] > max_error_rate:
+                report.failed.append(f'error rate {report.total["error_rate"]:.2%}')
+            if max_p95 and (report.total['p95_ms'] or 0) > max_p95:
+                report.failed.append(f'p95 {report.total["p95_ms"]:.0f} ms')
+            reports.append(report)
+            if progress:
+                progress('stage', report)
+            if report.failed:
+                break
+        return login, reports
+    finally:
+        await asyncio.gather(*(user.client.close() for user in users))
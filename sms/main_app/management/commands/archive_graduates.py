@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from main_app.archive import BATCH_SIZE, ArchiveReport, archive_class, graduated_classes
+
+
+class Command(BaseCommand):
+    help = 'Moves graduated classes with their students, grades and attendance to the archive, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until-year', type=int, help='Only classes with SchoolClass.year up to this one.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Students per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list classes which would be archived.')
+
+    def handle(self, *args, **options):
+        classes = graduated_classes(options['until_year']).annotate(students=Count('student'))
+        total = ArchiveReport()
+        for school_class in classes:
+            if options['dry_run']:
+                self.stdout.write(f'{school_class.name} ({school_class.year}): {school_class.students} students')
+                continue
+            report = archive_class(school_class, batch_size=max(1, options['batch_size']))
+            self.stdout.write(f'{school_class.name} ({school_class.year}): {report.students} students, '
+                              f'{report.grades} grades, {report.presence} presence entries archived')
+            total.add(report)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{len(classes)} classes would be archived'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total.classes} classes, {total.students} students archived'))
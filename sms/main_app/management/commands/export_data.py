@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.exports import DEFAULT_CHUNK_SIZE, EXPORTS, FORMATS, export_lines
+from main_app.forms import ExportFilterForm
+
+
+class Command(BaseCommand):
+    help = 'Streams grades or presence list to csv/jsonl file without loading the table into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', default='-', help='Output file, "-" for stdout.')
+        parser.add_argument('--school-class', help='SchoolClass id')
+        parser.add_argument('--subject', help='Subject id')
+        parser.add_argument('--date-from', help='YYYY-MM-DD')
+        parser.add_argument('--date-to', help='YYYY-MM-DD')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        form = ExportFilterForm({
+            'format': options['format'],
+            'school_class': options['school_class'],
+            'subject': options['subject'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        lines = export_lines(options['kind'], options['format'], chunk_size=options['chunk_size'], **form.filters())
+        if options['output'] == '-':
+            self._write(lines, sys.stdout)
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                count = self._write(lines, output)
+            self.stderr.write(self.style.SUCCESS(f'{count} lines written to {options["output"]}'))
+
+    @staticmethod
+    def _write(lines, output):
+        count = 0
+        for line in lines:
+            output.write(line)
+            count += 1
+        return count
@@ -0,0 +1,72 @@
+import datetime
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+
+from main_app.models import SchoolClass, term_of
+from main_app.report_cards import FORMATS, ReportCardError, generate_class, init_worker
+
+
+class Command(BaseCommand):
+    help = 'Generates report cards (html/pdf) of all students of classes started in given year, ' \
+           'one class per worker process. Interrupted run can be repeated, finished files are skipped.'
+
+    def add_arguments(self, parser):
+        school_year, term = term_of(datetime.date.today())
+        parser.add_argument('--year', type=int, required=True, help='SchoolClass.year')
+        parser.add_argument('--school-year', type=int, default=school_year, help='Year in which school year starts')
+        parser.add_argument('--term', type=int, choices=(1, 2), default=term)
+        parser.add_argument('--format', nargs='+', choices=FORMATS, default=['html'], dest='formats')
+        parser.add_argument('--output', '-o', default='report_cards', help='Output directory')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (fork), 1 generates in this process')
+        parser.add_argument('--overwrite', action='store_true', help='Generate existing files again')
+
+    def handle(self, *args, **options):
+        classes = list(SchoolClass.objects.filter(year=options['year']).annotate(students=Count('student'))
+                       .order_by('-students', 'name'))
+        if not classes:
+            raise CommandError(f'Nie ma klas z roku {options["year"]}')
+        total = sum(school_class.students for school_class in classes)
+        arguments = (options['school_year'], options['term'], options['output'], tuple(options['formats']),
+                     options['overwrite'])
+        self.done = 0
+        failed = []
+
+        workers = max(1, min(options['workers'] or 1, len(classes)))
+        if workers == 1:
+            init_worker()
+            for school_class in classes:
+                try:
+                    self._report(school_class, generate_class(school_class.pk, *arguments), total)
+                except ReportCardError as e:
+                    failed.append(f'{school_class.name}: {e}')
+        else:
+            try:
+                context = multiprocessing.get_context('fork')
+            except ValueError:
+                raise CommandError('Równoległe generowanie wymaga systemu z fork(), użyj --workers 1')
+            # workers must not share connections of this process
+            connections.close_all()
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker) as pool:
+                futures = {pool.submit(generate_class, school_class.pk, *arguments): school_class
+                           for school_class in classes}
+                for future in as_completed(futures):
+                    school_class = futures[future]
+                    try:
+                        self._report(school_class, future.result(), total)
+                    except Exception as e:
+                        failed.append(f'{school_class.name}: {e}')
+
+        if failed:
+            raise CommandError('Nie wygenerowano świadectw klas:\n' + '\n'.join(failed))
+        self.stdout.write(self.style.SUCCESS(f'{total} report cards in {options["output"]}'))
+
+    def _report(self, school_class, result, total):
+        self.done += result.written + result.skipped
+        self.stdout.write(f'[{self.done}/{total}] {school_class.name} ({school_class.year}): '
+                          f'{result.written} written, {result.skipped} skipped')
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.roster import IMPORTERS, RosterFormatError, read_rows, write_error_report
+
+
+class Command(BaseCommand):
+    help = 'Imports students or teachers from csv/xlsx file using chunked bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only validate rows, do not save anything.')
+        parser.add_argument('--errors', help='Write per-row error report as csv to this file ("-" for stdout).')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                rows = read_rows(fileobj, options['path'])
+                report = IMPORTERS[options['kind']](rows, chunk_size=options['chunk_size'],
+                                                    dry_run=options['dry_run'])
+        except (OSError, RosterFormatError) as e:
+            raise CommandError(e)
+
+        if options['errors'] == '-':
+            write_error_report(report, sys.stdout)
+        elif options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as errors_file:
+                write_error_report(report, errors_file)
+        else:
+            for error in report.errors[:20]:
+                self.stderr.write(f'line {error.line}: {"; ".join(error.errors)}')
+
+        verb = 'validated' if options['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS(f'{report.created} {options["kind"]} {verb}, {report.failed} rows rejected'))
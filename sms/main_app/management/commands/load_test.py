@@ -0,0 +1,100 @@
+import asyncio
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.loadtest import LoadTestError, Targets, parse_mix, prepare_users, run
+
+
+class Command(BaseCommand):
+    help = 'Load test of a running server (runserver, gunicorn, uvicorn) which uses the same database: ' \
+           'simulated teachers and admins log in and click through the app, concurrency grows in stages ' \
+           'until error rate or p95 latency crosses the limit. Logins from one address are throttled ' \
+           '(LOGIN_THROTTLE), set it to {} on the server to log in hundreds of users quickly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Root of the server, http only.')
+        parser.add_argument('--concurrency', default='1,5,10,25,50,100',
+                            help='Concurrent users of the stages, comma separated.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of every stage.')
+        parser.add_argument('--mix', default='teacher=3,admin=1', help='Weights of scenarios.')
+        parser.add_argument('--think-time', type=float, default=0.5,
+                            help='Mean pause between requests of one user in seconds, 0 for none.')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds for one request.')
+        parser.add_argument('--max-error-rate', type=float, default=0.01, help='0 disables the check.')
+        parser.add_argument('--max-p95', type=float, default=1000, help='Milliseconds, 0 disables the check.')
+        parser.add_argument('--users', type=int, help='Accounts to log in with, the highest concurrency by default.')
+        parser.add_argument('--username-prefix', default='loadtest')
+        parser.add_argument('--password', default='loadtest')
+        parser.add_argument('--create-users', action='store_true', help='Create missing accounts first.')
+        parser.add_argument('--login-timeout', type=float, default=300)
+        parser.add_argument('--seed', type=int, default=2022)
+        parser.add_argument('--json', help='Save results to this file.')
+
+    def write_report(self, title, report):
+        self.stdout.write(f'\n{title}: {report.concurrency} users, {report.seconds} s, '
+                          f'{report.total["rps"]} req/s')
+        self.stdout.write(f'{"url":<20}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+                          f'{"errors":>10}{"429":>8}')
+        for name, values in list(report.urls.items()) + [('total', report.total)]:
+            cells = [f'{values[key]:.1f}' if values[key] is not None else '-'
+                     for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms')]
+            self.stdout.write(f'{name:<20}{values["requests"]:>10}' + ''.join(f'{cell:>10}' for cell in cells)
+                              + f'{values["error_rate"]:>10.2%}{values["throttled"]:>8}')
+        if report.failed and title == 'stage':
+            self.stdout.write(self.style.ERROR('limit exceeded: ' + ', '.join(report.failed)))
+
+    def handle(self, *args, **options):
+        try:
+            stages = sorted({int(value) for value in options['concurrency'].split(',') if value.strip()})
+        except ValueError:
+            raise CommandError('--concurrency to lista liczb, np. 1,10,50')
+        if not stages or stages[0] < 1:
+            raise CommandError('Liczba równoczesnych użytkowników musi być dodatnia')
+        try:
+            mix = parse_mix(options['mix'])
+            targets = Targets.load()
+        except LoadTestError as error:
+            raise CommandError(error)
+
+        count = options['users'] or stages[-1]
+        if options['create_users']:
+            usernames = prepare_users(count, options['username_prefix'], options['password'])
+        else:
+            usernames = [f'{options["username_prefix"]}{number}' for number in range(1, count + 1)]
+
+        def progress(kind, report):
+            self.write_report(kind, report)
+            if report.failed and kind == 'login':
+                self.stdout.write(self.style.ERROR(f'login failed: {", ".join(report.failed)}'))
+
+        try:
+            login, reports = asyncio.run(run(
+                options['url'], targets, stages, options['duration'], usernames, options['password'], mix,
+                think_time=options['think_time'], timeout=options['timeout'],
+                login_timeout=options['login_timeout'], max_error_rate=options['max_error_rate'],
+                max_p95=options['max_p95'], seed=options['seed'], progress=progress,
+            ))
+        except LoadTestError as error:
+            raise CommandError(error)
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps({
+                'url': options['url'],
+                'mix': mix,
+                'think_time': options['think_time'],
+                'login': login.as_dict(),
+                'stages': [report.as_dict() for report in reports],
+            }, indent=2))
+
+        if login.failed:
+            raise CommandError('Nie udało się zalogować wszystkich użytkowników')
+        broken = next((report for report in reports if report.failed), None)
+        if broken:
+            kept = [report.concurrency for report in reports if not report.failed]
+            self.stdout.write(self.style.WARNING(
+                f'\nlimits exceeded at {broken.concurrency} concurrent users'
+                + (f', last stage within limits: {kept[-1]}' if kept else '')))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\nall stages within limits, up to {stages[-1]} concurrent users'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main_app import views  # noqa: F401, registers cached pages
+from main_app.page_cache import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = 'Prints hit/miss counters of cached pages. Counters are kept in the cache backend, ' \
+           'so with per-process locmem cache this command sees only its own (empty) counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Set counters to zero after printing.')
+
+    def handle(self, *args, **options):
+        for name, values in stats().items():
+            rate = '-' if values['hit_rate'] is None else f'{values["hit_rate"]:.1%}'
+            self.stdout.write(f'{name}: {values["hits"]} hits, {values["misses"]} misses, hit rate {rate}')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('counters reset'))
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from main_app import partitions
+
+
+class Command(BaseCommand):
+    help = 'Creates monthly partitions of attendance ahead of time and removes old months. ' \
+           'Meant to be run periodically, e.g. from cron. Without partitioning (SQLite) old rows are deleted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Partitions created after this month.')
+        parser.add_argument('--retain-months', type=int,
+                            help='Remove attendance older than this many months (whole months, by partitions).')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop removed partitions, by default they are only detached and stay as tables.')
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        last = today
+        for _ in range(max(0, options['months_ahead'])):
+            last = partitions.next_month(last)
+        for name in partitions.ensure_partitions(today, last):
+            self.stdout.write(f'created {name}')
+
+        if options['retain_months'] is not None:
+            before = partitions.month_start(today)
+            for _ in range(max(0, options['retain_months'])):
+                before = (before - datetime.timedelta(days=1)).replace(day=1)
+            for month, name, deleted in partitions.remove_before(before, drop=options['drop']):
+                if name:
+                    self.stdout.write(f'{month:%Y-%m}: {"dropped" if options["drop"] else "detached"} {name}')
+                else:
+                    self.stdout.write(f'{month:%Y-%m}: deleted {deleted} entries')
+
+        if partitions.is_partitioned():
+            self.stdout.write(f'{len(partitions.partitions())} monthly partitions, '
+                              f'{partitions.default_partition_rows()} entries in the default partition')
+        self.stdout.write(self.style.SUCCESS('done'))
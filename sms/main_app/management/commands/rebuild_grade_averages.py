@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main_app.averages import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recalculates all per-student, per-subject and per-term grade averages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{count} grade averages rebuilt'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main_app.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Replaces cached dashboard counters with exact counts. Meant to be run periodically, e.g. from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Number of last days of attendance counters to fix.')
+
+    def handle(self, *args, **options):
+        values = reconcile(days=max(1, options['days']))
+        for name, value in sorted(values.items()):
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS(f'{len(values)} counters reconciled'))
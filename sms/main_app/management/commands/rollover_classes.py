@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.rollover import RolloverError, rollover
+
+
+class Command(BaseCommand):
+    help = 'Moves classes of a year with their students to the next school year, final-year classes graduate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, required=True, help='SchoolClass.year of classes to move')
+        parser.add_argument('--final-grade', type=int, help='Last level of the school, SCHOOL_FINAL_GRADE by default')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the plan, do not save anything.')
+
+    def handle(self, *args, **options):
+        try:
+            report = rollover(options['year'], final_grade=options['final_grade'], dry_run=options['dry_run'])
+        except RolloverError as e:
+            raise CommandError(e)
+
+        for move in report.moves:
+            target = 'graduates' if move.graduates else f'{move.target_name} ({report.to_year})'
+            self.stdout.write(f'{move.source.name} ({report.from_year}): {move.students} students -> {target}')
+        for school_class, error in report.skipped:
+            self.stderr.write(f'{school_class.name} ({report.from_year}) skipped: {error}')
+
+        verb = 'would be moved' if report.dry_run else 'moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.moved_students} students {verb}, {report.created} new classes, '
+            f'{len(report.graduated)} classes graduated'))
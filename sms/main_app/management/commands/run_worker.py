@@ -0,0 +1,65 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from main_app.jobs import work, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (imports, exports, report cards, rollover). Any number of workers ' \
+           'can run at once, on one or many machines sharing the database. SIGTERM or Ctrl+C stops ' \
+           'a worker after its current job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes (fork).')
+        parser.add_argument('--burst', action='store_true', help='Exit when no job is due.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between checks of an empty queue.')
+        parser.add_argument('--max-jobs', type=int, help='Exit after this many jobs (per process).')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        if processes == 1:
+            self._work(options)
+            return
+
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            raise CommandError('Kilka procesów wymaga systemu z fork(), uruchom kilka razy run_worker')
+        # workers must not share connections of this process
+        connections.close_all()
+        children = [context.Process(target=self._work, args=(options,), name=f'worker-{number}')
+                    for number in range(processes)]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        # Ctrl+C reaches the children directly, the parent only waits for them
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for child in children:
+            child.join()
+        failed = [child.name for child in children if child.exitcode]
+        if failed:
+            raise CommandError(f'Procesy zakończone z błędem: {", ".join(failed)}')
+
+    def _work(self, options):
+        stop = threading.Event()
+        previous = {signum: signal.signal(signum, lambda *_: stop.set())
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+        name = worker_name()
+        self.stdout.write(f'worker {name} started')
+        try:
+            processed = work(name, burst=options['burst'], poll=options['poll'], max_jobs=options['max_jobs'],
+                             stop=stop)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'worker {name} finished, {processed} jobs'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.models import Student, Subject, Teacher
+from main_app.synthetic import seed_school
+
+
+class Command(BaseCommand):
+    help = 'Fills an empty database with a generated school of any size (COPY on PostgreSQL), ' \
+           'e.g. seed_school --students 20000 --years 3 gives about 2.4M grades and 11M presence entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, required=True)
+        parser.add_argument('--years', type=float, default=1, help='Years of grades and daily presence.')
+        parser.add_argument('--students-per-class', type=int, default=30)
+        parser.add_argument('--teachers', type=int, help='One for 15 students by default.')
+        parser.add_argument('--subjects', type=int, default=16)
+        parser.add_argument('--topics-per-subject', type=int, default=10)
+        parser.add_argument('--grades-per-year', type=int, default=40, help='Grades of every student in a year.')
+        parser.add_argument('--no-presence', action='store_false', dest='presence')
+        parser.add_argument('--seed', type=int, default=2022, help='The same seed gives the same school.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per COPY/INSERT.')
+
+    def handle(self, *args, **options):
+        if options['students'] < 0 or options['students_per_class'] < 1:
+            raise CommandError('Liczba uczniów i wielkość klasy muszą być dodatnie')
+        if Student.objects.exists() or Teacher.objects.exists() or Subject.objects.exists():
+            raise CommandError('Baza nie jest pusta, użyj najpierw "manage.py flush"')
+
+        report = seed_school(
+            options['students'], years=options['years'], students_per_class=options['students_per_class'],
+            teachers=options['teachers'], subjects=options['subjects'],
+            topics_per_subject=options['topics_per_subject'], grades_per_year=options['grades_per_year'],
+            presence=options['presence'], seed=options['seed'], batch_size=max(1, options['batch_size']),
+            progress=lambda table, rows, seconds: self.stdout.write(f'{table}: {rows} rows in {seconds} s'),
+        )
+        total = sum(report.counts.values())
+        self.stdout.write(self.style.SUCCESS(f'{total} rows in {sum(report.seconds.values()):.1f} s'))
@@ -0,0 +1,183 @@
+import contextvars
+import functools
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('main_app.profiling')
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+# IN (%s, %s, %s) and multi-row VALUES differ only by the number of parameters
+_REPEATED_PARAMS = re.compile(r'%s(?:\s*,\s*%s)+')
+_REPEATED_ROWS = re.compile(r'\((%s)\)(?:\s*,\s*\(%s\))+')
+
+
+def query_shape(sql):
+    """
+    Function that reduces SQL to its shape, queries differing only by parameters have the same shape
+    :param sql: SQL with placeholders, as passed to cursor.execute
+    :return: shape
+    """
+    sql = _REPEATED_PARAMS.sub('%s', sql)
+    return _REPEATED_ROWS.sub(r'(\1)', sql)
+
+
+class RequestProfile:
+    """
+    Measurements of one request, filled by the query wrapper of every connection and timed template rendering.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.render_started = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.shapes = Counter()
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def duplicates(self, threshold):
+        return {shape: count for shape, count in self.shapes.most_common() if count >= threshold}
+
+
+def _profile_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    """
+    Function that adds the query wrapper to the connection for its whole life. Under ASGI the ORM runs
+    in sync_to_async threads with their own connections, the context (and the profile) is copied to them.
+    :param connection: DatabaseWrapper
+    :return: None
+    """
+    if getattr(connection, 'profiling_wrapper', None) is None:
+        # the context manager removes the wrapper when it is closed, it is kept open with the connection
+        connection.profiling_wrapper = connection.execute_wrapper(_profile_query)
+        connection.profiling_wrapper.__enter__()
+
+
+connection_created.connect(_install, dispatch_uid='main_app.middleware.install')
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests (PROFILING_SAMPLE_RATE setting, 0-1) without DEBUG: number and time of SQL
+    queries, query shapes repeated at least PROFILING_DUPLICATE_THRESHOLD times (N+1), template render time,
+    view time and total time. Results are sent in Server-Timing header and logged as json by
+    'main_app.profiling' logger. Should be the first middleware, so queries of sessions and auth are counted.
+
+    Template time is measured for TemplateResponse (class based views) and includes queries evaluated
+    while rendering, templates rendered inside the view (render shortcut) count as view time. View time lasts
+    from view dispatch to rendered response. Body of streaming responses is produced later and is not measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # connections opened before the middleware was loaded, later ones get it from connection_created
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile)
+
+    def _sampled(self):
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        return rate > 0 and random.random() < rate
+
+    def _finish(self, request, response, profile):
+        finished = time.perf_counter()
+        duplicates = profile.duplicates(getattr(settings, 'PROFILING_DUPLICATE_THRESHOLD', 3))
+        view_time = finished - profile.view_started if profile.view_started is not None else 0
+        timings = [
+            f'db;dur={_ms(profile.sql_time)};desc="{profile.queries} queries"',
+            f'dup;desc="{len(duplicates)} repeated shapes, {sum(duplicates.values())} queries"',
+            f'tpl;dur={_ms(profile.template_time)}',
+            f'view;dur={_ms(view_time)}',
+            f'total;dur={_ms(finished - profile.started)}',
+        ]
+        response['Server-Timing'] = ', '.join(timings)
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'queries': profile.queries,
+            'sql_ms': _ms(profile.sql_time),
+            'template_ms': _ms(profile.template_time),
+            'view_ms': _ms(view_time),
+            'total_ms': _ms(finished - profile.started),
+            'duplicates': [{'sql': shape[:500], 'count': count} for shape, count in duplicates.items()],
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+        return None
+
+    def process_template_response(self, request, response):
+        profile = _current.get()
+        if profile is not None:
+            # the first middleware is the last one called before the response is rendered
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(functools.partial(self._rendered, profile))
+        return response
+
+    @staticmethod
+    def _rendered(profile, response):
+        profile.template_time += time.perf_counter() - profile.render_started
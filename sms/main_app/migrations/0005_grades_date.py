@@ -0,0 +1,19 @@
+# Generated by Django 4.0.4 on 2026-10-18 16:39
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grades',
+            name='date',
+            field=models.DateField(db_index=True, default=datetime.date.today, verbose_name='Data'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.0.4 on 2026-10-18 16:40
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_grades_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grades',
+            name='weight',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)], verbose_name='Waga'),
+        ),
+        migrations.CreateModel(
+            name='GradeAverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('school_year', models.PositiveIntegerField(verbose_name='Rok szkolny')),
+                ('term', models.PositiveSmallIntegerField(choices=[(1, 'Semestr 1'), (2, 'Semestr 2')], verbose_name='Semestr')),
+                ('grade_count', models.PositiveIntegerField(default=0, verbose_name='Liczba ocen')),
+                ('weight_sum', models.FloatField(default=0)),
+                ('weighted_sum', models.FloatField(default=0)),
+                ('average', models.FloatField(verbose_name='Średnia')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_averages', to='main_app.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_averages', to='main_app.subject')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='gradeaverage',
+            index=models.Index(fields=['subject', 'school_year', 'term'], name='grade_average_subject_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='gradeaverage',
+            constraint=models.UniqueConstraint(fields=('student', 'subject', 'school_year', 'term'), name='unique_grade_average'),
+        ),
+    ]
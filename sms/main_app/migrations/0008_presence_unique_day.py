@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:43
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicated_days(apps, schema_editor):
+    """
+    Keeps only the latest presence entry of a student on each day, so unique constraint can be added.
+    """
+    PresenceList = apps.get_model('main_app', 'PresenceList')
+    duplicates = PresenceList.objects.values('student', 'day').annotate(entries=Count('id'), keep=Max('id')) \
+        .filter(entries__gt=1).order_by()
+    for row in duplicates.iterator():
+        PresenceList.objects.filter(student=row['student'], day=row['day']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_stat_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='presencelist',
+            name='day',
+            field=models.DateField(),
+        ),
+        migrations.RunPython(remove_duplicated_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='presencelist',
+            constraint=models.UniqueConstraint(fields=('student', 'day'), name='unique_presence_per_day'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_presence_unique_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presencelist',
+            index=models.Index(fields=['day'], name='presence_day_idx'),
+        ),
+    ]
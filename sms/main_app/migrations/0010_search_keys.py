@@ -0,0 +1,89 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:46
+
+import unicodedata
+
+from django.db import DatabaseError, migrations, models, transaction
+
+TRIGRAM_INDEXES = [
+    ('main_app_student', 'first_key'),
+    ('main_app_student', 'last_key'),
+    ('main_app_teacher', 'first_key'),
+    ('main_app_teacher', 'last_key'),
+]
+
+
+def search_key(value):
+    # frozen copy of main_app.models.search_key, the migration must not change when the model code does
+    value = (value or '').lower().replace('ł', 'l')
+    return ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c))
+
+
+def fill_search_keys(apps, schema_editor):
+    for model_name in ('Student', 'Teacher'):
+        model = apps.get_model('main_app', model_name)
+        batch = []
+        for person in model.objects.only('id', 'first_name', 'last_name').iterator(chunk_size=2000):
+            person.first_key = search_key(person.first_name)
+            person.last_key = search_key(person.last_name)
+            batch.append(person)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['first_key', 'last_key'])
+                batch = []
+        model.objects.bulk_update(batch, ['first_key', 'last_key'])
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    GIN trigram indexes for typo tolerant search on PostgreSQL. Creating pg_trgm extension needs
+    privileges, without them search falls back to prefix matching.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic():
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_presence_day_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='first_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='last_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='first_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='last_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:05
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery
+
+BATCH_SIZE = 5000
+
+INDEXES = [
+    models.Index(fields=['student', 'subject', 'date'], name='grade_student_subject_idx'),
+    models.Index(fields=['subject', 'date'], name='grade_subject_date_idx'),
+]
+
+
+def _models(apps):
+    Grades = apps.get_model('main_app', 'Grades')
+    return (Grades, Grades._meta.get_field('student').remote_field.through,
+            Grades._meta.get_field('topic').remote_field.through)
+
+
+def copy_students_to_fk(apps, schema_editor):
+    """
+    Moves students of grades from the m2m table to the new column. Every batch of grade ids is one short
+    transaction, so the table is never locked for the whole copy. A grade given to more than one student
+    becomes one grade per student (with the same topics), grades without students are dropped.
+    """
+    Grades, StudentThrough, TopicThrough = _models(apps)
+    db = schema_editor.connection.alias
+
+    last_id = Grades.objects.using(db).aggregate(last=Max('id'))['last'] or 0
+    first_student = StudentThrough.objects.using(db).filter(grades_id=OuterRef('pk')).order_by('id') \
+        .values('student_id')[:1]
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        with transaction.atomic(using=db):
+            Grades.objects.using(db).filter(id__gte=start, id__lt=start + BATCH_SIZE) \
+                .update(student_fk=Subquery(first_student))
+
+    extra = StudentThrough.objects.using(db).filter(~Q(student_id=F('grades__student_fk_id'))).order_by('id')
+    last_link = 0
+    while True:
+        links = list(extra.filter(id__gt=last_link).values_list('id', 'grades_id', 'student_id')[:BATCH_SIZE])
+        if not links:
+            break
+        last_link = links[-1][0]
+        with transaction.atomic(using=db):
+            originals = Grades.objects.using(db).in_bulk({grade_id for _, grade_id, _ in links})
+            topics = defaultdict(list)
+            for grade_id, topic_id in TopicThrough.objects.using(db).filter(grades_id__in=originals) \
+                    .values_list('grades_id', 'schoolsubjecttopics_id'):
+                topics[grade_id].append(topic_id)
+            copies = Grades.objects.using(db).bulk_create([
+                Grades(grade=originals[grade_id].grade, weight=originals[grade_id].weight,
+                       date=originals[grade_id].date, subject_id=originals[grade_id].subject_id,
+                       student_fk_id=student_id)
+                for _, grade_id, student_id in links
+            ])
+            TopicThrough.objects.using(db).bulk_create([
+                TopicThrough(grades_id=copy.pk, schoolsubjecttopics_id=topic_id)
+                for copy, (_, grade_id, _) in zip(copies, links)
+                for topic_id in topics[grade_id]
+            ])
+
+    orphans = Grades.objects.using(db).filter(student_fk__isnull=True)
+    while True:
+        ids = list(orphans.values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        with transaction.atomic(using=db):
+            TopicThrough.objects.using(db).filter(grades_id__in=ids).delete()
+            Grades.objects.using(db).filter(id__in=ids).delete()
+
+    # number of grades changed, the dashboard counter is seeded again on next read
+    apps.get_model('main_app', 'StatCounter').objects.using(db).filter(name='grades').delete()
+
+
+def copy_students_to_m2m(apps, schema_editor):
+    Grades, StudentThrough, _ = _models(apps)
+    db = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        rows = list(Grades.objects.using(db).filter(id__gt=last_id, student_fk__isnull=False).order_by('id')
+                    .values_list('id', 'student_fk_id')[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        StudentThrough.objects.using(db).bulk_create(
+            [StudentThrough(grades_id=grade_id, student_id=student_id) for grade_id, student_id in rows])
+
+
+def add_indexes(apps, schema_editor):
+    """
+    On PostgreSQL indexes are built CONCURRENTLY, without blocking writes to the table.
+    """
+    Grades = apps.get_model('main_app', 'Grades')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(Grades, index, concurrently=True)
+        else:
+            schema_editor.add_index(Grades, index)
+
+
+def remove_indexes(apps, schema_editor):
+    Grades = apps.get_model('main_app', 'Grades')
+    for index in INDEXES:
+        schema_editor.remove_index(Grades, index)
+
+
+class Migration(migrations.Migration):
+    # batches of the data copy and concurrent index builds need their own transactions
+    atomic = False
+
+    dependencies = [
+        ('main_app', '0010_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grades',
+            name='student_fk',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='+', to='main_app.student'),
+        ),
+        migrations.RunPython(copy_students_to_fk, copy_students_to_m2m),
+        migrations.RemoveField(
+            model_name='grades',
+            name='student',
+        ),
+        migrations.RenameField(
+            model_name='grades',
+            old_name='student_fk',
+            new_name='student',
+        ),
+        migrations.AlterField(
+            model_name='grades',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                    to='main_app.student', verbose_name='Uczeń'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='grades', index=index) for index in INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_indexes, remove_indexes),
+            ],
+        ),
+    ]
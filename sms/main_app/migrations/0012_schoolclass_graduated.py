@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_grades_student_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schoolclass',
+            name='graduated',
+            field=models.BooleanField(default=False, verbose_name='Absolwenci'),
+        ),
+    ]
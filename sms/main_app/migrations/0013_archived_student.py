@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_schoolclass_graduated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedStudent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.PositiveBigIntegerField(unique=True, verbose_name='Id ucznia')),
+                ('first_name', models.CharField(max_length=32, verbose_name='Imię')),
+                ('last_name', models.CharField(max_length=32, verbose_name='Nazwisko')),
+                ('gender', models.CharField(choices=[('M', 'Mężczyzna'), ('K', 'Kobieta')], max_length=16, verbose_name='Płeć')),
+                ('age', models.IntegerField(verbose_name='Wiek')),
+                ('class_name', models.CharField(blank=True, max_length=8, verbose_name='Klasa')),
+                ('class_year', models.PositiveIntegerField(default=0, verbose_name='Rok')),
+                ('grades', models.JSONField(default=list)),
+                ('presence', models.JSONField(default=list)),
+                ('archived', models.DateTimeField(auto_now_add=True, verbose_name='Zarchiwizowano')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_name', 'first_name', 'id'], name='archived_name_keyset_idx'), models.Index(fields=['class_year', 'class_name', 'last_name', 'first_name', 'id'], name='archived_class_keyset_idx')],
+            },
+        ),
+    ]
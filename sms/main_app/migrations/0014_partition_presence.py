@@ -0,0 +1,169 @@
+import datetime
+
+from django.db import migrations, transaction
+
+# frozen copies of main_app.partitions, the migration must not change when that module does
+TABLE = 'main_app_presencelist'
+OLD_TABLE = f'{TABLE}_old'
+DEFAULT_PARTITION = f'{TABLE}_default'
+MONTHS_AHEAD = 3
+BATCH_SIZE = 50000
+
+
+def next_month(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def months(first, last):
+    result = []
+    month = first.replace(day=1)
+    while month <= last:
+        result.append(month)
+        month = next_month(month)
+    return result
+
+
+def create_partition(cursor, month):
+    name, upper = f'{TABLE}_p{month:%Y_%m}', next_month(month)
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+    cursor.execute(f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE day >= %s AND day < %s RETURNING *) '
+                   f'INSERT INTO "{name}" SELECT * FROM moved', [month, upper])
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [month, upper])
+
+
+def table_exists(cursor, table):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [table])
+    return cursor.fetchone()[0]
+
+
+def is_identity(cursor, table):
+    """
+    Identity column (Django 4.1+ creates AutoField as GENERATED BY DEFAULT AS IDENTITY) or legacy serial
+    """
+    cursor.execute("SELECT attidentity <> '' FROM pg_attribute WHERE attrelid = %s::regclass "
+                   "AND attname = 'id'", [table])
+    return cursor.fetchone()[0]
+
+
+def create_table(cursor, partitioned):
+    """
+    Renames the table to OLD_TABLE and creates an empty one with the same columns (and monthly partitions),
+    constraints and indexes are added after the copy.
+    """
+    cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+    including = 'INCLUDING DEFAULTS INCLUDING IDENTITY' if is_identity(cursor, OLD_TABLE) else 'INCLUDING DEFAULTS'
+    layout = ' PARTITION BY RANGE (day)' if partitioned else ''
+    cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" {including}){layout}')
+    if partitioned:
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+        cursor.execute(f'SELECT min(day) FROM "{OLD_TABLE}"')
+        today = datetime.date.today()
+        last = today
+        for _ in range(MONTHS_AHEAD):
+            last = next_month(last)
+        for month in months(cursor.fetchone()[0] or today, last):
+            create_partition(cursor, month)
+
+
+def copy_rows(connection):
+    """
+    Copies rows in batches of BATCH_SIZE ids, every batch is committed on its own. After an interruption
+    the copy continues behind the highest copied id.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM "{TABLE}"')
+        last = cursor.fetchone()[0]
+        while True:
+            cursor.execute(f'SELECT max(id) FROM (SELECT id FROM "{OLD_TABLE}" WHERE id > %s '
+                           f'ORDER BY id LIMIT %s) batch', [last, BATCH_SIZE])
+            upper = cursor.fetchone()[0]
+            if upper is None:
+                return
+            with transaction.atomic(using=connection.alias):
+                cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}" WHERE id > %s AND id <= %s',
+                               [last, upper])
+            last = upper
+
+
+def finish_table(cursor, partitioned):
+    """
+    Moves the id sequence, constraints and indexes of OLD_TABLE to the new table and drops OLD_TABLE.
+    Primary key of a partitioned table has to contain day, so it is (id, day).
+    """
+    cursor.execute('SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint '
+                   "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c')", [OLD_TABLE])
+    constraints = cursor.fetchall()
+    names = {name for name, _, _ in constraints}
+    cursor.execute('SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s', [OLD_TABLE])
+    indexes = [(name, definition) for name, definition in cursor.fetchall() if name not in names]
+
+    if is_identity(cursor, OLD_TABLE):
+        # the new table got its own identity sequence (INCLUDING IDENTITY), it starts after copied ids
+        cursor.execute(f'SELECT setval(pg_get_serial_sequence(%s, \'id\'), '
+                       f'coalesce((SELECT max(id) FROM "{TABLE}"), 0) + 1, false)', [TABLE])
+    else:
+        # serial column, the new table uses the same sequence, which must survive dropping OLD_TABLE
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [OLD_TABLE])
+        cursor.execute(f'ALTER SEQUENCE {cursor.fetchone()[0]} OWNED BY "{TABLE}".id')
+    cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+
+    for name, kind, definition in constraints:
+        if kind == 'p':
+            definition = 'PRIMARY KEY (id, day)' if partitioned else 'PRIMARY KEY (id)'
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+    for name, definition in indexes:
+        definition = definition.replace(' ON ONLY ', ' ON ').replace(f'"{OLD_TABLE}"', f'"{TABLE}"') \
+            .replace(f'.{OLD_TABLE} ', f'.{TABLE} ').replace(f' {OLD_TABLE} ', f' {TABLE} ')
+        cursor.execute(definition)
+
+
+def rebuild_table(schema_editor, partitioned):
+    """
+    Rebuilds PresenceList as a partitioned (or back as a plain) table in three steps which commit on their
+    own: new empty table, batched copy, constraints and indexes. A failed run is continued by running
+    migrate again.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [TABLE])
+        done = cursor.fetchone()[0] == ('p' if partitioned else 'r')
+    if not done:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            create_table(cursor, partitioned)
+    with connection.cursor() as cursor:
+        if not table_exists(cursor, OLD_TABLE):
+            return
+    copy_rows(connection)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        finish_table(cursor, partitioned)
+
+
+def partition_presence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_table(schema_editor, partitioned=True)
+
+
+def unpartition_presence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    """
+    On PostgreSQL main_app_presencelist becomes a table partitioned by month of day (see main_app.partitions),
+    model state does not change. Other databases keep the plain table.
+
+    DOWNTIME: stop the web and worker processes before migrating. Attendance is missing from the new table
+    until the copy ends. The copy runs in batches of BATCH_SIZE rows, each in its own transaction (the
+    migration is not atomic), so no transaction holds the whole table; constraints and indexes are built
+    once at the end. Downtime grows with the number of attendance entries.
+    """
+    atomic = False
+
+    dependencies = [
+        ('main_app', '0013_archived_student'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_presence, unpartition_presence),
+    ]
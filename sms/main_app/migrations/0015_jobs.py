@@ -0,0 +1,44 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main_app', '0014_partition_presence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32, verbose_name='Rodzaj')),
+                ('params', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'W kolejce'), ('running', 'W trakcie'), ('done', 'Zakończone'), ('failed', 'Błąd')], default='queued', max_length=16, verbose_name='Status')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Postęp')),
+                ('message', models.CharField(blank=True, max_length=200, verbose_name='Komunikat')),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, verbose_name='Błąd')),
+                ('input', models.FileField(blank=True, upload_to='jobs/input/')),
+                ('output', models.FileField(blank=True, upload_to='jobs/output/')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Próby')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Rozpoczęto')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Zakończono')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx')],
+            },
+        ),
+    ]
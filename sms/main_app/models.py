@@ -1,8 +1,11 @@
 import datetime
+import unicodedata
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.db import models
+from django.utils import timezone
 
 from django.forms.models import ModelForm
 
@@ -41,6 +44,30 @@ def max_value_current_year(value):
     return MaxValueValidator(current_year() + 1)(value)
 
 
+def term_of(day):
+    """
+    Function that returns school year and term of given date. School year starts in September,
+    first term lasts until the end of January.
+    :param day: date
+    :return: (school year, term)
+    """
+    if day.month >= 9:
+        return day.year, 1
+    if day.month == 1:
+        return day.year - 1, 1
+    return day.year - 1, 2
+
+
+def search_key(value):
+    """
+    Function that folds name for searching: lower case without Polish diacritics, e.g. 'Łukasz' -> 'lukasz'
+    :param value: name
+    :return: normalized name
+    """
+    value = (value or '').lower().replace('ł', 'l')
+    return ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c))
+
+
 def validate_grades(value):
     if value < 1 or value > 6:
         raise ValidationError('Ocena musi być z przedziału 1-6')
@@ -48,11 +75,34 @@ def validate_grades(value):
 
 # MODELS
 
+class SearchableName(models.Model):
+    """
+    Abstract model with normalized copies of first and last name used by the search index.
+    """
+    first_key = models.CharField(max_length=32, editable=False, default='', db_index=True)
+    last_key = models.CharField(max_length=32, editable=False, default='', db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def update_search_key(self):
+        self.first_key = search_key(self.first_name)
+        self.last_key = search_key(self.last_name)
+
+    def save(self, *args, **kwargs):
+        self.update_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'first_key', 'last_key'}
+        super().save(*args, **kwargs)
+
+
 class SchoolClass(models.Model):
     name = models.CharField(max_length=8, verbose_name='Nazwa')
     year = models.PositiveIntegerField(
         default=current_year(),
         validators=[MinValueValidator(2020), max_value_current_year], verbose_name='Rok')
+    graduated = models.BooleanField(default=False, verbose_name='Absolwenci')
 
     class Meta:
         unique_together = ['name', 'year']
@@ -81,12 +131,17 @@ class SubjectForm(ModelForm):
         fields = ['name']
 
 
-class Teacher(models.Model):
+class Teacher(SearchableName):
     first_name = models.CharField(max_length=32, verbose_name='Imię', validators=[validate_only_letters])
     last_name = models.CharField(max_length=32, verbose_name='Nazwisko', validators=[validate_only_letters])
     gender = models.CharField(choices=GENDER_CHOICES, max_length=16, verbose_name='Płeć')
     subject = models.ManyToManyField(Subject, verbose_name='Przedmiot')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='teacher_name_keyset_idx'),
+        ]
+
     def __str__(self):
         return f'{self.first_name} {self.last_name} {self.subject}'
 
@@ -97,13 +152,18 @@ class TeacherForm(ModelForm):
         fields = '__all__'
 
 
-class Student(models.Model):
+class Student(SearchableName):
     first_name = models.CharField(max_length=32, verbose_name='Imię', validators=[validate_only_letters])
     last_name = models.CharField(max_length=32, verbose_name='Nazwisko', validators=[validate_only_letters])
     gender = models.CharField(choices=GENDER_CHOICES, max_length=16, verbose_name='Płeć')
     age = models.IntegerField(verbose_name='Wiek', validators=[validate_year])
     school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE, default=None, null=True, verbose_name='Rok rozpoczęcia nauki/klasa')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='student_name_keyset_idx'),
+        ]
+
     def __str__(self):
         return f'{self.first_name} {self.last_name} {self.age}'
 
@@ -116,9 +176,17 @@ class StudentForm(ModelForm):
 
 class PresenceList(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
-    day = models.DateTimeField()
+    day = models.DateField()
     present = models.BooleanField(null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'day'], name='unique_presence_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='presence_day_idx'),
+        ]
+
 
 class PresenceListForm(ModelForm):
     class Meta:
@@ -144,10 +212,142 @@ class Grades(models.Model):
     grade = models.FloatField(max_length=8, verbose_name='Ocena', validators=[validate_grades])
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, verbose_name='Przedmiot')
     topic = models.ManyToManyField(SchoolSubjectTopics, verbose_name='Temat')
-    student = models.ManyToManyField(Student, verbose_name='Uczeń')
+    # leading column of grade_student_subject_idx, a separate index on student would be redundant
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, db_index=False, verbose_name='Uczeń')
+    date = models.DateField(default=datetime.date.today, db_index=True, verbose_name='Data')
+    weight = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(10)],
+                                              verbose_name='Waga')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'subject', 'date'], name='grade_student_subject_idx'),
+            models.Index(fields=['subject', 'date'], name='grade_subject_date_idx'),
+        ]
 
 
 class GradesForm(ModelForm):
     class Meta:
         model = Grades
-        fields = '__all__'
+        fields = ['student', 'subject', 'topic', 'grade', 'weight', 'date']
+
+
+class GradeAverage(models.Model):
+    """
+    Weighted average of grades of one student in one subject and term, kept up to date by signals
+    in main_app.signals and rebuilt with 'manage.py rebuild_grade_averages'.
+    """
+    TERM_CHOICES = [
+        (1, 'Semestr 1'),
+        (2, 'Semestr 2'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='grade_averages')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='grade_averages')
+    school_year = models.PositiveIntegerField(verbose_name='Rok szkolny')
+    term = models.PositiveSmallIntegerField(choices=TERM_CHOICES, verbose_name='Semestr')
+    grade_count = models.PositiveIntegerField(default=0, verbose_name='Liczba ocen')
+    weight_sum = models.FloatField(default=0)
+    weighted_sum = models.FloatField(default=0)
+    average = models.FloatField(verbose_name='Średnia')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'subject', 'school_year', 'term'], name='unique_grade_average'),
+        ]
+        indexes = [
+            models.Index(fields=['subject', 'school_year', 'term'], name='grade_average_subject_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.student_id} {self.subject_id} {self.school_year}/{self.term}: {self.average:.2f}'
+
+
+class StatCounter(models.Model):
+    """
+    Cached value of a counter shown on the dashboard, maintained by main_app.counters.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class ArchivedStudent(models.Model):
+    """
+    Student removed from active tables by main_app.archive, with the whole history of grades and attendance
+    kept in json columns of this one row. Read only.
+    """
+    original_id = models.PositiveBigIntegerField(unique=True, verbose_name='Id ucznia')
+    first_name = models.CharField(max_length=32, verbose_name='Imię')
+    last_name = models.CharField(max_length=32, verbose_name='Nazwisko')
+    gender = models.CharField(choices=GENDER_CHOICES, max_length=16, verbose_name='Płeć')
+    age = models.IntegerField(verbose_name='Wiek')
+    class_name = models.CharField(max_length=8, blank=True, verbose_name='Klasa')
+    class_year = models.PositiveIntegerField(default=0, verbose_name='Rok')
+    # [[date, subject, grade, weight, [topics]], ...] ordered by date
+    grades = models.JSONField(default=list)
+    # [[date, present], ...] ordered by date
+    presence = models.JSONField(default=list)
+    archived = models.DateTimeField(auto_now_add=True, verbose_name='Zarchiwizowano')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='archived_name_keyset_idx'),
+            models.Index(fields=['class_year', 'class_name', 'last_name', 'first_name', 'id'],
+                         name='archived_class_keyset_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.first_name} {self.last_name} ({self.class_name} {self.class_year})'
+
+
+class Job(models.Model):
+    """
+    Long operation (import, export, report cards, rollover) queued by a view and run by
+    'manage.py run_worker', see main_app.jobs.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'W kolejce'),
+        (RUNNING, 'W trakcie'),
+        (DONE, 'Zakończone'),
+        (FAILED, 'Błąd'),
+    ]
+
+    kind = models.CharField(max_length=32, verbose_name='Rodzaj')
+    params = models.JSONField(default=dict)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=16, default=QUEUED, verbose_name='Status')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='Postęp')
+    message = models.CharField(max_length=200, blank=True, verbose_name='Komunikat')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, verbose_name='Błąd')
+    input = models.FileField(upload_to='jobs/input/', blank=True)
+    output = models.FileField(upload_to='jobs/output/', blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Próby')
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # queued jobs wait until this time, retries are postponed with it
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    # refreshed by the running worker, a job without it for a long time lost its worker
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')
+    started = models.DateTimeField(null=True, blank=True, verbose_name='Rozpoczęto')
+    finished = models.DateTimeField(null=True, blank=True, verbose_name='Zakończono')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+    @property
+    def pending(self):
+        return self.status in (self.QUEUED, self.RUNNING)
@@ -0,0 +1,106 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .versioning import model_versions
+
+PREFIX = 'page_cache'
+HEADER = 'X-Page-Cache'
+
+CACHED_PAGES = set()
+
+
+def page_key(name, request, models):
+    """
+    Function that returns cache key of the page. Version stamps of models are part of the key, so a change of
+    data makes a new key and old pages are never read again (they expire after PAGE_CACHE_TIMEOUT).
+    Pages show the name of logged user, so they are kept per user.
+    :param name: name of the page
+    :param request: HttpRequest
+    :param models: model classes shown on the page
+    :return: key
+    """
+    versions = sorted(f'{model._meta.label_lower}={version}' for model, version in model_versions(*models).items())
+    digest = hashlib.md5(f'{request.get_full_path()}:{request.user.pk}:{versions}'.encode()).hexdigest()
+    return f'{PREFIX}:{name}:{digest}'
+
+
+def _metric(name, event):
+    return f'{PREFIX}:stats:{name}:{event}'
+
+
+def record(name, hit):
+    key = _metric(name, 'hits' if hit else 'misses')
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def stats(names=None):
+    """
+    Function that returns hit/miss counters of cached pages. Counters live in the cache, with a per-process
+    backend (locmem) every process has its own.
+    :param names: names of pages, all pages with VersionedPageCacheMixin by default
+    :return: dict name -> {'hits', 'misses', 'hit_rate'}
+    """
+    names = sorted(names or CACHED_PAGES)
+    values = cache.get_many([_metric(name, event) for name in names for event in ('hits', 'misses')])
+    result = {}
+    for name in names:
+        hits = values.get(_metric(name, 'hits'), 0)
+        misses = values.get(_metric(name, 'misses'), 0)
+        result[name] = {'hits': hits, 'misses': misses,
+                        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+    return result
+
+
+def reset_stats(names=None):
+    cache.delete_many([_metric(name, event) for name in names or CACHED_PAGES for event in ('hits', 'misses')])
+
+
+class VersionedPageCacheMixin:
+    """
+    Serves GET responses from cache until one of cache_models changes, has to come after LoginRequiredMixin.
+    Version stamps are bumped by signals and by bulk operations (versioning.bump), reading them is one cache
+    call and no query.
+    """
+    cache_models = ()
+    cache_name = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.cache_models:
+            cls.cache_name = cls.cache_name or cls.__name__
+            CACHED_PAGES.add(cls.cache_name)
+
+    def dispatch(self, request, *args, **kwargs):
+        timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 0)
+        if request.method != 'GET' or not timeout:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_key(self.cache_name, request, self.cache_models)
+        cached = cache.get(key)
+        if cached is not None:
+            record(self.cache_name, hit=True)
+            content_type, content = cached
+            response = HttpResponse(content, content_type=content_type)
+            response[HEADER] = 'hit'
+            return response
+
+        record(self.cache_name, hit=False)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            def store(rendered):
+                cache.set(key, (rendered['Content-Type'], rendered.content), timeout)
+
+            if hasattr(response, 'add_post_render_callback'):
+                # rendered by the handler after the view, the profiling middleware times it as template time
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        response[HEADER] = 'miss'
+        return response
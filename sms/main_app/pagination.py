@@ -0,0 +1,190 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import OrderBy, Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values):
+    """
+    Function that packs ordering values of the last row on a page into an url-safe token
+    :param values: list of json serializable values
+    :return: cursor string
+    """
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """
+    Function that unpacks cursor created by encode_cursor
+    :param cursor: cursor string from query params
+    :param length: number of values expected in the cursor
+    :return: list of values
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor(cursor)
+    return values
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str = None
+    cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor (keyset) paginator. Instead of OFFSET it remembers ordering values of the last row,
+    so every page is a single indexed range scan no matter how deep the user goes.
+
+    Attributes
+    queryset : QuerySet
+        queryset to paginate, rows can be model instances or dicts from .values()
+    ordering : list
+        field names (or annotations) which together with the last one being unique define the order,
+        a nullable field is given as F(name).asc(nulls_last=True), names may follow relations (school_class__year)
+    page_size : int
+        number of rows per page
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.fields = [item.expression.name if isinstance(item, OrderBy) else item for item in self.ordering]
+        self.nullable = {item.expression.name for item in self.ordering
+                         if isinstance(item, OrderBy) and item.nulls_last}
+        self.page_size = page_size
+
+    def _greater(self, field, value):
+        if field not in self.nullable:
+            return Q(**{f'{field}__gt': value})
+        # nulls are last, nothing comes after null
+        return Q(**{f'{field}__gt': value}) | Q(**{f'{field}__isnull': True}) if value is not None else None
+
+    def _equal(self, field, value):
+        if value is None:
+            return Q(**{f'{field}__isnull': True})
+        return Q(**{field: value})
+
+    def _after(self, values):
+        """
+        Builds (a > x) OR (a = x AND b > y) OR ... filter for row-value comparison.
+        """
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            step = self._greater(field, values[i])
+            if step is None:
+                continue
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                step &= self._equal(prev_field, prev_value)
+            condition |= step
+        return condition
+
+    def _value(self, row, field):
+        for name in field.split('__'):
+            if row is None:
+                return None
+            row = getattr(row, name)
+        return row
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [self._value(row, field) for field in self.fields]
+
+    def _queryset(self, cursor):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            try:
+                queryset = queryset.filter(self._after(decode_cursor(cursor, len(self.fields))))
+            except (TypeError, ValueError, ValidationError):
+                raise InvalidCursor(cursor)
+        return queryset[:self.page_size + 1]
+
+    def _page(self, rows, cursor):
+        next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            next_cursor = encode_cursor(self._key(rows[-1]))
+        return KeysetPage(object_list=rows, next_cursor=next_cursor, cursor=cursor)
+
+    def page(self, cursor=None):
+        return self._page(list(self._queryset(cursor)), cursor)
+
+    async def apage(self, cursor=None):
+        return self._page([row async for row in self._queryset(cursor)], cursor)
+
+
+def get_page_size(request):
+    """
+    Function that reads page size from query params, bounded by LIST_MAX_PAGE_SIZE
+    :param request:
+    :return: page size
+    """
+    default = getattr(settings, 'LIST_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'LIST_MAX_PAGE_SIZE', 200)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin for ListView that replaces loading of the whole table with keyset pagination.
+
+    sort_options maps value of ?sort= to ordering used by KeysetPaginator, the last field of each
+    ordering has to be unique (usually 'id').
+    """
+
+    sort_options = {'id': ('id',)}
+    default_sort = 'id'
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort', self.default_sort)
+        if sort not in self.sort_options:
+            sort = self.default_sort
+        return sort
+
+    def get_paginator(self, queryset):
+        return KeysetPaginator(queryset, self.sort_options[self.get_sort()], get_page_size(self.request))
+
+    def get_keyset_page(self, queryset):
+        try:
+            return self.get_paginator(queryset).page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Nieprawidłowy kursor strony')
+
+    def get_pagination_context(self, page):
+        return {
+            'keyset_page': page,
+            'sort': self.get_sort(),
+            'sort_options': list(self.sort_options),
+            'page_size': get_page_size(self.request),
+        }
+
+    def get_context_data(self, **kwargs):
+        page = self.get_keyset_page(self.object_list)
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context.update(self.get_pagination_context(page))
+        return context
@@ -0,0 +1,163 @@
+"""
+Monthly range partitions of PresenceList on PostgreSQL.
+
+The table main_app_presencelist is partitioned by day (migration 0014), one partition per month named
+main_app_presencelist_pYYYY_MM plus a default partition for days without one. Queries with conditions on
+day read only matching partitions, old months are removed by detaching their partitions, which does not
+depend on the number of rows. On other databases the table stays a plain table, partition functions do
+nothing and retention deletes rows.
+"""
+import datetime
+import re
+
+from django.db import connection, transaction
+
+from . import versioning
+from .models import PresenceList
+
+TABLE = PresenceList._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(?P<year>\d{{4}})_(?P<month>\d{{2}})$')
+
+_ready = set()
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def months(first, last):
+    """
+    Function that returns first days of months from first to last day, both included
+    :param first: date
+    :param last: date
+    :return: list of dates
+    """
+    result = []
+    month = month_start(first)
+    while month <= last:
+        result.append(month)
+        month = next_month(month)
+    return result
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned(using=None):
+    """
+    Function that checks whether PresenceList is a partitioned table
+    :return: bool
+    """
+    conn = connection if using is None else using
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def partitions():
+    """
+    Function that lists monthly partitions
+    :return: dict first day of month -> partition name, empty when the table is not partitioned
+    """
+    if not is_partitioned():
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = inhrelid '
+                       'WHERE inhparent = %s::regclass', [TABLE])
+        names = [name for name, in cursor.fetchall()]
+    result = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            result[datetime.date(int(match['year']), int(match['month']), 1)] = name
+    return dict(sorted(result.items()))
+
+
+def _create_partition(cursor, month):
+    """
+    Creates partition of the month. Rows of the month which went to the default partition are moved to it,
+    so it is built as a plain table and attached afterwards.
+    """
+    name, upper = partition_name(month), next_month(month)
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+    cursor.execute(f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE day >= %s AND day < %s RETURNING *) '
+                   f'INSERT INTO "{name}" SELECT * FROM moved', [month, upper])
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [month, upper])
+
+
+def ensure_partitions(first, last=None):
+    """
+    Function that creates missing monthly partitions for days from first to last. Months already checked
+    by this process are skipped without a query, so it is cheap to call before every insert.
+    :param first: date
+    :param last: date, first by default
+    :return: list of created partition names
+    """
+    wanted = [month for month in months(first, last or first) if month not in _ready]
+    if not wanted or not is_partitioned():
+        _ready.update(wanted)
+        return []
+    existing = partitions()
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month in wanted:
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+    _ready.update(wanted)
+    return created
+
+
+def default_partition_rows():
+    """
+    Function that counts rows in the default partition, they belong to months without a partition
+    :return: number of rows, None when the table is not partitioned
+    """
+    if not is_partitioned():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM "{DEFAULT_PARTITION}"')
+        return cursor.fetchone()[0]
+
+
+def remove_before(before, drop=False):
+    """
+    Function that removes attendance older than the month of before. Partitions of whole older months are
+    detached (and dropped when drop is set, otherwise they stay as standalone tables, e.g. for pg_dump).
+    Without partitioning rows are deleted month by month.
+    :param before: date, its month is kept
+    :param drop: drop detached partitions
+    :return: list of (month, partition name or None, deleted rows or None)
+    """
+    limit = month_start(before)
+    removed = []
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            for month, name in partitions().items():
+                if month >= limit:
+                    continue
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+                _ready.discard(month)
+                removed.append((month, name, None))
+    else:
+        oldest = PresenceList.objects.order_by('day').values_list('day', flat=True).first()
+        for month in months(oldest, limit - datetime.timedelta(days=1)) if oldest else []:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # one DELETE without loading the rows or sending delete signals
+                cursor.execute(f'DELETE FROM "{TABLE}" WHERE day >= %s AND day < %s', [month, next_month(month)])
+                removed.append((month, None, cursor.rowcount))
+    if removed:
+        versioning.bump(PresenceList)
+    return removed
+
@@ -0,0 +1,167 @@
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.template.loader import get_template
+
+from . import attendance
+from .averages import term_range
+from .models import GradeAverage, Grades, SchoolClass, Student
+
+TEMPLATE_NAME = 'report_card.html'
+FORMATS = ('html', 'pdf')
+COMPLETE_MARKER = '.complete'
+
+_template = None
+
+
+class ReportCardError(Exception):
+    pass
+
+
+@dataclass
+class SubjectResult:
+    subject: str
+    grades: list = field(default_factory=list)
+    average: float = None
+
+
+@dataclass
+class ReportCard:
+    student: Student
+    subjects: list
+    attendance: dict
+
+
+@dataclass
+class ClassResult:
+    class_id: int
+    written: int = 0
+    skipped: int = 0
+
+
+def class_report_cards(school_class, school_year, term):
+    """
+    Function that prepares report cards of all students of the class with four queries: students,
+    averages, grades and attendance of the whole class
+    :param school_class: SchoolClass
+    :param school_year: year in which school year starts
+    :param term: 1 or 2
+    :return: list of ReportCard
+    """
+    date_from, date_to = term_range(school_year, term)
+    students = list(Student.objects.filter(school_class=school_class).order_by('last_name', 'first_name', 'id'))
+
+    results = defaultdict(dict)
+    for student_id, subject, average in GradeAverage.objects.filter(
+            student__school_class=school_class, school_year=school_year, term=term) \
+            .values_list('student_id', 'subject__name', 'average'):
+        results[student_id][subject] = SubjectResult(subject, average=average)
+    for student_id, subject, grade in Grades.objects.filter(
+            student__school_class=school_class, date__range=(date_from, date_to)) \
+            .values_list('student_id', 'subject__name', 'grade').order_by('date', 'id'):
+        results[student_id].setdefault(subject, SubjectResult(subject)).grades.append(grade)
+
+    presence = {row['student_id']: row for row in attendance.student_rates(school_class, date_from, date_to)}
+    return [
+        ReportCard(
+            student=student,
+            subjects=sorted(results[student.pk].values(), key=lambda result: result.subject),
+            attendance=presence.get(student.pk, {'total': 0, 'attended': 0, 'missed': 0, 'rate': None}),
+        )
+        for student in students
+    ]
+
+
+def card_filename(card):
+    name = re.sub(r'[^\w-]+', '_', f'{card.student.last_name}_{card.student.first_name}')
+    return f'{card.student.pk}_{name}'
+
+
+def class_directory(output, school_class, school_year, term):
+    return os.path.join(output, f'{school_year}-{term}', str(school_class.year),
+                        re.sub(r'[^\w-]+', '_', school_class.name))
+
+
+def _write_atomic(path, data, mode):
+    temporary = f'{path}.part'
+    with open(temporary, mode, **({'encoding': 'utf-8'} if 'b' not in mode else {})) as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+
+def write_pdf(html, path):
+    try:
+        from xhtml2pdf import pisa
+    except ImportError:
+        raise ReportCardError('Świadectwa PDF wymagają pakietu xhtml2pdf')
+
+    temporary = f'{path}.part'
+    with open(temporary, 'wb') as output:
+        status = pisa.CreatePDF(html, dest=output, encoding='utf-8')
+    if status.err:
+        os.remove(temporary)
+        raise ReportCardError(f'Nie udało się utworzyć {path}')
+    os.replace(temporary, path)
+
+
+def init_worker():
+    """
+    Initializer of worker processes, the template is compiled once per process. Database connections have to
+    be closed in the parent before the pool starts, every worker opens its own.
+    """
+    global _template
+    _template = get_template(TEMPLATE_NAME)
+
+
+def generate_class(class_id, school_year, term, output, formats=('html',), overwrite=False):
+    """
+    Function that writes report cards of one class. Every file is written to a temporary name and renamed,
+    so after a crash only whole files remain and existing ones are skipped unless overwrite is set.
+    A marker file is left in the directory of a finished class, next runs skip the class without reading it.
+    :param class_id: SchoolClass id
+    :param school_year: year in which school year starts
+    :param term: 1 or 2
+    :param output: output directory
+    :param formats: subset of FORMATS
+    :param overwrite: generate existing files again
+    :return: ClassResult
+    """
+    global _template
+    if _template is None:
+        _template = get_template(TEMPLATE_NAME)
+
+    school_class = SchoolClass.objects.get(pk=class_id)
+    directory = class_directory(output, school_class, school_year, term)
+    marker = os.path.join(directory, f'{COMPLETE_MARKER}-{"-".join(sorted(formats))}')
+    result = ClassResult(class_id)
+    if not overwrite and os.path.exists(marker):
+        with open(marker) as done:
+            result.skipped = int(done.read().strip() or 0)
+        return result
+
+    os.makedirs(directory, exist_ok=True)
+    font = getattr(settings, 'REPORT_CARD_FONT', None)
+    for card in class_report_cards(school_class, school_year, term):
+        base = os.path.join(directory, card_filename(card))
+        missing = [fmt for fmt in formats if overwrite or not os.path.exists(f'{base}.{fmt}')]
+        if not missing:
+            result.skipped += 1
+            continue
+        html = _template.render({
+            'card': card,
+            'school_class': school_class,
+            'school_year': school_year,
+            'term': term,
+            'font': font if font and os.path.exists(font) else None,
+        })
+        if 'html' in missing:
+            _write_atomic(f'{base}.html', html, 'w')
+        if 'pdf' in missing:
+            write_pdf(html, f'{base}.pdf')
+        result.written += 1
+
+    _write_atomic(marker, f'{result.written + result.skipped}\n', 'w')
+    return result
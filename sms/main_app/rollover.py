@@ -0,0 +1,125 @@
+import re
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from . import counters, versioning
+from .models import SchoolClass, Student, current_year
+
+CLASS_NAME = re.compile(r'^(?P<level>\d+)(?P<suffix>.*)$')
+
+
+class RolloverError(Exception):
+    pass
+
+
+@dataclass
+class ClassMove:
+    source: SchoolClass
+    students: int
+    target_name: str = None
+    target_exists: bool = False
+
+    @property
+    def graduates(self):
+        return self.target_name is None
+
+
+@dataclass
+class RolloverReport:
+    from_year: int
+    to_year: int
+    moves: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def promoted(self):
+        return [move for move in self.moves if not move.graduates]
+
+    @property
+    def graduated(self):
+        return [move for move in self.moves if move.graduates]
+
+    @property
+    def created(self):
+        return sum(1 for move in self.promoted if not move.target_exists)
+
+    @property
+    def moved_students(self):
+        return sum(move.students for move in self.promoted)
+
+
+def next_name(name, final_grade):
+    """
+    Function that returns name of the class in the next school year, e.g. 1A -> 2A
+    :param name: SchoolClass.name
+    :param final_grade: last level of the school
+    :return: new name, None for a final-year class, raises RolloverError when the name has no level
+    """
+    match = CLASS_NAME.match(name.strip())
+    if not match:
+        raise RolloverError(f'Nazwa klasy {name} nie zaczyna się od numeru')
+    level = int(match['level'])
+    if level >= final_grade:
+        return None
+    new_name = f'{level + 1}{match["suffix"]}'
+    if len(new_name) > SchoolClass._meta.get_field('name').max_length:
+        raise RolloverError(f'Nazwa klasy {new_name} jest za długa')
+    return new_name
+
+
+def plan(from_year, final_grade=None):
+    """
+    Function that maps classes of the year to classes of the next year without changing anything
+    :param from_year: SchoolClass.year of classes to move
+    :param final_grade: last level of the school, settings.SCHOOL_FINAL_GRADE by default
+    :return: RolloverReport
+    """
+    final_grade = final_grade or settings.SCHOOL_FINAL_GRADE
+    report = RolloverReport(from_year, from_year + 1)
+    if report.to_year > current_year():
+        raise RolloverError(f'Rok {report.to_year} jeszcze się nie zaczął')
+
+    existing = set(SchoolClass.objects.filter(year=report.to_year).values_list('name', flat=True))
+    classes = SchoolClass.objects.filter(year=from_year, graduated=False) \
+        .annotate(students=Count('student')).order_by('name')
+    for school_class in classes:
+        try:
+            target_name = next_name(school_class.name, final_grade)
+        except RolloverError as e:
+            report.skipped.append((school_class, str(e)))
+            continue
+        report.moves.append(ClassMove(school_class, school_class.students, target_name, target_name in existing))
+    return report
+
+
+def rollover(from_year, final_grade=None, dry_run=False):
+    """
+    Function that moves the whole school to the next year in one transaction: missing classes are made with
+    one bulk_create, students of every class are moved with one UPDATE and final-year classes are marked
+    as graduated (their students stay in them).
+    :param from_year: SchoolClass.year of classes to move
+    :param final_grade: last level of the school, settings.SCHOOL_FINAL_GRADE by default
+    :param dry_run: only return the plan
+    :return: RolloverReport
+    """
+    report = plan(from_year, final_grade)
+    report.dry_run = dry_run
+    if dry_run or not report.moves:
+        return report
+
+    with transaction.atomic():
+        new_classes = SchoolClass.objects.bulk_create([
+            SchoolClass(name=name, year=report.to_year)
+            for name in sorted({move.target_name for move in report.promoted if not move.target_exists})
+        ])
+        counters.increment('classes', len(new_classes))
+        targets = dict(SchoolClass.objects.filter(year=report.to_year).values_list('name', 'id'))
+        for move in report.promoted:
+            Student.objects.filter(school_class=move.source).update(school_class_id=targets[move.target_name])
+        SchoolClass.objects.filter(pk__in=[move.source.pk for move in report.graduated]).update(graduated=True)
+        versioning.bump(SchoolClass, Student)
+    return report
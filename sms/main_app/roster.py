@@ -0,0 +1,230 @@
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import counters, versioning
+from .models import SchoolClass, Student, Subject, Teacher
+
+STUDENT_COLUMNS = ('first_name', 'last_name', 'gender', 'age', 'class_name', 'class_year')
+TEACHER_COLUMNS = ('first_name', 'last_name', 'gender', 'subjects')
+
+SUBJECT_SEPARATOR = ';'
+
+
+class RosterFormatError(Exception):
+    pass
+
+
+@dataclass
+class RowError:
+    line: int
+    errors: list
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+
+def _normalize_header(header):
+    return [str(h).strip().lower() if h is not None else '' for h in header]
+
+
+def _read_csv(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = _normalize_header(next(reader, []))
+    for line, values in enumerate(reader, start=2):
+        if any(v.strip() for v in values):
+            yield line, dict(zip(header, values))
+
+
+def _read_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RosterFormatError('Import plików XLSX wymaga pakietu openpyxl')
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalize_header(next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            if any(v not in (None, '') for v in values):
+                yield line, {k: ('' if v is None else v) for k, v in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """
+    Function that streams rows of csv or xlsx file as (line number, dict) pairs
+    :param fileobj: binary file object
+    :param filename: name used to guess the format
+    :return: generator of rows
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return _read_csv(fileobj)
+    if extension in ('.xlsx', '.xlsm'):
+        return _read_xlsx(fileobj)
+    raise RosterFormatError(f'Nieobsługiwany format pliku: {extension or filename}')
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _clean_fields(model, row, names):
+    """
+    Runs the same field validation as ModelForm does, without building a form for every row.
+    """
+    cleaned, errors = {}, []
+    for name in names:
+        model_field = model._meta.get_field(name)
+        raw = row.get(name, '')
+        if isinstance(raw, str):
+            raw = raw.strip()
+        try:
+            cleaned[name] = model_field.clean(raw, None)
+        except ValidationError as e:
+            errors.extend(f'{model_field.verbose_name}: {message}' for message in e.messages)
+    return cleaned, errors
+
+
+def _clean_student(row, classes):
+    cleaned, errors = _clean_fields(Student, row, ('first_name', 'last_name', 'gender', 'age'))
+    class_name = str(row.get('class_name', '')).strip()
+    if class_name:
+        try:
+            key = (class_name, int(row.get('class_year')))
+        except (TypeError, ValueError):
+            errors.append(f'Nieprawidłowy rok klasy: {row.get("class_year")}')
+        else:
+            if key not in classes:
+                errors.append(f'Nie ma klasy {key[0]} z roku {key[1]}')
+            else:
+                cleaned['school_class_id'] = classes[key]
+    else:
+        # StudentForm requires the class unless the model field allows blank
+        model_field = Student._meta.get_field('school_class')
+        if not model_field.blank:
+            errors.append(f'{model_field.verbose_name}: {model_field.error_messages["blank"]}')
+    return cleaned, errors
+
+
+def _clean_teacher(row, subjects):
+    cleaned, errors = _clean_fields(Teacher, row, ('first_name', 'last_name', 'gender'))
+    subject_ids = []
+    for name in str(row.get('subjects', '')).split(SUBJECT_SEPARATOR):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in subjects:
+            errors.append(f'Nie ma przedmiotu {name}')
+        else:
+            subject_ids.append(subjects[name])
+    return cleaned, subject_ids, errors
+
+
+def import_students(rows, chunk_size=1000, dry_run=False):
+    """
+    Function that validates and saves students in chunks, each chunk in its own transaction
+    :param rows: iterable of (line number, dict) pairs, e.g. from read_rows
+    :param chunk_size: number of rows per bulk_create
+    :param dry_run: validate only
+    :return: ImportReport
+    """
+    classes = {(name, year): pk for pk, name, year in SchoolClass.objects.values_list('id', 'name', 'year')}
+    report = ImportReport()
+    for chunk in _chunks(rows, chunk_size):
+        students = []
+        for line, row in chunk:
+            cleaned, errors = _clean_student(row, classes)
+            if errors:
+                report.errors.append(RowError(line, errors))
+            else:
+                student = Student(**cleaned)
+                student.update_search_key()
+                students.append(student)
+        if students and not dry_run:
+            with transaction.atomic():
+                Student.objects.bulk_create(students, batch_size=chunk_size)
+                counters.increment('students', len(students))
+                versioning.bump(Student)
+        report.created += len(students)
+    return report
+
+
+def import_teachers(rows, chunk_size=1000, dry_run=False):
+    """
+    Function that validates and saves teachers with their subjects in chunks
+    :param rows: iterable of (line number, dict) pairs, e.g. from read_rows
+    :param chunk_size: number of rows per bulk_create
+    :param dry_run: validate only
+    :return: ImportReport
+    """
+    subjects = {name: pk for pk, name in Subject.objects.values_list('id', 'name')}
+    through = Teacher.subject.through
+    report = ImportReport()
+    for chunk in _chunks(rows, chunk_size):
+        teachers, teacher_subjects = [], []
+        for line, row in chunk:
+            cleaned, subject_ids, errors = _clean_teacher(row, subjects)
+            if errors:
+                report.errors.append(RowError(line, errors))
+            else:
+                teacher = Teacher(**cleaned)
+                teacher.update_search_key()
+                teachers.append(teacher)
+                teacher_subjects.append(subject_ids)
+        if teachers and not dry_run:
+            with transaction.atomic():
+                Teacher.objects.bulk_create(teachers, batch_size=chunk_size)
+                counters.increment('teachers', len(teachers))
+                through.objects.bulk_create(
+                    [through(teacher_id=teacher.pk, subject_id=subject_id)
+                     for teacher, subject_ids in zip(teachers, teacher_subjects)
+                     for subject_id in subject_ids],
+                    batch_size=chunk_size,
+                )
+                versioning.bump(Teacher)
+        report.created += len(teachers)
+    return report
+
+
+IMPORTERS = {
+    'students': import_students,
+    'teachers': import_teachers,
+}
+
+
+def write_error_report(report, fileobj):
+    """
+    Function that writes per-row errors of the import as csv
+    :param report: ImportReport
+    :param fileobj: text file object
+    :return: None
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(['line', 'errors'])
+    for error in report.errors:
+        writer.writerow([error.line, ' | '.join(error.errors)])
@@ -0,0 +1,130 @@
+import difflib
+from functools import reduce
+from itertools import chain
+from operator import and_
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Student, Teacher, search_key
+
+RESULT_LIMIT = 20
+FUZZY_CANDIDATES = 500
+FUZZY_MIN_RATIO = 0.75
+
+_trigram_available = {}
+
+
+def tokens(query):
+    """
+    Function that splits query into normalized words
+    :param query: text typed by user
+    :return: list of normalized words
+    """
+    return [search_key(word) for word in query.split() if word.strip()][:4]
+
+
+def has_trigram():
+    """
+    Function that checks once per connection whether pg_trgm extension is installed
+    :return: bool
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    if connection.alias not in _trigram_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[connection.alias] = cursor.fetchone() is not None
+    return _trigram_available[connection.alias]
+
+
+def _key_starts(field, prefix):
+    """
+    Function that matches key starting with prefix. PostgreSQL serves LIKE 'x%' from the varchar_pattern_ops
+    index Django creates, elsewhere (SQLite never uses an index for LIKE ... ESCAPE) the prefix becomes
+    a range the index can scan
+    :param field: first_key or last_key
+    :param prefix: normalized word
+    :return: Q
+    """
+    if connection.vendor == 'postgresql':
+        return Q(**{f'{field}__startswith': prefix})
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\uffff'})
+
+
+def _starts(prefix):
+    return _key_starts('first_key', prefix) | _key_starts('last_key', prefix)
+
+
+def _prefix(words):
+    return reduce(and_, (_starts(w) for w in words))
+
+
+def _neighbours(queryset, words):
+    """
+    Function that picks fuzzy candidates without trigrams: people whose key sorts next to the longest word
+    (typo after the first two letters keeps the name close in alphabetical order), on both sides and for
+    both keys, every word must keep its first two letters
+    :param queryset: people
+    :param words: normalized words
+    :return: list of candidates
+    """
+    word = max(words, key=len)
+    queryset = queryset.filter(reduce(and_, (_starts(w[:2]) for w in words)))
+    side = FUZZY_CANDIDATES // 4
+    found = {}
+    for field in ('last_key', 'first_key'):
+        near = queryset.filter(_key_starts(field, word[:2]))
+        before = near.filter(**{f'{field}__lt': word}).order_by(f'-{field}', '-id')[:side]
+        after = near.filter(**{f'{field}__gte': word}).order_by(field, 'id')[:side]
+        for person in chain(before, after):
+            found[person.pk] = person
+    return list(found.values())
+
+
+def _similarity(person, words):
+    keys = (person.first_key, person.last_key)
+    scores = [max(difflib.SequenceMatcher(None, w, key[:len(w)]).ratio() for key in keys) for w in words]
+    return sum(scores) / len(scores)
+
+
+def _fuzzy(queryset, words, exclude, limit):
+    if has_trigram():
+        condition = reduce(and_, (Q(first_key__trigram_word_similar=w) | Q(last_key__trigram_word_similar=w)
+                                  for w in words))
+        candidates = queryset.filter(condition).order_by('last_key', 'first_key', 'id')[:FUZZY_CANDIDATES]
+    else:
+        candidates = _neighbours(queryset, words)
+    exclude = set(exclude)
+    scored = [(_similarity(person, words), person) for person in candidates if person.pk not in exclude]
+    scored = [item for item in scored if item[0] >= FUZZY_MIN_RATIO]
+    scored.sort(key=lambda item: (-item[0], item[1].last_key, item[1].first_key))
+    return [person for _, person in scored[:limit]]
+
+
+def search(model, query, limit=RESULT_LIMIT):
+    """
+    Function that finds people by prefixes of first/last name, ignoring case and Polish diacritics.
+    Exact prefix matches come first, when there are too few of them, similar names are added (typos).
+    :param model: Student or Teacher
+    :param query: text typed by user
+    :param limit: maximum number of results
+    :return: list of model instances
+    """
+    words = tokens(query)
+    if not words:
+        return []
+    queryset = model.objects.all()
+    if model is Student:
+        queryset = queryset.select_related('school_class')
+    results = list(queryset.filter(_prefix(words)).order_by('last_key', 'first_key', 'id')[:limit])
+    if len(results) < limit and all(len(w) >= 3 for w in words):
+        results += _fuzzy(queryset, words, [p.pk for p in results], limit - len(results))
+    return results
+
+
+def search_people(query, limit=RESULT_LIMIT):
+    return {
+        'students': search(Student, query, limit),
+        'teachers': search(Teacher, query, limit),
+    }
@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import auth, averages, counters, versioning
+from .models import Grades, PresenceList
+
+
+# GRADE AVERAGES
+
+def _grade_keys(grade):
+    return averages.affected_keys([grade.student_id], grade.subject_id, grade.date)
+
+
+@receiver(pre_save, sender=Grades)
+def remember_old_grade(sender, instance, raw=False, **kwargs):
+    """
+    Student, subject or date of the grade can change, then averages of the old student/subject/term
+    have to be refreshed too.
+    """
+    instance._old_average_keys = set()
+    if raw or instance.pk is None:
+        return
+    old = Grades.objects.filter(pk=instance.pk).values('student_id', 'subject_id', 'date').first()
+    if old and (old['student_id'], old['subject_id'], old['date']) != \
+            (instance.student_id, instance.subject_id, instance.date):
+        instance._old_average_keys = _grade_keys(Grades(pk=instance.pk, **old))
+
+
+@receiver(post_save, sender=Grades)
+def refresh_averages_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    averages.refresh(_grade_keys(instance) | getattr(instance, '_old_average_keys', set()))
+
+
+@receiver(pre_delete, sender=Grades)
+def remember_deleted_grade(sender, instance, **kwargs):
+    instance._old_average_keys = _grade_keys(instance)
+
+
+@receiver(post_delete, sender=Grades)
+def refresh_averages_on_delete(sender, instance, **kwargs):
+    averages.refresh(getattr(instance, '_old_average_keys', set()))
+
+
+# DASHBOARD COUNTERS
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment(counters.counter_name(sender))
+
+
+def count_deleted(sender, instance, **kwargs):
+    counters.increment(counters.counter_name(sender), -1)
+
+
+# connected per model: a receiver without sender would run for every model and disable fast deletes of all
+for counted in counters.MODEL_COUNTERS.values():
+    post_save.connect(count_created, sender=counted)
+    post_delete.connect(count_deleted, sender=counted)
+
+
+def _presence_changes(entry, sign):
+    total_name, present_name = counters.presence_names(entry.day)
+    return {total_name: sign, present_name: sign if entry.present else 0}
+
+
+@receiver(pre_save, sender=PresenceList)
+def remember_old_presence(sender, instance, raw=False, **kwargs):
+    instance._old_presence = None
+    if not raw and instance.pk is not None:
+        instance._old_presence = PresenceList.objects.filter(pk=instance.pk).only('day', 'present').first()
+
+
+@receiver(post_save, sender=PresenceList)
+def count_presence_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    changes = _presence_changes(instance, 1)
+    old = getattr(instance, '_old_presence', None)
+    if old is not None:
+        for name, delta in _presence_changes(old, -1).items():
+            changes[name] = changes.get(name, 0) + delta
+    for name, delta in changes.items():
+        counters.increment(name, delta)
+
+
+@receiver(post_delete, sender=PresenceList)
+def count_presence_on_delete(sender, instance, **kwargs):
+    for name, delta in _presence_changes(instance, -1).items():
+        counters.increment(name, delta)
+
+
+# MODEL VERSIONS
+
+def bump_version(sender, raw=False, **kwargs):
+    if not raw:
+        versioning.bump(sender)
+
+
+def bump_version_on_relation_change(sender, instance, action, model, **kwargs):
+    if action.startswith('post_'):
+        versioning.bump(type(instance), model)
+
+
+for versioned in versioning.VERSIONED_MODELS:
+    post_save.connect(bump_version, sender=versioned)
+    post_delete.connect(bump_version, sender=versioned)
+    for relation in versioned._meta.local_many_to_many:
+        m2m_changed.connect(bump_version_on_relation_change, sender=relation.remote_field.through)
+
+
+# CACHED USERS
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_changed_user(sender, instance, **kwargs):
+    auth.forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        auth.forget_user(user.pk)
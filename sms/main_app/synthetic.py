@@ -0,0 +1,357 @@
+import csv
+import datetime
+import io
+import random
+import string
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from . import averages, counters, partitions, versioning
+from .models import Grades, PresenceList, SchoolClass, SchoolSubjectTopics, Student, Subject, Teacher, current_year
+
+FIRST_NAMES = ['Łukasz', 'Jan', 'Anna', 'Małgorzata', 'Paweł', 'Zofia', 'Michał', 'Agnieszka', 'Krzysztof', 'Ewa',
+               'Tomasz', 'Katarzyna', 'Piotr', 'Joanna', 'Wojciech', 'Magdalena', 'Jakub', 'Żaneta', 'Marcin', 'Ola']
+LAST_NAMES = ['Nowak', 'Kowalski', 'Wiśniewski', 'Wójcik', 'Kowalczyk', 'Kamiński', 'Lewandowski', 'Zieliński',
+              'Szymański', 'Woźniak', 'Dąbrowski', 'Kozłowski', 'Jankowski', 'Mazur', 'Kwiatkowski', 'Krawczyk',
+              'Piotrowski', 'Grabowski', 'Nowakowski', 'Pawłowski', 'Michalski', 'Nowicki', 'Adamczyk', 'Dudek']
+SUBJECT_NAMES = ['Matematyka', 'Fizyka', 'Chemia', 'Biologia', 'Geografia', 'Historia', 'Język polski',
+                 'Język angielski', 'Język niemiecki', 'Informatyka', 'Wiedza o społeczeństwie', 'Plastyka',
+                 'Muzyka', 'Wychowanie fizyczne', 'Religia', 'Filozofia']
+
+
+@dataclass(frozen=True)
+class SchoolSize:
+    classes: int
+    students_per_class: int
+    teachers: int
+    subjects: int
+    topics_per_subject: int
+    grades_per_student: int
+    school_days: int
+
+
+SIZES = {
+    'small': SchoolSize(classes=2, students_per_class=10, teachers=3, subjects=4, topics_per_subject=3,
+                        grades_per_student=5, school_days=5),
+    'medium': SchoolSize(classes=10, students_per_class=30, teachers=20, subjects=8, topics_per_subject=5,
+                         grades_per_student=20, school_days=30),
+    'large': SchoolSize(classes=40, students_per_class=250, teachers=80, subjects=16, topics_per_subject=10,
+                        grades_per_student=30, school_days=60),
+}
+
+
+@dataclass
+class SyntheticSchool:
+    """
+    Summary of seeded data, ids of sample rows are used to build URLs of detail pages.
+    """
+    size: str
+    counts: dict
+    class_id: int
+    student_id: int
+    teacher_id: int
+    subject_id: int
+
+
+def school_days(count, until=None):
+    """
+    Function that returns last working days, oldest first
+    :param count: number of days
+    :param until: last day, today by default
+    :return: list of dates
+    """
+    day = until or timezone.localdate()
+    days = []
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+def _person(model, rng, **fields):
+    person = model(first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                   gender=rng.choice('MK'), **fields)
+    person.update_search_key()
+    return person
+
+
+# HIGH-VOLUME SEEDING
+
+GRADE_WEIGHTS = [5, 12, 28, 30, 18, 7]
+MONTHS_WITHOUT_LESSONS = (7, 8)
+
+
+@dataclass
+class SeedReport:
+    counts: dict = field(default_factory=dict)
+    seconds: dict = field(default_factory=dict)
+    first_ids: dict = field(default_factory=dict)
+
+
+def school_year_days(years, until=None):
+    """
+    Function that returns working days of the last years without summer holidays, oldest first
+    :param years: number of years back from until
+    :param until: last day, today by default
+    :return: list of dates
+    """
+    last = until or timezone.localdate()
+    day = last - datetime.timedelta(days=round(365.25 * years) - 1)
+    days = []
+    while day <= last:
+        if day.weekday() < 5 and day.month not in MONTHS_WITHOUT_LESSONS:
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def class_name(index, levels):
+    """
+    Function that returns name of the index-th class: 1A, 2A, ... then 1B, ..., after Z come AA, AB...
+    :param index: number of the class from 0
+    :param levels: number of levels of the school
+    :return: name
+    """
+    number = index // levels
+    suffix = ''
+    while True:
+        suffix = string.ascii_uppercase[number % 26] + suffix
+        number = number // 26 - 1
+        if number < 0:
+            break
+    return f'{index % levels + 1}{suffix}'
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True or value is False:
+        return 't' if value else 'f'
+    return value
+
+
+def _copy(model, fields, rows):
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(value) for value in row])
+    buffer.seek(0)
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(sql, buffer)
+
+
+# values of other fields are passed to the driver as they are
+ADAPTED_FIELDS = ('DateField', 'DateTimeField', 'TimeField', 'DecimalField', 'JSONField')
+
+
+def _insert(model, fields, rows):
+    db = connections[DEFAULT_DB_ALIAS]
+    model_fields = [model._meta.get_field(name) for name in fields]
+    adapt = [i for i, f in enumerate(model_fields) if f.get_internal_type() in ADAPTED_FIELDS]
+    columns = ', '.join(db.ops.quote_name(f.column) for f in model_fields)
+    sql = f'INSERT INTO {db.ops.quote_name(model._meta.db_table)} ({columns}) ' \
+          f'VALUES ({", ".join(["%s"] * len(fields))})'
+    params = []
+    for row in rows:
+        row = list(row)
+        for i in adapt:
+            row[i] = model_fields[i].get_db_prep_value(row[i], db)
+        params.append(row)
+    with db.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def write_rows(model, fields, rows, batch_size=10000):
+    """
+    Function that inserts rows given as tuples of field values. PostgreSQL gets them with COPY, other
+    databases with one executemany per chunk. Neither signals nor save() run, callers fill counters, averages
+    and search keys.
+    :param model: model class, also an auto-created through model
+    :param fields: attnames of fields in the order of values, e.g. ('id', 'student_id', 'day')
+    :param rows: iterable of tuples, consumed in chunks of batch_size
+    :param batch_size: rows per COPY/INSERT
+    :return: number of rows
+    """
+    rows = iter(rows)
+    write = _copy if connection.vendor == 'postgresql' else _insert
+    total = 0
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return total
+        with transaction.atomic():
+            write(model, fields, chunk)
+        total += len(chunk)
+
+
+def _first_id(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return (last or 0) + 1
+
+
+def _reset_sequences(*models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def seed_school(students, years=1, students_per_class=30, teachers=None, subjects=16, topics_per_subject=10,
+                grades_per_year=40, presence=True, days=None, seed=2022, batch_size=10000, progress=None):
+    """
+    Function that generates a school of any size for reproducing production-scale performance problems.
+    Classes, subjects and topics are few and use bulk_create, the other tables are streamed in chunks by
+    write_rows (COPY on PostgreSQL, executemany of a plain INSERT elsewhere), with ids assigned here so grades
+    and their topics, students and their presence are linked without reading anything back.
+    Values pass validators of the models (letters only names, age 16-20, grades 1-6). Subjects get fixed
+    names, so tables should be empty.
+    :param students: number of students
+    :param years: years of grades and daily presence, counted back from today without summer holidays
+    :param students_per_class: class size
+    :param teachers: number of teachers, one for 15 students by default
+    :param subjects: number of subjects
+    :param topics_per_subject: topics of every subject
+    :param grades_per_year: grades of every student in a year
+    :param presence: generate daily presence entries
+    :param days: school days of grades and presence instead of the last years
+    :param seed: seed of the random generator
+    :param batch_size: rows per COPY/INSERT
+    :param progress: callable(table, rows, seconds) called after every table
+    :return: SeedReport, first_ids holds the first id of every person table, class and subject
+    """
+    rng = random.Random(seed)
+    report = SeedReport()
+    days = school_year_days(years) if days is None else days
+    levels = settings.SCHOOL_FINAL_GRADE
+    teachers = max(1, students // 15) if teachers is None else teachers
+
+    def step(name, write):
+        start = time.perf_counter()
+        report.counts[name] = write()
+        report.seconds[name] = round(time.perf_counter() - start, 2)
+        if progress:
+            progress(name, report.counts[name], report.seconds[name])
+
+    def people(model, count, first_id, extra):
+        for pk in range(first_id, first_id + count):
+            person = _person(model, rng, **extra(pk))
+            yield (pk, person.first_name, person.last_name, person.gender, person.first_key, person.last_key,
+                   *extra(pk).values())
+
+    year = current_year()
+    class_count = -(-students // students_per_class) if students else 0
+    classes = SchoolClass.objects.bulk_create([
+        SchoolClass(name=class_name(i, levels), year=year) for i in range(class_count)
+    ], batch_size=batch_size)
+    class_ids = [school_class.pk for school_class in classes]
+    subject_rows = Subject.objects.bulk_create([
+        Subject(name=SUBJECT_NAMES[i] if i < len(SUBJECT_NAMES) else f'Przedmiot {i + 1}') for i in range(subjects)
+    ])
+    subject_ids = [subject.pk for subject in subject_rows]
+    topics = SchoolSubjectTopics.objects.bulk_create([
+        SchoolSubjectTopics(name=f'Temat {i + 1}', subjects=subject)
+        for subject in subject_rows for i in range(topics_per_subject)
+    ], batch_size=batch_size)
+    topics_of = {pk: [t.pk for t in topics if t.subjects_id == pk] for pk in subject_ids}
+    report.counts.update(classes=len(classes), subjects=len(subject_rows), topics=len(topics))
+    report.first_ids.update(classes=class_ids[0] if class_ids else None,
+                            subjects=subject_ids[0] if subject_ids else None)
+
+    person_fields = ('id', 'first_name', 'last_name', 'gender', 'first_key', 'last_key')
+    first_teacher = _first_id(Teacher)
+    report.first_ids['teachers'] = first_teacher if teachers else None
+    step('teachers', lambda: write_rows(Teacher, person_fields, people(Teacher, teachers, first_teacher,
+                                                                        lambda pk: {}), batch_size))
+    step('teacher subjects', lambda: write_rows(Teacher.subject.through, ('teacher_id', 'subject_id'), (
+        (pk, subject_id) for pk in range(first_teacher, first_teacher + teachers)
+        for subject_id in rng.sample(subject_ids, min(2, len(subject_ids)))
+    ), batch_size))
+
+    first_student = _first_id(Student)
+    report.first_ids['students'] = first_student if students else None
+    student_ids = range(first_student, first_student + students)
+    step('students', lambda: write_rows(Student, person_fields + ('age', 'school_class_id'), people(
+        Student, students, first_student,
+        lambda pk: {'age': 16 + (pk - first_student) % students_per_class % 5,
+                    'school_class_id': class_ids[(pk - first_student) // students_per_class]},
+    ), batch_size))
+
+    # grades and their topics are generated together, topic rows point at ids given to grades
+    first_grade = _first_id(Grades)
+    grade_count = round(grades_per_year * years)
+    topic_rows = []
+
+    def grade_rows():
+        pk = first_grade
+        for student_id in student_ids:
+            for value in rng.choices(range(1, 7), GRADE_WEIGHTS, k=grade_count):
+                subject_id = rng.choice(subject_ids)
+                if topics_of[subject_id]:
+                    topic_rows.append((pk, rng.choice(topics_of[subject_id])))
+                yield pk, student_id, subject_id, value, rng.choice((1, 1, 2, 3)), rng.choice(days)
+                pk += 1
+
+    def write_grades():
+        total = 0
+        fields = ('id', 'student_id', 'subject_id', 'grade', 'weight', 'date')
+        rows = grade_rows()
+        while True:
+            written = write_rows(Grades, fields, islice(rows, batch_size), batch_size)
+            write_rows(Grades.topic.through, ('grades_id', 'schoolsubjecttopics_id'), topic_rows, batch_size)
+            topic_rows.clear()
+            if not written:
+                return total
+            total += written
+
+    if days:
+        step('grades', write_grades)
+        if presence:
+            partitions.ensure_partitions(days[0], days[-1])
+            step('presence', lambda: write_rows(PresenceList, ('student_id', 'day', 'present'), (
+                (student_id, day, rng.random() < 0.92) for day in days for student_id in student_ids
+            ), batch_size))
+
+    _reset_sequences(Teacher, Student, Grades, PresenceList)
+    step('averages', lambda: averages.rebuild(batch_size=batch_size))
+    counters.reconcile(days=(timezone.localdate() - days[0]).days + 1 if days else 1)
+    versioning.bump(*versioning.VERSIONED_MODELS)
+    return report
+
+
+def seed(size='small', seed=2022, batch_size=5000):
+    """
+    Function that fills the database with a generated school of one of SIZES (see seed_school): classes,
+    students, teachers, subjects, topics, grades and presence lists of the last school_days working days.
+    Everything is written in one transaction. Tables should be empty, names of classes and subjects are fixed.
+    :param size: key of SIZES
+    :param seed: seed of the random generator, the same seed gives the same school
+    :param batch_size: rows per insert
+    :return: SyntheticSchool
+    """
+    spec = SIZES[size]
+    with transaction.atomic():
+        report = seed_school(
+            spec.classes * spec.students_per_class, students_per_class=spec.students_per_class,
+            teachers=spec.teachers, subjects=spec.subjects, topics_per_subject=spec.topics_per_subject,
+            grades_per_year=spec.grades_per_student, days=school_days(spec.school_days), seed=seed,
+            batch_size=batch_size,
+        )
+    return SyntheticSchool(
+        size=size,
+        counts=report.counts,
+        class_id=report.first_ids.get('classes'),
+        student_id=report.first_ids.get('students'),
+        teacher_id=report.first_ids.get('teachers'),
+        subject_id=report.first_ids.get('subjects'),
+    )
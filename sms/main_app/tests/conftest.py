@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import cache
 from django.test import Client
 
 
@@ -6,3 +7,10 @@ from django.test import Client
 def client():
     client = Client()
     return client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # version stamps, cached pages and users would outlive the rolled back data of previous tests
+    cache.clear()
+    yield
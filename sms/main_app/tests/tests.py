@@ -212,3 +212,1275 @@ class ClassUpdateTest(TestCase):
 #                                      'subject': 'Chemia'})
 #
 #         self.assertEqual(response.status_code, 302)
+
+
+@pytest.mark.django_db
+def test_student_list_keyset_pagination(client):
+    """
+    Walking through all pages with cursor returns every student exactly once.
+    :param client:
+    :return: asserts
+    """
+    client.force_login(create_user())
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    earlier = SchoolClass.objects.create(name='2B', year=2020)
+    for i in range(7):
+        Student.objects.create(first_name='Jan', last_name=f'Kowalski{"x" * i}', age=20, school_class=school_class)
+    for name in ('Nowak', 'Kot'):
+        Student.objects.create(first_name='Ewa', last_name=name, age=20, school_class=earlier)
+        Student.objects.create(first_name='Ewa', last_name=name, age=20)
+
+    seen = []
+    url = '/student/list?sort=class&page_size=3'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(s.id for s in response.context['student_list'])
+        page = response.context['keyset_page']
+        url = f'/student/list?sort=class&page_size=3&cursor={page.next_cursor}' if page.has_next else None
+
+    # students without class come last
+    order = sorted(Student.objects.select_related('school_class'), key=lambda s: (
+        s.school_class is None, s.school_class and (s.school_class.year, s.school_class.name),
+        s.last_name, s.first_name, s.id))
+    assert seen == [s.id for s in order]
+    assert len(seen) == 11
+
+
+@pytest.mark.django_db
+def test_list_views_query_count_does_not_grow(client, django_assert_max_num_queries):
+    """
+    List pages cost the same number of queries regardless of the number of rows.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    from main_app.models import Subject
+
+    client.force_login(create_user())
+    subject = Subject.objects.create(name='Fizyka')
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    for i in range(30):
+        teacher = Teacher.objects.create(first_name='Anna', last_name=f'Nowak{i}', gender='K')
+        teacher.subject.add(subject)
+        Student.objects.create(first_name='Jan', last_name=f'Kowalski{i}', age=20, school_class=school_class)
+
+    for url in ['/teacher/list', '/student/list', '/student/list?sort=class', '/class/list']:
+        with django_assert_max_num_queries(4):
+            assert client.get(url).status_code == 200
+
+
+@pytest.mark.django_db
+def test_list_view_invalid_cursor(client):
+    client.force_login(create_user())
+    assert client.get('/student/list?cursor=not-a-cursor').status_code == 404
+
+
+@pytest.mark.django_db
+def test_import_students_from_csv(django_assert_max_num_queries):
+    """
+    Valid rows are saved in bulk, invalid ones land in the report with their line number.
+    :return: asserts
+    """
+    import io
+    from main_app import counters
+    from main_app.roster import import_students, read_rows
+
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    lines = ['first_name,last_name,gender,age,class_name,class_year']
+    lines += [f'Łukasz,Żółć,M,{17 + i % 10},1A,2021' for i in range(50)]
+    lines += ['Jan2,Nowak,M,20,1A,2021', 'Ewa,Nowak,K,12,1A,2021', 'Ewa,Nowak,K,20,9Z,2021', 'Ewa,Nowak,K,20,,']
+    data = io.BytesIO('\n'.join(lines).encode())
+    counters.reconcile(['students'])
+
+    # class lookup + (savepoint, insert, counter update, release) for each of 3 chunks
+    with django_assert_max_num_queries(13):
+        report = import_students(read_rows(data, 'roster.csv'), chunk_size=20)
+
+    assert report.created == 50
+    assert [e.line for e in report.errors] == [52, 53, 54, 55]
+    assert report.errors[-1].errors[0].startswith('Rok rozpoczęcia nauki/klasa')
+    assert Student.objects.filter(school_class=school_class).count() == 50
+
+
+@pytest.mark.django_db
+def test_import_teachers_view(client, settings, tmp_path):
+    """
+    Teachers uploaded through the view are imported by a background job and get their subjects assigned.
+    :param client:
+    :return: asserts
+    """
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from main_app import jobs
+    from main_app.models import Job, Subject
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    client.force_login(create_user())
+    Subject.objects.create(name='Fizyka')
+    Subject.objects.create(name='Chemia')
+    upload = SimpleUploadedFile('teachers.csv', 'first_name,last_name,gender,subjects\n'
+                                                'Anna,Nowak,K,Fizyka;Chemia\n'
+                                                'Piotr,Kot,M,Biologia\n'.encode())
+    response = client.post('/student/import', {'kind': 'teachers', 'file': upload})
+    job = Job.objects.get()
+    assert response.status_code == 302 and response.url == reverse('job-details', kwargs={'pk': job.pk})
+    assert not Teacher.objects.exists()
+
+    assert jobs.work(burst=True) == 1
+    job.refresh_from_db()
+    assert job.status == Job.DONE and job.result['created'] == 1 and job.result['failed'] == 1
+    assert client.get(reverse('job-download', kwargs={'pk': job.pk})).getvalue().decode().startswith('line,errors')
+    assert set(Teacher.objects.get(last_name='Nowak').subject.values_list('name', flat=True)) == {'Fizyka', 'Chemia'}
+
+
+@pytest.mark.django_db
+def test_export_grades_streams_csv(client, django_assert_max_num_queries):
+    """
+    Grades export is streamed, filtered by class and fetches related rows once per chunk.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    import csv
+    import io
+    from main_app.exports import export_lines
+    from main_app.models import Grades, SchoolSubjectTopics, Subject
+
+    client.force_login(create_user())
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    other_class = SchoolClass.objects.create(name='1B', year=2021)
+    subject = Subject.objects.create(name='Fizyka')
+    topic = SchoolSubjectTopics.objects.create(name='Kinematyka', subjects=subject)
+    student = Student.objects.create(first_name='Jan', last_name='Nowak', age=20, school_class=school_class)
+    other = Student.objects.create(first_name='Ewa', last_name='Kot', age=20, school_class=other_class)
+    for value in (5, 4, 3):
+        grade = Grades.objects.create(grade=value, subject=subject, student=student)
+        grade.topic.add(topic)
+    Grades.objects.create(grade=1, subject=subject, student=other)
+
+    response = client.get('/export/grades', {'school_class': school_class.id})
+    assert response.streaming
+    rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert [row['grade'] for row in rows] == ['5.0', '4.0', '3.0']
+    assert rows[0]['topics'] == 'Kinematyka'
+    assert rows[0]['student'] == 'Jan Nowak'
+
+    # one query for grades + topics for each of two chunks
+    with django_assert_max_num_queries(3):
+        assert len(list(export_lines('grades', 'jsonl', chunk_size=2))) == 4
+
+
+@pytest.mark.django_db
+def test_export_rejects_unknown_kind_and_bad_filters(client):
+    client.force_login(create_user())
+    assert client.get('/export/teachers').status_code == 404
+    assert client.get('/export/presence', {'date_from': 'yesterday'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_grade_averages_follow_grade_changes():
+    """
+    Summary rows are updated when grades are added, moved to other student, changed and deleted.
+    :return: asserts
+    """
+    import datetime
+    from main_app.averages import rebuild
+    from main_app.models import GradeAverage, Grades, Subject
+
+    subject = Subject.objects.create(name='Fizyka')
+    jan = Student.objects.create(first_name='Jan', last_name='Nowak', age=20)
+    ewa = Student.objects.create(first_name='Ewa', last_name='Kot', age=20)
+    day = datetime.date(2022, 10, 3)
+
+    Grades.objects.create(grade=5, weight=1, subject=subject, date=day, student=jan)
+    test = Grades.objects.create(grade=2, weight=2, subject=subject, date=day, student=jan)
+
+    average = GradeAverage.objects.get(student=jan, subject=subject, school_year=2022, term=1)
+    assert average.average == pytest.approx(3.0)
+    assert average.grade_count == 2
+
+    test.grade = 5
+    test.save()
+    assert GradeAverage.objects.get(student=jan).average == pytest.approx(5.0)
+
+    test.date = datetime.date(2023, 3, 1)
+    test.save()
+    assert GradeAverage.objects.get(student=jan, school_year=2022, term=2).grade_count == 1
+
+    test.student = ewa
+    test.save()
+    assert not GradeAverage.objects.filter(student=jan, term=2).exists()
+    assert GradeAverage.objects.get(student=ewa).average == pytest.approx(5.0)
+
+    test.delete()
+    assert not GradeAverage.objects.filter(student=ewa).exists()
+
+    snapshot = list(GradeAverage.objects.values_list('student', 'subject', 'school_year', 'term', 'average'))
+    assert rebuild() == 1
+    assert list(GradeAverage.objects.values_list('student', 'subject', 'school_year', 'term', 'average')) == snapshot
+
+
+@pytest.mark.django_db
+def test_grades_add_view_creates_one_grade(client):
+    """
+    Grade form saves exactly one grade of the chosen student, with its topics.
+    :param client:
+    :return: asserts
+    """
+    from main_app.models import Grades, SchoolSubjectTopics, Subject
+
+    client.force_login(create_user())
+    student = Student.objects.create(first_name='Jan', last_name='Nowak', age=20)
+    subject = Subject.objects.create(name='Fizyka')
+    topic = SchoolSubjectTopics.objects.create(name='Ruch', subjects=subject)
+
+    response = client.post(reverse('grades-add'), {'student': student.pk, 'subject': subject.pk, 'topic': [topic.pk],
+                                                   'grade': 4, 'weight': 2, 'date': '2022-10-03'})
+    assert response.status_code == 302
+    grade = Grades.objects.get()
+    assert (grade.student_id, grade.grade, grade.weight) == (student.pk, 4, 2)
+    assert list(grade.topic.all()) == [topic]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_grades_student_migration_forward_and_backward():
+    """
+    Migration 0011 turns students of grades (m2m) into a foreign key: grade of two students is split in two
+    with the same topics, grade without student is dropped; backwards every grade gets its student link.
+    :return: asserts
+    """
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    before, after = [('main_app', '0010_search_keys')], [('main_app', '0011_grades_student_fk')]
+
+    def migrate(target):
+        executor = MigrationExecutor(connection)
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    latest = MigrationExecutor(connection).loader.graph.leaf_nodes()
+    try:
+        apps = migrate(before)
+        student_model, subject_model = apps.get_model('main_app', 'Student'), apps.get_model('main_app', 'Subject')
+        jan = student_model.objects.create(first_name='Jan', last_name='Nowak', age=20).pk
+        ewa = student_model.objects.create(first_name='Ewa', last_name='Kot', age=20).pk
+        subject = subject_model.objects.create(name='Fizyka')
+        topic = apps.get_model('main_app', 'SchoolSubjectTopics').objects.create(name='Ruch', subjects=subject).pk
+        grades = apps.get_model('main_app', 'Grades').objects
+        shared = grades.create(grade=5, subject=subject)
+        shared.student.add(jan, ewa)
+        shared.topic.add(topic)
+        grades.create(grade=3, subject=subject).student.add(ewa)
+        grades.create(grade=1, subject=subject)
+
+        grades = migrate(after).get_model('main_app', 'Grades').objects
+        moved = sorted((grade.grade, grade.student_id, [t.pk for t in grade.topic.all()]) for grade in grades.all())
+        assert moved == sorted([(3, ewa, []), (5, jan, [topic]), (5, ewa, [topic])])
+
+        grades = migrate(before).get_model('main_app', 'Grades').objects
+        linked = sorted((grade.grade, [s.pk for s in grade.student.all()]) for grade in grades.all())
+        assert linked == sorted([(3, [ewa]), (5, [jan]), (5, [ewa])])
+    finally:
+        migrate(latest)
+
+
+@pytest.mark.django_db
+def test_grades_list_reads_class_averages(client, django_assert_max_num_queries):
+    import datetime
+    from main_app.models import Grades, Subject
+
+    client.force_login(create_user())
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    subject = Subject.objects.create(name='Fizyka')
+    for i, value in enumerate((2, 4, 6)):
+        student = Student.objects.create(first_name='Jan', last_name=f'Nowak{"x" * i}', age=20,
+                                         school_class=school_class)
+        Grades.objects.create(grade=value, subject=subject, date=datetime.date(2022, 10, 3), student=student)
+
+    with django_assert_max_num_queries(5):
+        response = client.get('/grades/subject/list',
+                              {'school_class': school_class.id, 'school_year': 2022, 'term': 1})
+    assert response.context['averages'] == [{'subject__name': 'Fizyka', 'grade_count': 3, 'average': 4.0}]
+
+
+@pytest.mark.django_db
+def test_dashboard_counters_are_cached(client, django_assert_max_num_queries):
+    """
+    Dashboard reads counters kept by signals, reconciliation fixes drift of bulk operations.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    import datetime
+    from django.utils import timezone
+    from main_app import counters
+    from main_app.models import PresenceList
+
+    client.force_login(create_user())
+    students = [Student.objects.create(first_name='Jan', last_name=f'Nowak{"x" * i}', age=20) for i in range(3)]
+    Teacher.objects.create(first_name='Anna', last_name='Nowak', gender='K')
+    students[0].delete()
+    now = timezone.localdate()
+    PresenceList.objects.create(student=students[1], day=now, present=True)
+    absent = PresenceList.objects.create(student=students[2], day=now, present=True)
+    absent.present = False
+    absent.save()
+    PresenceList.objects.create(student=students[2], day=now - datetime.timedelta(days=3), present=False)
+
+    client.get('/index/')
+    with django_assert_max_num_queries(3):
+        response = client.get('/index/')
+    assert response.context['student_counter'] == 2
+    assert response.context['teacher_counter'] == 1
+    assert response.context['attendance_rate'] == 50.0
+
+    Student.objects.bulk_create([Student(first_name='Ewa', last_name='Kot', age=20)])
+    assert client.get('/index/').context['student_counter'] == 2
+    counters.reconcile()
+    assert client.get('/index/').context['student_counter'] == 3
+
+
+@pytest.mark.django_db
+def test_signals_keep_fast_deletes(django_assert_num_queries):
+    """
+    Counter and version receivers are connected to their models only, other models are deleted with
+    one query without loading the rows.
+    :param django_assert_num_queries:
+    :return: asserts
+    """
+    from main_app.models import Job
+
+    Job.objects.bulk_create([Job(kind='export') for _ in range(3)])
+    with django_assert_num_queries(1):
+        assert Job.objects.all().delete()[0] == 3
+
+
+@pytest.mark.django_db
+def test_roll_call_saves_whole_class_in_one_upsert(client, django_assert_max_num_queries, monkeypatch):
+    """
+    Roll call of a class is one POST, repeated roll call on the same day updates existing entries.
+    Partition of the month is ensured before the upsert.
+    :param client:
+    :param django_assert_max_num_queries:
+    :param monkeypatch:
+    :return: asserts
+    """
+    import datetime
+    from main_app import partitions
+    from main_app.models import PresenceList
+
+    ensured = []
+    ensure_partitions = partitions.ensure_partitions
+    monkeypatch.setattr(partitions, 'ensure_partitions', lambda *days: ensured.append(days) or ensure_partitions(*days))
+
+    client.force_login(create_user())
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    students = [Student.objects.create(first_name='Jan', last_name=f'Nowak{"x" * i}', age=20,
+                                       school_class=school_class) for i in range(30)]
+    url = f'/class/{school_class.id}/attendance?day=2022-10-03'
+    data = {f'student_{s.id}': '1' for s in students}
+    data[f'student_{students[0].id}'] = '0'
+
+    with django_assert_max_num_queries(15):
+        assert client.post(url, data).status_code == 302
+    assert PresenceList.objects.filter(day=datetime.date(2022, 10, 3)).count() == 30
+    assert ensured == [(datetime.date(2022, 10, 3),)]
+
+    data[f'student_{students[0].id}'] = '1'
+    data[f'student_{students[1].id}'] = '0'
+    client.post(url, data)
+    assert PresenceList.objects.count() == 30
+    assert list(PresenceList.objects.filter(present=False).values_list('student_id', flat=True)) == [students[1].id]
+
+    response = client.get(url)
+    assert response.context['form'][f'student_{students[1].id}'].initial == '0'
+
+
+@pytest.mark.django_db
+def test_attendance_analytics(client, django_assert_max_num_queries):
+    """
+    Rates, weekly breakdown and absence streaks computed from presence list.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    import datetime
+    from main_app import attendance
+
+    client.force_login(create_user())
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    jan = Student.objects.create(first_name='Jan', last_name='Nowak', age=20, school_class=school_class)
+    ewa = Student.objects.create(first_name='Ewa', last_name='Kot', age=20, school_class=school_class)
+    monday = datetime.date(2022, 10, 3)
+    for i, jan_present in enumerate([True, False, False, False, True, True, False, False]):
+        day = monday + datetime.timedelta(days=i)
+        attendance.save_roll_call(day, {jan.id: jan_present, ewa.id: True})
+
+    rates = {row['student_id']: row for row in attendance.student_rates(school_class)}
+    assert rates[jan.id]['rate'] == 37.5
+    assert rates[ewa.id]['rate'] == 100.0
+
+    weeks = attendance.breakdown('week', school_class)
+    assert [(row['total'], row['attended']) for row in weeks] == [(14, 10), (2, 1)]
+
+    streaks = attendance.absence_streaks(school_class)
+    assert len(streaks) == 1
+    assert streaks[0]['student'] == jan
+    assert (streaks[0]['length'], streaks[0]['start'], streaks[0]['ongoing']) == (3, monday + datetime.timedelta(1), False)
+
+    with django_assert_max_num_queries(9):
+        response = client.get('/attendance/report', {'school_class': school_class.id, 'date_from': '2022-09-01'})
+    assert response.status_code == 200
+    response = client.get('/attendance/report', {'date_from': '2022-09-01', 'period': 'month'})
+    assert response.context['class_rates'][0]['rate'] == 68.8
+    assert client.get('/attendance/report').context['class_rates'] == []
+
+
+@pytest.mark.django_db
+def test_api_sparse_fields_pagination_and_relations(client):
+    """
+    API returns only requested fields, walks pages with cursor and includes related ids.
+    :param client:
+    :return: asserts
+    """
+    from main_app.models import Subject
+
+    client.force_login(create_user())
+    subject = Subject.objects.create(name='Fizyka')
+    for i in range(5):
+        Teacher.objects.create(first_name='Anna', last_name=f'Nowak{i}', gender='K').subject.add(subject)
+
+    response = client.get('/api/v1/teachers', {'fields': 'last_name,subjects', 'page_size': 3})
+    data = response.json()
+    assert data['results'][0] == {'last_name': 'Nowak0', 'subjects': [subject.id]}
+    assert len(data['results']) == 3
+
+    data = client.get(data['next']).json()
+    assert [row['last_name'] for row in data['results']] == ['Nowak3', 'Nowak4']
+    assert data['next'] is None
+
+    assert client.get('/api/v1/teachers', {'fields': 'password'}).status_code == 400
+    assert client.get('/api/v1/unknown').status_code == 404
+
+
+@pytest.mark.django_db
+def test_api_conditional_get(client, django_assert_max_num_queries):
+    """
+    Unchanged collection is answered with 304 without querying data, any change gives new ETag.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    client.force_login(create_user())
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    Student.objects.create(first_name='Jan', last_name='Nowak', age=20, school_class=school_class)
+
+    response = client.get('/api/v1/students')
+    assert response.json()['results'][0]['class_name'] == '1A'
+    etag = response['ETag']
+
+    # only session and user lookups
+    with django_assert_max_num_queries(2):
+        assert client.get('/api/v1/students', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    school_class.name = '2A'
+    school_class.save()
+    response = client.get('/api/v1/students', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()['results'][0]['class_name'] == '2A'
+
+    client.logout()
+    assert client.get('/api/v1/students').status_code == 403
+
+
+@pytest.mark.django_db
+def test_search_ignores_diacritics_and_typos(client):
+    """
+    Search matches name prefixes without Polish characters and names with small typos.
+    :param client:
+    :return: asserts
+    """
+    client.force_login(create_user())
+    lukasz = Student.objects.create(first_name='Łukasz', last_name='Żółkiewski', age=20)
+    Student.objects.create(first_name='Jan', last_name='Nowak', age=20)
+    teacher = Teacher.objects.create(first_name='Agnieszka', last_name='Stępień', gender='K')
+
+    response = client.get('/search/', {'q': 'lukasz'})
+    assert response.context['students'] == [lukasz]
+    assert client.get('/search/', {'q': 'zolk luk'}).context['students'] == [lukasz]
+    assert client.get('/search/', {'q': 'stepien'}).context['teachers'] == [teacher]
+    assert client.get('/search/', {'q': 'Żółkiewsky'}).context['students'] == [lukasz]
+    assert client.get('/search/', {'q': 'Kowalski'}).context['students'] == []
+
+    lukasz.last_name = 'Ćwik'
+    lukasz.save(update_fields=['last_name'])
+    assert client.get('/search/', {'q': 'cwik'}).context['students'] == [lukasz]
+
+
+@pytest.mark.django_db
+def test_synthetic_school_is_consistent():
+    """
+    Generated school has requested sizes and its counters and averages are ready.
+    :return: asserts
+    """
+    from main_app import counters
+    from main_app.models import GradeAverage, Grades, PresenceList
+    from main_app.synthetic import SIZES, seed
+
+    school = seed('small')
+    spec = SIZES['small']
+    students = spec.classes * spec.students_per_class
+    assert school.counts['students'] == Student.objects.count() == students
+    assert Grades.objects.count() == students * spec.grades_per_student
+    assert PresenceList.objects.count() == students * spec.school_days
+    assert GradeAverage.objects.filter(student_id=school.student_id).exists()
+    assert counters.read(['students'])['students'] == students
+    assert Student.objects.get(pk=school.student_id).last_key
+
+
+@pytest.mark.django_db
+def test_profiling_middleware_reports_server_timing(client, settings):
+    """
+    Sampled requests get Server-Timing header with queries and repeated query shapes.
+    :param client:
+    :param settings:
+    :return: asserts
+    """
+    import re
+
+    from main_app.middleware import query_shape
+
+    client.force_login(create_user())
+    for i in range(3):
+        Teacher.objects.create(first_name='Jan', last_name=f'Nowak{"a" * i}', gender='M')
+
+    settings.PROFILING_SAMPLE_RATE = 0
+    assert 'Server-Timing' not in client.get('/teacher/list')
+
+    settings.PROFILING_SAMPLE_RATE = 1
+    # new teacher changes the cached page version, the page is rendered again
+    Teacher.objects.create(first_name='Jan', last_name='Nowakaaa', gender='M')
+    response = client.get('/teacher/list')
+    timing = response['Server-Timing']
+    assert 'db;dur=' in timing and 'tpl;dur=' in timing and 'view;dur=' in timing and 'total;dur=' in timing
+    assert '0 repeated shapes' in timing
+    # TeacherListView returns TemplateResponse, rendering is timed after the view
+    assert float(re.search(r'tpl;dur=([\d.]+)', timing)[1]) > 0
+
+    assert query_shape('SELECT 1 WHERE id IN (%s, %s, %s)') == query_shape('SELECT 1 WHERE id IN (%s)')
+
+
+@pytest.mark.django_db
+def test_async_views_match_sync_views(async_client):
+    """
+    Async read-only views render the same data as their synchronous versions and require login.
+    :param async_client:
+    :return: asserts
+    """
+    from asgiref.sync import async_to_sync, sync_to_async
+
+    school_class = SchoolClass.objects.create(name='3B', year=2022)
+    student = Student.objects.create(first_name='Jan', last_name='Nowak', age=18, school_class=school_class)
+    Teacher.objects.create(first_name='Anna', last_name='Zielińska', gender='K')
+
+    async def requests():
+        responses = {'anonymous': await async_client.get('/async/student/list')}
+        await sync_to_async(async_client.force_login)(await sync_to_async(create_user)())
+        for path in ('/async/index/', '/async/teacher/list', '/async/student/list', '/async/class/list',
+                     f'/async/student/{student.pk}', f'/async/class/details/{school_class.pk}',
+                     '/async/student/0', '/async/student/list?cursor=x'):
+            responses[path] = await async_client.get(path)
+        return responses
+
+    # async_to_sync runs ORM calls in this thread, inside the test transaction
+    responses = async_to_sync(requests)()
+    assert responses['anonymous'].status_code == 302
+    assert responses['/async/index/'].context['student_counter'] == 1
+    assert responses['/async/teacher/list'].context['teacher_list'][0].last_name == 'Zielińska'
+    assert responses['/async/student/list'].context['student_list'] == [student]
+    assert responses['/async/class/list'].context['class_list'] == [school_class]
+    assert responses[f'/async/student/{student.pk}'].context['student'] == student
+    assert responses[f'/async/class/details/{school_class.pk}'].context['students'] == [student]
+    assert responses['/async/student/0'].status_code == 404
+    assert responses['/async/student/list?cursor=x'].status_code == 404
+
+
+@pytest.mark.django_db
+def test_profiling_middleware_under_asgi(async_client, settings):
+    """
+    Profiling middleware works in the async middleware chain without adapting it to sync.
+    :param async_client:
+    :param settings:
+    :return: asserts
+    """
+    import re
+
+    from asgiref.sync import async_to_sync, sync_to_async
+
+    settings.PROFILING_SAMPLE_RATE = 1
+
+    async def request():
+        await sync_to_async(async_client.force_login)(await sync_to_async(create_user)())
+        return await async_client.get('/async/student/list')
+
+    response = async_to_sync(request)()
+    assert response.status_code == 200
+    # session, user and the page run in sync_to_async threads, their queries are counted too
+    queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing'])[1])
+    assert queries > 0
+
+    async def sync_page():
+        return await async_client.get('/student/list')
+
+    settings.PAGE_CACHE_TIMEOUT = 0
+    response = async_to_sync(sync_page)()
+    assert int(re.search(r'desc="(\d+) queries"', response['Server-Timing'])[1]) > 0
+
+
+def _gradebook_class(name, subject_name, students, topics, day):
+    from main_app.models import Grades, SchoolSubjectTopics, Subject
+
+    school_class = SchoolClass.objects.create(name=name, year=2022)
+    subject = Subject.objects.create(name=subject_name)
+    topic_list = [SchoolSubjectTopics.objects.create(name=f'{name} temat {i}', subjects=subject)
+                  for i in range(topics)]
+    for i in range(students):
+        student = Student.objects.create(first_name='Jan', last_name=f'Nowak{"a" * i}', age=18,
+                                         school_class=school_class)
+        for topic in topic_list:
+            grade = Grades.objects.create(grade=4, weight=1, subject=subject, date=day, student=student)
+            grade.topic.add(topic)
+    return school_class, subject
+
+
+@pytest.mark.django_db
+def test_gradebook_matrix_uses_constant_queries(client):
+    """
+    Gradebook pivots grades into students x topics and costs the same number of queries for any size.
+    :param client:
+    :return: asserts
+    """
+    import datetime
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from main_app.gradebook import build
+    from main_app.models import Grades
+
+    day = datetime.date(2022, 10, 3)
+    small_class, subject = _gradebook_class('1A', 'Matematyka', 2, 2, day)
+    big_class, big_subject = _gradebook_class('1B', 'Fizyka', 8, 6, day)
+
+    Grades.objects.create(grade=2, weight=3, subject=subject, date=day,
+                          student=small_class.student_set.order_by('last_name').first())
+
+    with CaptureQueriesContext(connection) as small:
+        book = build(small_class, subject, 2022, 1)
+    with CaptureQueriesContext(connection) as big:
+        big_book = build(big_class, big_subject, 2022, 1)
+    assert len(small) == len(big) == 4
+
+    assert len(big_book.rows) == 8 and len(big_book.topics) == 6
+    assert book.topics[-1] is None
+    first = book.rows[0]
+    assert first.cells == [[4], [4], [2]]
+    assert first.average == (4 + 4 + 2 * 3) / 5
+    assert book.rows[1].cells == [[4], [4], []]
+    assert book.topic_averages[0] == 4
+
+    client.force_login(create_user())
+    response = client.get(f'/class/{small_class.pk}/gradebook', {'subject': subject.pk, 'school_year': 2022,
+                                                                   'term': 1})
+    assert response.status_code == 200
+    assert response.context['gradebook'].rows[0].average == first.average
+    assert client.get(f'/class/{small_class.pk}/gradebook', {'term': 5}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_generate_report_cards_resumes(tmp_path):
+    """
+    Report cards are written per class and a repeated run generates only missing files.
+    :param tmp_path:
+    :return: asserts
+    """
+    import datetime
+    import io
+    import os
+
+    from django.core.management import call_command
+
+    from main_app.synthetic import seed
+    from main_app.models import term_of
+    from main_app.report_cards import class_directory
+
+    seed('small')
+    school_class = SchoolClass.objects.get(name='1A')
+    school_year, term = term_of(datetime.date.today())
+    options = {'year': school_class.year, 'output': str(tmp_path), 'workers': 1, 'stdout': io.StringIO()}
+
+    call_command('generate_report_cards', **options)
+    directory = class_directory(str(tmp_path), school_class, school_year, term)
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.html'))
+    assert len(files) == school_class.student_set.count()
+    html = open(os.path.join(directory, files[0]), encoding='utf-8').read()
+    assert 'Świadectwo szkolne' in html and 'Frekwencja' in html
+
+    os.remove(os.path.join(directory, files[0]))
+    out = io.StringIO()
+    call_command('generate_report_cards', **{**options, 'stdout': out})
+    assert '0 written' in out.getvalue()
+    assert not os.path.exists(os.path.join(directory, files[0]))
+
+    for name in os.listdir(directory):
+        if name.startswith('.complete'):
+            os.remove(os.path.join(directory, name))
+    out = io.StringIO()
+    call_command('generate_report_cards', **{**options, 'stdout': out})
+    assert f'1 written, {len(files) - 1} skipped' in out.getvalue()
+    assert os.path.exists(os.path.join(directory, files[0]))
+
+
+# workers are forked processes which read committed data with their own connections
+@pytest.mark.django_db(transaction=True)
+def test_generate_report_cards_in_worker_processes(tmp_path, monkeypatch):
+    """
+    With --workers 2 classes are generated by two forked processes, connections are closed before the fork.
+    :param tmp_path:
+    :param monkeypatch:
+    :return: asserts
+    """
+    import datetime
+    import io
+    import os
+
+    from django.core.management import call_command
+    from django.db import connections
+
+    from main_app.models import term_of
+    from main_app.report_cards import class_directory
+    from main_app.synthetic import seed
+
+    seed('small')
+    year = SchoolClass.objects.get(name='1A').year
+    second = SchoolClass.objects.create(name='1Z', year=year)
+    for name in ('Nowak', 'Kot'):
+        Student.objects.create(first_name='Jan', last_name=name, age=16, school_class=second)
+    classes = list(SchoolClass.objects.filter(year=year))
+    school_year, term = term_of(datetime.date.today())
+
+    closed = []
+    close_all = connections.close_all
+    monkeypatch.setattr(connections, 'close_all', lambda: closed.append(os.getpid()) or close_all())
+    out = io.StringIO()
+    call_command('generate_report_cards', year=year, output=str(tmp_path), workers=2, stdout=out)
+
+    assert closed == [os.getpid()]
+    for school_class in classes:
+        directory = class_directory(str(tmp_path), school_class, school_year, term)
+        files = [name for name in os.listdir(directory) if name.endswith('.html')]
+        assert len(files) == school_class.student_set.count()
+        assert f'{school_class.name} ({year}): {len(files)} written, 0 skipped' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_rollover_moves_classes_to_next_year(client, django_assert_max_num_queries):
+    """
+    Rollover makes classes of the next year, moves students with one update per class and graduates last classes.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    from main_app import jobs
+    from main_app.models import Job, current_year
+
+    year = current_year() - 1
+    first = SchoolClass.objects.create(name='1A', year=year)
+    last = SchoolClass.objects.create(name='4A', year=year)
+    odd = SchoolClass.objects.create(name='Zerówka', year=year)
+    existing = SchoolClass.objects.create(name='2A', year=year + 1)
+    for i in range(3):
+        Student.objects.create(first_name='Adam', last_name='Nowak', age=16, school_class=first)
+        Student.objects.create(first_name='Ewa', last_name='Kowalska', age=19, school_class=last)
+    SchoolClass.objects.create(name='1B', year=year)
+
+    create_user()
+    client.login(username='testuser', password='12345')
+    response = client.post(reverse('class-rollover'), {'from_year': year, 'dry_run': 'on'})
+    assert response.status_code == 200
+    assert response.context['report'].moved_students == 3
+    assert Student.objects.filter(school_class=first).count() == 3
+
+    response = client.post(reverse('class-rollover'), {'from_year': year})
+    assert response.status_code == 302 and Student.objects.filter(school_class=first).count() == 3
+    job = Job.objects.get(kind='rollover')
+    with django_assert_max_num_queries(14):
+        assert jobs.run(jobs.claim('test')) == Job.DONE
+    job.refresh_from_db()
+    assert job.result['created'] == 1 and job.result['graduated'] == ['4A'] and job.result['skipped'][0][0] == odd.name
+    assert Student.objects.filter(school_class=existing).count() == 3
+    assert SchoolClass.objects.filter(name='2B', year=year + 1).exists()
+    last.refresh_from_db()
+    assert last.graduated and last.student_set.count() == 3
+
+    response = client.post(reverse('class-rollover'), {'from_year': year + 1})
+    assert 'from_year' in response.context['form'].errors
+
+
+@pytest.mark.django_db
+def test_pages_are_cached_until_data_changes(client, django_assert_max_num_queries):
+    """
+    Lists and class details are served from cache until a model shown on them is changed.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    from main_app.page_cache import HEADER, stats
+
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    Student.objects.create(first_name='Adam', last_name='Nowak', age=16, school_class=school_class)
+    create_user()
+    client.login(username='testuser', password='12345')
+    url = reverse('class-details', args=[school_class.pk])
+
+    assert client.get(url)[HEADER] == 'miss'
+    with django_assert_max_num_queries(2):
+        response = client.get(url)
+    assert response[HEADER] == 'hit' and 'Nowak' in response.content.decode()
+    assert client.get(url + '?x=1')[HEADER] == 'miss'
+
+    Student.objects.create(first_name='Ewa', last_name='Kowalska', age=16, school_class=school_class)
+    response = client.get(url)
+    assert response[HEADER] == 'miss' and 'Kowalska' in response.content.decode()
+    assert client.get(reverse('teacher-list'))[HEADER] == 'miss'
+    assert client.get(reverse('teacher-list'))[HEADER] == 'hit'
+    Teacher.objects.create(first_name='Jan', last_name='Kowalski').subject.create(name='Fizyka')
+    assert client.get(reverse('teacher-list'))[HEADER] == 'miss'
+
+    assert stats()['StudentClassDetailsView'] == {'hits': 1, 'misses': 3, 'hit_rate': 0.25}
+
+
+def test_version_stamps_are_shared_by_processes(settings):
+    """
+    Stamp bumped by another worker process is seen by this one, per-process cache is refused without DEBUG.
+    :param settings:
+    :return: asserts
+    """
+    import multiprocessing
+
+    from django.core.checks import run_checks
+    from main_app.models import Grades
+    from main_app.versioning import bump, model_versions
+
+    before = model_versions(Grades)[Grades]
+    worker = multiprocessing.get_context('fork').Process(target=bump, args=(Grades,))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    assert model_versions(Grades)[Grades] > before
+
+    settings.DEBUG = False
+    assert 'main_app.E001' not in [error.id for error in run_checks()]
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    assert 'main_app.E001' in [error.id for error in run_checks()]
+
+
+@pytest.mark.django_db
+def test_session_and_user_are_cached(client, django_assert_num_queries):
+    """
+    Logged in requests read neither the session nor the user from the database, password change and logout
+    still end other sessions.
+    :param client:
+    :param django_assert_num_queries:
+    :return: asserts
+    """
+    import multiprocessing
+
+    from main_app import auth
+
+    user = create_user()
+    other = Client()
+    for c in (client, other):
+        assert c.post('/', {'uname': 'testuser', 'psw': '12345'}).status_code == 302
+    assert client.get(reverse('class-list')).status_code == 200
+    with django_assert_num_queries(0):
+        assert client.get(reverse('class-list')).status_code == 200
+
+    # user changed in another worker process is read again here
+    worker = multiprocessing.get_context('fork').Process(target=auth.forget_user, args=(user.pk,))
+    worker.start()
+    worker.join()
+    with django_assert_num_queries(1):
+        assert client.get(reverse('class-list')).status_code == 200
+
+    response = client.post(reverse('change-password'), {
+        'old_password': '12345', 'new_password1': 'Nowe-haslo-2022', 'new_password2': 'Nowe-haslo-2022'})
+    assert response.status_code == 302
+    assert client.get(reverse('class-list')).status_code == 200
+    assert other.get(reverse('class-list')).status_code == 302
+
+    client.get(reverse('logout'))
+    assert client.get(reverse('class-list')).status_code == 302
+
+
+@pytest.mark.django_db
+def test_login_is_throttled_before_hashing(client, settings):
+    """
+    Over-limit login attempts are answered with 429 without checking the password.
+    :param client:
+    :param settings:
+    :return: asserts
+    """
+    import time
+
+    settings.LOGIN_THROTTLE = {'ip': (8, 1), 'username': (3, 1)}
+    create_user()
+    for _ in range(3):
+        assert client.post('/', {'uname': 'testuser', 'psw': 'zle'}).status_code == 200
+    response = client.post('/', {'uname': 'TestUser', 'psw': '12345'})
+    assert response.status_code == 429 and int(response['Retry-After']) >= 1
+
+    assert client.post('/', {'uname': 'inny', 'psw': 'zle'}).status_code == 200
+    start = time.perf_counter()
+    statuses = [client.post('/', {'uname': f'user{i}', 'psw': 'zle'}).status_code for i in range(50)]
+    assert statuses.count(200) == 3 and statuses.count(429) == 47
+    assert time.perf_counter() - start < 2
+
+    assert Client(REMOTE_ADDR='10.0.0.2').post('/', {'uname': 'inny', 'psw': 'zle'}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_class_grades_saved_in_bulk(client, django_assert_max_num_queries):
+    """
+    Grades of the whole class are entered on one page and saved with a constant number of queries.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    from main_app.models import GradeAverage, Grades, SchoolSubjectTopics, Subject
+
+    school_class = SchoolClass.objects.create(name='1A', year=2021)
+    students = [Student.objects.create(first_name='Adam', last_name=f'Nowak{i}', age=16, school_class=school_class)
+                for i in range(12)]
+    math = Subject.objects.create(name='Matematyka')
+    topic = SchoolSubjectTopics.objects.create(name='Ułamki', subjects=math)
+    SchoolSubjectTopics.objects.create(name='Atomy', subjects=Subject.objects.create(name='Chemia'))
+    create_user()
+    client.login(username='testuser', password='12345')
+    url = reverse('class-grades', args=[school_class.pk])
+
+    response = client.get(url, {'subject': math.pk})
+    assert response.status_code == 200
+    assert list(response.context['form'].fields['topic'].queryset) == [topic]
+    assert len(response.context['formset'].forms) == 12
+
+    data = {'subject': math.pk, 'topic': topic.pk, 'date': '2022-03-10', 'weight': 3,
+            'form-TOTAL_FORMS': 12, 'form-INITIAL_FORMS': 12}
+    for i, student in enumerate(students):
+        data[f'form-{i}-student'] = student.pk
+        data[f'form-{i}-grade'] = '' if i == 0 else 1 + i % 6
+    with django_assert_max_num_queries(20):
+        response = client.post(url, data)
+    assert response.status_code == 302
+    assert Grades.objects.filter(subject=math, weight=3, topic=topic).count() == 11
+    assert not Grades.objects.filter(student=students[0]).exists()
+    assert GradeAverage.objects.get(student=students[1], subject=math).average == 2
+
+    data['form-1-grade'] = 7
+    response = client.post(url, data)
+    assert response.status_code == 200 and response.context['formset'].errors[1]
+    data['form-1-grade'] = ''
+    data['form-2-student'] = Student.objects.create(first_name='Ewa', last_name='Obca', age=16).pk
+    response = client.post(url, data)
+    assert response.context['formset'].non_form_errors()
+    assert Grades.objects.count() == 11
+
+
+@pytest.mark.django_db
+def test_archive_graduated_classes(client, django_assert_max_num_queries):
+    """
+    Graduated classes are moved to the archive in batches, deleting a student archives him too.
+    :param client:
+    :param django_assert_max_num_queries:
+    :return: asserts
+    """
+    import io
+
+    from django.core.management import call_command
+
+    from main_app import counters
+    from main_app.models import ArchivedStudent, GradeAverage, Grades, PresenceList
+    from main_app.synthetic import seed
+
+    school = seed('small')
+    school_class = SchoolClass.objects.get(pk=school.class_id)
+    SchoolClass.objects.filter(pk=school_class.pk).update(graduated=True)
+    ids = set(school_class.student_set.values_list('id', flat=True))
+    grades = Grades.objects.filter(student_id__in=ids).count()
+    student = Student.objects.get(pk=min(ids))
+    student_grades = list(Grades.objects.filter(student=student).order_by('date', 'id')
+                          .values_list('grade', flat=True))
+
+    out = io.StringIO()
+    call_command('archive_graduates', batch_size=3, stdout=out)
+    assert f'{len(ids)} students, {grades} grades' in out.getvalue()
+    assert not SchoolClass.objects.filter(pk=school_class.pk).exists()
+    assert not Grades.objects.filter(student_id__in=ids).exists()
+    assert not PresenceList.objects.filter(student_id__in=ids).exists()
+    assert not GradeAverage.objects.filter(student_id__in=ids).exists()
+    assert counters.read(['students', 'grades']) == {'students': Student.objects.count(),
+                                                     'grades': Grades.objects.count()}
+
+    archived = ArchivedStudent.objects.get(original_id=student.pk)
+    assert [row[2] for row in archived.grades] == student_grades
+    assert archived.class_name == school_class.name and len(archived.presence) == 5
+
+    create_user()
+    client.login(username='testuser', password='12345')
+    with django_assert_max_num_queries(3):
+        response = client.get(reverse('archive-list'))
+    assert len(response.context['archived_list']) == len(ids)
+    assert client.get(reverse('archive-details', args=[archived.pk])).status_code == 200
+
+    other = Student.objects.exclude(school_class=None).first()
+    assert client.post(reverse('student-delete', args=[other.pk])).status_code == 302
+    assert ArchivedStudent.objects.filter(original_id=other.pk).exists()
+    assert not Grades.objects.filter(student_id=other.pk).exists()
+
+
+@pytest.mark.django_db
+def test_presence_retention_without_partitions():
+    """
+    Month helpers of partitioning and retention fallback which deletes old attendance on a plain table.
+    :return: asserts
+    """
+    import datetime
+    import io
+
+    from django.core.management import call_command
+
+    from main_app import partitions
+    from main_app.models import PresenceList
+
+    assert partitions.months(datetime.date(2021, 11, 15), datetime.date(2022, 2, 1)) == [
+        datetime.date(2021, 11, 1), datetime.date(2021, 12, 1), datetime.date(2022, 1, 1), datetime.date(2022, 2, 1)]
+    assert partitions.partition_name(datetime.date(2022, 2, 1)) == 'main_app_presencelist_p2022_02'
+    if partitions.is_partitioned():
+        pytest.skip('PresenceList is partitioned (PostgreSQL after migration 0014)')
+
+    student = Student.objects.create(first_name='Adam', last_name='Nowak', age=16)
+    today = datetime.date.today()
+    old = partitions.month_start(today) - datetime.timedelta(days=70)
+    for day in (old, old + datetime.timedelta(days=1), today):
+        PresenceList.objects.create(student=student, day=day, present=True)
+    assert partitions.ensure_partitions(old, today) == []
+
+    out = io.StringIO()
+    call_command('presence_partitions', retain_months=1, stdout=out)
+    assert 'deleted 2 entries' in out.getvalue()
+    assert list(PresenceList.objects.values_list('day', flat=True)) == [today]
+
+
+@pytest.mark.django_db
+def test_seed_school_command():
+    """
+    Generated school passes model validation and its counters, averages and topics are consistent.
+    :return: asserts
+    """
+    import io
+
+    from django.core.management import call_command
+    from django.core.management.base import CommandError
+
+    from main_app import counters
+    from main_app.models import GradeAverage, Grades, PresenceList
+    from main_app.synthetic import class_name, school_year_days
+
+    assert [class_name(i, 4) for i in (0, 3, 4, 104, 107)] == ['1A', '4A', '1B', '1AA', '4AA']
+
+    out = io.StringIO()
+    call_command('seed_school', students=45, years=0.5, students_per_class=20, grades_per_year=10,
+                 batch_size=100, stdout=out)
+    days = school_year_days(0.5)
+    assert SchoolClass.objects.count() == 3 and Teacher.objects.count() == 3
+    assert Grades.objects.count() == 45 * 5
+    assert Grades.topic.through.objects.count() == 45 * 5
+    assert PresenceList.objects.count() == 45 * len(days)
+    assert GradeAverage.objects.exists()
+    assert counters.read(['students', 'grades']) == {'students': 45, 'grades': 225}
+    for student in Student.objects.all()[:10]:
+        student.full_clean()
+    assert Student.objects.filter(school_class__name='3A').count() == 5
+    assert Student.objects.create(first_name='Adam', last_name='Nowak', age=16).pk == 46
+
+    with pytest.raises(CommandError):
+        call_command('seed_school', students=10, stdout=out)
+
+
+def test_load_test_against_live_server(live_server, tmp_path):
+    """
+    Simulated users log in, click through teacher and admin scenarios and their requests are reported
+    per url name.
+    :return: asserts
+    """
+    import io
+    import json
+
+    from django.core.management import call_command
+
+    from main_app.loadtest import Recorder, assign_roles, parse_mix, percentile
+    from main_app.models import Grades
+    from main_app.synthetic import seed
+
+    assert percentile([10, 20, 30, 40], 50) == 20 and percentile([10, 20, 30, 40], 99) == 40
+    assert assign_roles(4, parse_mix('teacher=3,admin=1')) == ['teacher', 'teacher', 'admin', 'teacher']
+    assert Recorder().url_name('/class/details/7?x=1') == 'class-details'
+
+    seed('small')
+    grades = Grades.objects.count()
+    out, results = io.StringIO(), tmp_path / 'load.json'
+    call_command('load_test', url=live_server.url, concurrency='1,2', duration=1, mix='teacher=1,admin=1',
+                 think_time=0, create_users=True, max_p95=0, json=str(results), stdout=out)
+
+    report = json.loads(results.read_text())
+    assert report['login']['urls']['login']['requests'] == 4 and not report['login']['failed']
+    assert [stage['concurrency'] for stage in report['stages']] == [1, 2]
+    urls = report['stages'][-1]['urls']
+    assert {'class-details', 'grades-add', 'student-list', 'student-details', 'class-list'} <= set(urls)
+    assert all(stage['total']['errors'] == 0 for stage in report['stages'])
+    assert urls['grades-add']['p50_ms'] <= urls['grades-add']['p99_ms']
+    assert Grades.objects.count() > grades
+    assert 'all stages within limits' in out.getvalue()
+
+
+def test_load_test_client_does_not_repeat_answered_post():
+    """
+    Request on a kept-alive connection broken by the server is sent again only if it is idempotent
+    or no byte of the response came.
+    :return: asserts
+    """
+    import asyncio
+    from main_app.loadtest import HttpClient
+
+    # server behaviour for every next request: answer, close after part of the response, close without answer
+    plan = ['answer', 'break', 'answer', 'break', 'answer', 'drop', 'answer']
+    received = []
+
+    async def handle(reader, writer):
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = [line for line in head.split(b'\r\n') if line.lower().startswith(b'content-length')]
+            if length:
+                await reader.readexactly(int(length[0].split(b':')[1]))
+            received.append(head.split()[0].decode())
+            action = plan[len(received) - 1]
+            if action == 'answer':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+                await writer.drain()
+                continue
+            if action == 'break':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n')
+                await writer.drain()
+            writer.close()
+            return
+
+    async def scenario():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        client = HttpClient('127.0.0.1', server.sockets[0].getsockname()[1], timeout=5)
+        try:
+            assert (await client.request('GET', '/'))[0] == 200
+            with pytest.raises(asyncio.IncompleteReadError):
+                await client.request('POST', '/', {'grade': 5})
+            assert (await client.request('GET', '/'))[0] == 200
+            assert (await client.request('GET', '/'))[2] == b'ok'
+            assert (await client.request('POST', '/', {'grade': 5}))[2] == b'ok'
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+    assert received == ['GET', 'POST', 'GET', 'GET', 'GET', 'POST', 'POST']
+
+
+@pytest.mark.django_db
+def test_background_jobs(client, settings, tmp_path, monkeypatch):
+    """
+    Jobs are queued by views, claimed once, retried with a delay and their status and files are served.
+    :return: asserts
+    """
+    import datetime
+    import io
+    import zipfile
+
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from main_app import jobs
+    from main_app.exports import export_lines
+    from main_app.models import Job, current_year
+    from main_app.synthetic import seed
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    school = seed('small')
+    client.force_login(create_user())
+
+    response = client.post(reverse('export', kwargs={'kind': 'grades'}), {'school_class': school.class_id})
+    export = Job.objects.get(kind='export')
+    assert response.status_code == 202 and response.json()['status'] == Job.QUEUED
+    assert response['Location'] == reverse('job-status', kwargs={'pk': export.pk})
+    response = client.post(reverse('report-cards'), {'year': current_year(), 'school_year': current_year(),
+                                                     'term': 1, 'formats': ['html']})
+    cards = Job.objects.get(kind='report-cards')
+    assert response.url == reverse('job-details', kwargs={'pk': cards.pk})
+
+    # a job is given to one worker only
+    assert jobs.claim('first').pk == export.pk
+    assert jobs.claim('second').pk == cards.pk and jobs.claim('third') is None
+    assert jobs.run(Job.objects.get(pk=export.pk)) == Job.DONE
+    Job.objects.filter(pk=cards.pk).update(heartbeat=timezone.now() - datetime.timedelta(hours=1))
+    assert jobs.requeue_stale() == (1, 0)
+
+    out = io.StringIO()
+    call_command('run_worker', burst=True, stdout=out)
+    assert 'finished, 1 jobs' in out.getvalue()
+    status = client.get(reverse('job-status', kwargs={'pk': export.pk})).json()
+    assert status['status'] == Job.DONE and status['progress'] == 100
+    download = client.get(status['download'])
+    assert b''.join(download.streaming_content).decode() == \
+        ''.join(export_lines('grades', 'csv', school_class=school.class_id))
+    cards.refresh_from_db()
+    students = Student.objects.filter(school_class__year=current_year()).count()
+    assert cards.status == Job.DONE and cards.attempts == 2 and cards.result['report_cards'] == students
+    with zipfile.ZipFile(cards.output.path) as package:
+        assert len(package.namelist()) == students and all(name.endswith('.html') for name in package.namelist())
+
+    # unexpected errors are retried with a growing delay, errors of data fail at once
+    def broken(job, progress):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setitem(jobs.JOBS, 'export', jobs.JobKind('Eksport', broken, max_attempts=2))
+    job = jobs.enqueue('export', {'kind': 'grades', 'format': 'csv'})
+    assert jobs.work(burst=True) == 1
+    job.refresh_from_db()
+    assert job.status == Job.QUEUED and job.run_after > timezone.now() and 'RuntimeError' in job.error
+    Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+    assert jobs.work(burst=True) == 1
+    job.refresh_from_db()
+    assert job.status == Job.FAILED and job.attempts == 2
+
+    client.post(reverse('job-retry', kwargs={'pk': job.pk}))
+    job.refresh_from_db()
+    assert job.status == Job.QUEUED and job.max_attempts == 3 and not job.error
+
+    monkeypatch.undo()
+    job = jobs.enqueue('export', {'kind': 'grades', 'format': 'csv', 'school_class': 0})
+    Job.objects.exclude(pk=job.pk).filter(status=Job.QUEUED).delete()
+    jobs.work(burst=True)
+    job.refresh_from_db()
+    assert job.status == Job.FAILED and job.attempts == 1 and 'nie istnieje' in job.error
+
+    response = client.get(reverse('job-list'), {'status': Job.FAILED})
+    assert [row.pk for row in response.context['job_list']] == [job.pk]
+    assert client.get(reverse('job-details', kwargs={'pk': cards.pk})).status_code == 200
@@ -0,0 +1,66 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class TokenBucket:
+    """
+    Token bucket kept in the cache: capacity attempts at once, refilled with per_minute tokens a minute.
+    State is read and written without a lock, under a race a few attempts more may pass, never fewer.
+    With locmem cache every process has its own buckets, a shared backend (redis, file) limits all of them.
+    """
+
+    def __init__(self, name, capacity, per_minute):
+        self.name = name
+        self.capacity = capacity
+        self.rate = per_minute / 60
+
+    def _key(self, ident):
+        return f'throttle:{self.name}:{hashlib.md5(str(ident).encode()).hexdigest()}'
+
+    def take(self, ident, now=None):
+        """
+        Function that takes one token from the bucket of ident
+        :param ident: ip, username...
+        :param now: time in seconds, time.time() by default
+        :return: 0 if the token was taken, otherwise seconds until the next token
+        """
+        now = time.time() if now is None else now
+        key = self._key(ident)
+        tokens, updated = cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        # bucket becomes full again (and can be forgotten) after this time
+        cache.set(key, (tokens - 1, now), math.ceil((self.capacity - tokens + 1) / self.rate) + 1)
+        return 0
+
+    def reset(self, ident):
+        cache.delete(self._key(ident))
+
+
+def login_buckets():
+    """
+    Function that builds buckets from settings.LOGIN_THROTTLE, {'ip': (capacity, per_minute), 'username': ...}
+    :return: dict name -> TokenBucket
+    """
+    limits = getattr(settings, 'LOGIN_THROTTLE', None) or {}
+    return {name: TokenBucket(f'login-{name}', *limit) for name, limit in limits.items() if limit}
+
+
+def throttle_login(request, username):
+    """
+    Function that takes a token from the buckets of the client ip and of the username. Has to be called
+    before authenticate, which runs the costly password hash.
+    :param request: HttpRequest
+    :param username: username from the form
+    :return: 0 if the attempt is allowed, otherwise seconds to wait
+    """
+    idents = {'ip': request.META.get('REMOTE_ADDR', ''), 'username': username.strip().lower()}
+    wait = 0
+    for name, bucket in login_buckets().items():
+        wait = max(wait, bucket.take(idents[name]))
+    return math.ceil(wait)
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Grades, PresenceList, SchoolClass, SchoolSubjectTopics, Student, Subject, Teacher
+
+VERSIONED_MODELS = (Teacher, Student, SchoolClass, Subject, SchoolSubjectTopics, Grades, PresenceList)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Function that refuses a per-process cache outside DEBUG: stamps bumped by one worker process would stay
+    unseen by others, which would keep serving stale pages and ETags
+    :param app_configs: checked apps
+    :return: list of errors
+    """
+    if settings.DEBUG or not settings.CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+        return []
+    return [checks.Error(
+        'LocMemCache is per process, version stamps would not be shared by worker processes.',
+        hint='Use FileBasedCache (one machine), RedisCache or PyMemcacheCache (SMS_CACHE_BACKEND).',
+        id='main_app.E001',
+    )]
+
+
+def _key(model):
+    return f'model_version:{model._meta.label_lower}'
+
+
+def model_versions(*models):
+    """
+    Function that returns version stamps of models, read from cache in one call without touching the database.
+    Stamp is the time of the last change in nanoseconds, missing stamps are started at current time.
+    :param models: model classes
+    :return: dict model -> version
+    """
+    keys = {_key(model): model for model in models}
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {model: versions[key] for key, model in keys.items()}
+
+
+def _set(models):
+    now = time.time_ns()
+    cache.set_many({_key(model): now for model in models}, None)
+
+
+def bump(*models):
+    """
+    Function that marks models as changed. Called by signals and by bulk operations which bypass them.
+    Inside a transaction stamps are set again after commit, so nobody caches data older than its stamp.
+    :param models: model classes
+    :return: None
+    """
+    _set(models)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _set(models))
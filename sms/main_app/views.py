@@ -1,19 +1,39 @@
+import datetime
+
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.forms import UserCreationForm, PasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import user_passes_test
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, Http404, JsonResponse, \
+    StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse_lazy
+from django.db.models import BigIntegerField, ExpressionWrapper, F
+from django.urls import reverse, reverse_lazy
 
 from django.views.generic.edit import DeleteView, FormView, UpdateView
 from django.views.generic.list import ListView
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 
-from .models import Teacher, TeacherForm, Student, StudentForm, SchoolClassForm, SchoolClass, \
-    SubjectForm, SchoolSubjectTopicsForm, GradesForm, Subject, Grades, SchoolSubjectTopics
+from .models import Teacher, TeacherForm, Student, StudentForm, SchoolClassForm, SchoolClass, Subject, \
+    SubjectForm, SchoolSubjectTopicsForm, GradesForm, PresenceList, ArchivedStudent, Job, \
+    term_of
+from . import archive
+from . import counters
+from .averages import class_averages
+from .exports import EXPORTS, FORMATS, export_lines
+from . import attendance
+from . import gradebook
+from . import jobs
+from .forms import AttendanceReportForm, ClassGradesForm, ExportFilterForm, GradebookForm, RollCallForm, \
+    ReportCardsForm, RolloverForm, RosterImportForm, StudentGradeFormSet
+from .page_cache import VersionedPageCacheMixin
+from .pagination import KeysetPaginationMixin
+from .rollover import RolloverError, plan
+from .roster import RosterFormatError, read_rows
+from .search import search_people
+from .throttling import throttle_login
 
 
 class LogoutView(View):
@@ -45,6 +65,13 @@ class LoginView(View):
         username = request.POST['uname']
         password = request.POST['psw']
 
+        # every attempt costs a password hash, floods are rejected before it
+        wait = throttle_login(request, username)
+        if wait:
+            response = HttpResponse(f'Zbyt wiele prób logowania, spróbuj ponownie za {wait} s', status=429)
+            response['Retry-After'] = str(wait)
+            return response
+
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
@@ -107,23 +134,43 @@ class BaseView(LoginRequiredMixin, View):
     redirect_field_name = 'index'
 
     def get(self, request):
-        teacher_counter = Teacher.objects.count()
-        student_counter = Student.objects.count()
-        ctx = {'teacher_counter': teacher_counter,
-               'student_counter': student_counter}
+        ctx = counters.dashboard()
         return render(request, '__base__.html', ctx)
 
 
+class SearchView(LoginRequiredMixin, View):
+    """
+    Search of students and teachers by name prefixes (?q=), tolerant to missing diacritics and typos.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        ctx = {'query': query}
+        if query:
+            ctx.update(search_people(query))
+        return render(request, 'search.html', ctx)
+
+
 # TEACHER
 
-class TeacherListView(LoginRequiredMixin, ListView):
+class TeacherListView(LoginRequiredMixin, VersionedPageCacheMixin, KeysetPaginationMixin, ListView):
+    """
+    List of teachers, paginated with cursor, subjects are fetched with one extra query per page.
+    """
     login_url = '/'
     redirect_field_name = 'index'
+    cache_models = (Teacher, Subject)
 
     model = Teacher
     template_name = 'teacher_list.html'
     context_object_name = 'teacher_list'
-    queryset = Teacher.objects.all()
+    queryset = Teacher.objects.prefetch_related('subject')
+    sort_options = {
+        'last_name': ('last_name', 'first_name', 'id'),
+    }
+    default_sort = 'last_name'
 
 
 class TeacherFormView(LoginRequiredMixin, View):
@@ -155,17 +202,25 @@ class DeleteTeacherView(LoginRequiredMixin, DeleteView):
 
 # STUDENT
 
-class StudentListView(LoginRequiredMixin, ListView):
+class StudentListView(LoginRequiredMixin, VersionedPageCacheMixin, KeysetPaginationMixin, ListView):
     """
-    List of students.
+    List of students, paginated with cursor and sortable by last name or class.
     """
     login_url = '/'
     redirect_field_name = 'index'
+    cache_models = (Student, SchoolClass)
 
-    model = Teacher
+    model = Student
     template_name = 'student_list.html'
     context_object_name = 'student_list'
-    queryset = Student.objects.all()
+    queryset = Student.objects.select_related('school_class')
+    sort_options = {
+        'last_name': ('last_name', 'first_name', 'id'),
+        # students without class come last
+        'class': (F('school_class__year').asc(nulls_last=True), F('school_class__name').asc(nulls_last=True),
+                  'last_name', 'first_name', 'id'),
+    }
+    default_sort = 'last_name'
 
 
 class StudentFormView(LoginRequiredMixin, View):
@@ -187,6 +242,36 @@ class StudentFormView(LoginRequiredMixin, View):
         return render(request, 'student_form.html', {'form': form})
 
 
+class RosterImportView(LoginRequiredMixin, View):
+    """
+    Upload of csv/xlsx file with many students or teachers at once, imported by a background job.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request):
+        form = RosterImportForm()
+        return render(request, 'roster_import.html', {'form': form})
+
+    def post(self, request):
+        form = RosterImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                # unsupported formats are rejected here, the file is read by the worker
+                read_rows(upload.file, upload.name)
+            except RosterFormatError as e:
+                form.add_error('file', str(e))
+            else:
+                job = jobs.enqueue('roster-import', {
+                    'kind': form.cleaned_data['kind'],
+                    'dry_run': form.cleaned_data['dry_run'],
+                    'filename': upload.name,
+                }, user=request.user, input_file=upload)
+                return redirect('job-details', pk=job.pk)
+        return render(request, 'roster_import.html', {'form': form})
+
+
 class StudentDetailsView(LoginRequiredMixin, View):
     """
     Details of each student in the list.
@@ -196,33 +281,89 @@ class StudentDetailsView(LoginRequiredMixin, View):
 
     def get(self, request, student_id):
         student_details = get_object_or_404(Student, pk=student_id)
+        grade_averages = student_details.grade_averages.select_related('subject') \
+            .order_by('-school_year', '-term', 'subject__name')
         context = {
-            'student': student_details
+            'student': student_details,
+            'grade_averages': grade_averages,
         }
         return render(request, 'student_details.html', context)
 
 
 class DeleteStudentView(LoginRequiredMixin, DeleteView):
+    """
+    Student with the whole history is moved to the archive instead of a cascade delete of all his rows.
+    """
     login_url = '/'
     redirect_field_name = 'index'
 
     model = Student
     success_url = reverse_lazy('student-list')
 
+    def form_valid(self, form):
+        archive.archive_students([self.object.pk])
+        return redirect(self.get_success_url())
+
+
+class ArchivedStudentListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """
+    Read-only list of archived students, history columns are not loaded.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    model = ArchivedStudent
+    template_name = 'archive_list.html'
+    context_object_name = 'archived_list'
+    queryset = ArchivedStudent.objects.defer('grades', 'presence')
+    sort_options = {
+        'class': ('class_year', 'class_name', 'last_name', 'first_name', 'id'),
+        'last_name': ('last_name', 'first_name', 'id'),
+    }
+    default_sort = 'class'
+
+
+class ArchivedStudentDetailsView(LoginRequiredMixin, View):
+    """
+    Grades and attendance of an archived student.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request, pk):
+        student = get_object_or_404(ArchivedStudent, pk=pk)
+        present = sum(1 for _, value in student.presence if value)
+        context = {
+            'student': student,
+            'grades': [dict(zip(('date', 'subject', 'grade', 'weight', 'topics'), row)) for row in student.grades],
+            'attendance': {
+                'total': len(student.presence),
+                'attended': present,
+                'rate': round(100 * present / len(student.presence), 1) if student.presence else None,
+            },
+        }
+        return render(request, 'archive_details.html', context)
+
 
 # CLASS
 
-class SchoolClassListView(LoginRequiredMixin, ListView):
+class SchoolClassListView(LoginRequiredMixin, VersionedPageCacheMixin, KeysetPaginationMixin, ListView):
     """
     List of classes.
     """
     login_url = '/'
     redirect_field_name = 'index'
+    cache_models = (SchoolClass,)
 
     model = SchoolClass
     template_name = 'school_class_list.html'
     context_object_name = 'class_list'
-    queryset = SchoolClass.objects.all().order_by('name')
+    queryset = SchoolClass.objects.all()
+    sort_options = {
+        'name': ('name', 'year', 'id'),
+        'year': ('year', 'name', 'id'),
+    }
+    default_sort = 'name'
 
 
 class SchoolClassFormView(LoginRequiredMixin, View):
@@ -262,10 +403,39 @@ class SchoolClassModify(LoginRequiredMixin, UpdateView):
         return super().post(request, *args, **kwargs)
 
 
-class StudentClassDetailsView(LoginRequiredMixin, View):
+class RolloverView(LoginRequiredMixin, View):
+    """
+    Moves all classes of a year to the next school year, final-year classes graduate. The plan is shown at once,
+    the rollover itself runs as a background job.
+    """
     login_url = '/'
     redirect_field_name = 'index'
 
+    def get(self, request):
+        form = RolloverForm(initial={'from_year': datetime.date.today().year - 1})
+        return render(request, 'rollover.html', {'form': form})
+
+    def post(self, request):
+        form = RolloverForm(request.POST)
+        report = None
+        if form.is_valid():
+            try:
+                report = plan(form.cleaned_data['from_year'])
+            except RolloverError as e:
+                form.add_error('from_year', str(e))
+            else:
+                report.dry_run = True
+                if not form.cleaned_data['dry_run']:
+                    job = jobs.enqueue('rollover', {'from_year': form.cleaned_data['from_year']}, user=request.user)
+                    return redirect('job-details', pk=job.pk)
+        return render(request, 'rollover.html', {'form': form, 'report': report})
+
+
+class StudentClassDetailsView(LoginRequiredMixin, VersionedPageCacheMixin, View):
+    login_url = '/'
+    redirect_field_name = 'index'
+    cache_models = (SchoolClass, Student)
+
     def get(self, request, class_id):
         class_details = get_object_or_404(SchoolClass, pk=class_id)
         students = Student.objects.filter(school_class=class_id)
@@ -276,6 +446,124 @@ class StudentClassDetailsView(LoginRequiredMixin, View):
         return render(request, 'class_details.html', context)
 
 
+class GradebookView(LoginRequiredMixin, View):
+    """
+    Grades of the class in one subject and term (?subject=&school_year=&term=), students as rows and topics
+    as columns. Number of queries does not depend on the number of students, topics or grades.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request, class_id):
+        school_class = get_object_or_404(SchoolClass, pk=class_id)
+        form = GradebookForm(request.GET or None)
+        ctx = {'class': school_class, 'form': form}
+        if form.is_bound and not form.is_valid():
+            return render(request, 'gradebook.html', ctx)
+        data = form.cleaned_data if form.is_bound else {}
+        school_year, term = term_of(datetime.date.today())
+        school_year = data.get('school_year') or school_year
+        term = data.get('term') or term
+        subject = data.get('subject') or form.fields['subject'].queryset.first()
+        if subject is not None:
+            ctx['gradebook'] = gradebook.build(school_class, subject, school_year, term)
+        ctx.update({'subject': subject, 'school_year': school_year, 'term': term})
+        return render(request, 'gradebook.html', ctx)
+
+
+class ClassGradesView(LoginRequiredMixin, View):
+    """
+    Grades of the whole class in one subject and topic (e.g. a test), one field per student. Students left
+    empty get no grade, the rest is saved with bulk inserts in one transaction.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def _context(self, class_id, data=None, initial=None):
+        school_class = get_object_or_404(SchoolClass, pk=class_id)
+        students = Student.objects.filter(school_class=school_class).order_by('last_name', 'first_name', 'id')
+        return {
+            'class': school_class,
+            'form': ClassGradesForm(data, initial=initial),
+            'formset': StudentGradeFormSet(students, data),
+        }
+
+    def get(self, request, class_id):
+        return render(request, 'class_grades.html', self._context(class_id, initial=request.GET.dict()))
+
+    def post(self, request, class_id):
+        ctx = self._context(class_id, data=request.POST)
+        form, formset = ctx['form'], ctx['formset']
+        if form.is_valid() and formset.is_valid():
+            data, grades = form.cleaned_data, formset.grades()
+            gradebook.save_class_grades(data['subject'], data['topic'], data['date'], data['weight'], grades)
+            messages.success(request, f'Zapisano ocen: {len(grades)}.')
+            return redirect(f"{reverse('gradebook', args=[class_id])}?subject={data['subject'].pk}")
+        return render(request, 'class_grades.html', ctx)
+
+
+class RollCallView(LoginRequiredMixin, View):
+    """
+    Attendance of the whole class on one day (?day=YYYY-MM-DD, today by default) saved with one upsert.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def _get_day(self, request):
+        try:
+            return datetime.date.fromisoformat(request.GET.get('day', ''))
+        except ValueError:
+            return datetime.date.today()
+
+    def _context(self, class_id, day, data=None):
+        school_class = get_object_or_404(SchoolClass, pk=class_id)
+        students = Student.objects.filter(school_class=school_class).order_by('last_name', 'first_name', 'id')
+        presence = dict(PresenceList.objects.filter(student__school_class=school_class, day=day)
+                        .values_list('student_id', 'present'))
+        form = RollCallForm(students, presence, data=data)
+        return {'class': school_class, 'day': day, 'form': form}
+
+    def get(self, request, class_id):
+        return render(request, 'roll_call.html', self._context(class_id, self._get_day(request)))
+
+    def post(self, request, class_id):
+        day = self._get_day(request)
+        ctx = self._context(class_id, day, data=request.POST)
+        form = ctx['form']
+        if form.is_valid():
+            attendance.save_roll_call(day, form.presence())
+            messages.success(request, 'Obecność została zapisana.')
+            return redirect(f"{reverse('roll-call', args=[class_id])}?day={day.isoformat()}")
+        return render(request, 'roll_call.html', ctx)
+
+
+class AttendanceReportView(LoginRequiredMixin, View):
+    """
+    Attendance rates of classes or students of one class, absence streaks and weekly/monthly breakdown.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request):
+        form = AttendanceReportForm(request.GET or None)
+        ctx = {'form': form}
+        if form.is_bound and not form.is_valid():
+            return render(request, 'attendance_report.html', ctx)
+        data = form.cleaned_data if form.is_bound else {'school_class': None, 'period': 'week'}
+        school_class = data['school_class']
+        date_from = data.get('date_from') or datetime.date(term_of(datetime.date.today())[0], 9, 1)
+        date_to = data.get('date_to')
+
+        if school_class:
+            ctx['student_rates'] = attendance.student_rates(school_class, date_from, date_to)
+            ctx['streaks'] = attendance.absence_streaks(school_class, date_from, date_to)
+        else:
+            ctx['class_rates'] = attendance.class_rates(date_from, date_to)
+        ctx['breakdown'] = attendance.breakdown(data['period'], school_class, None, date_from, date_to)
+        ctx['date_from'] = date_from
+        return render(request, 'attendance_report.html', ctx)
+
+
 # SUBJECT
 
 class SubjectFormView(LoginRequiredMixin, View):
@@ -326,20 +614,207 @@ class GradesFormView(LoginRequiredMixin, FormView):
     form_class = GradesForm
     success_url = '/grades/add'
 
+    def form_valid(self, form):
+        form.save()
+        return super().form_valid(form)
 
-class StudentTopicGradeSubjectView(View):
+
+class StudentTopicGradeSubjectView(LoginRequiredMixin, View):
     """
-    Still working on it.
+    Weighted averages per subject for the whole school or one class (?school_class=) in a term
+    (?school_year=&term=), read from precomputed GradeAverage rows.
     """
+    login_url = '/'
+    redirect_field_name = 'index'
+
     def get(self, request):
-        subject = Subject.objects.all().order_by('name')
-        grades = Grades.objects.all()
-        student = Student.objects.all()
-        topic = SchoolSubjectTopics.objects.all()
+        school_year, term = term_of(datetime.date.today())
+        try:
+            school_year = int(request.GET.get('school_year', school_year))
+            term = int(request.GET.get('term', term))
+            school_class = int(request.GET['school_class']) if request.GET.get('school_class') else None
+        except ValueError:
+            return HttpResponseBadRequest('Nieprawidłowe parametry')
         ctx = {
-            'subject': subject,
-            'grades': grades,
-            'student': student,
-            'topic': topic,
+            'averages': class_averages(school_class, school_year, term),
+            'classes': SchoolClass.objects.order_by('-year', 'name'),
+            'school_class': school_class,
+            'school_year': school_year,
+            'term': term,
         }
         return render(request, 'grades_list.html', ctx)
+
+
+# EXPORT
+
+class ExportView(LoginRequiredMixin, View):
+    """
+    Streaming export of grades or presence list, filtered with ?school_class=&subject=&date_from=&date_to=
+    and encoded as csv or jsonl (?format=). POST with the same fields queues the export as a background job
+    and answers 202 with the job status.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request, kind):
+        if kind not in EXPORTS:
+            raise Http404('Nieznany rodzaj eksportu')
+        form = ExportFilterForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        fmt = form.cleaned_data['format']
+        _, content_type = FORMATS[fmt]
+        response = StreamingHttpResponse(export_lines(kind, fmt, **form.filters()), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+        return response
+
+    def post(self, request, kind):
+        if kind not in EXPORTS:
+            raise Http404('Nieznany rodzaj eksportu')
+        form = ExportFilterForm(request.POST)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        filters = form.filters()
+        job = jobs.enqueue('export', {
+            'kind': kind,
+            'format': form.cleaned_data['format'],
+            'school_class': filters['school_class'].pk if filters['school_class'] else None,
+            'subject': filters['subject'].pk if filters['subject'] else None,
+            'date_from': filters['date_from'].isoformat() if filters['date_from'] else None,
+            'date_to': filters['date_to'].isoformat() if filters['date_to'] else None,
+        }, user=request.user)
+        response = JsonResponse(job_status(job), status=202)
+        response['Location'] = reverse('job-status', kwargs={'pk': job.pk})
+        return response
+
+
+# BACKGROUND JOBS
+
+class ReportCardsView(LoginRequiredMixin, View):
+    """
+    Report cards of all classes of a year, generated by a background job into one zip file.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request):
+        school_year, term = term_of(datetime.date.today())
+        form = ReportCardsForm(initial={'year': school_year, 'school_year': school_year, 'term': term})
+        return render(request, 'report_cards.html', {'form': form})
+
+    def post(self, request):
+        form = ReportCardsForm(request.POST)
+        if form.is_valid():
+            job = jobs.enqueue('report-cards', form.cleaned_data, user=request.user)
+            return redirect('job-details', pk=job.pk)
+        return render(request, 'report_cards.html', {'form': form})
+
+
+def job_status(job):
+    """
+    Function that returns state of the job polled by the job page and API clients
+    :param job: Job
+    :return: dict
+    """
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'message': job.message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created': job.created,
+        'started': job.started,
+        'finished': job.finished,
+        'download': reverse('job-download', kwargs={'pk': job.pk}) if job.output else None,
+    }
+
+
+class JobListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """
+    Background jobs, newest first, optionally only with one status (?status=).
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    model = Job
+    template_name = 'job_list.html'
+    context_object_name = 'job_list'
+    sort_options = {'newest': ('newest',)}
+    default_sort = 'newest'
+
+    def get_queryset(self):
+        queryset = Job.objects.defer('params', 'result', 'error') \
+            .annotate(newest=ExpressionWrapper(-F('id'), output_field=BigIntegerField()))
+        status = self.request.GET.get('status')
+        if status in dict(Job.STATUS_CHOICES):
+            queryset = queryset.filter(status=status)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for job in context['job_list']:
+            job.label = jobs.JOBS[job.kind].label if job.kind in jobs.JOBS else job.kind
+        context['statuses'] = Job.STATUS_CHOICES
+        context['status'] = self.request.GET.get('status', '')
+        return context
+
+
+class JobDetailsView(LoginRequiredMixin, View):
+    """
+    Progress and result of one job, the page reloads itself until the job ends.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        kind = jobs.JOBS.get(job.kind)
+        return render(request, 'job_details.html', {
+            'job': job,
+            'label': kind.label if kind else job.kind,
+            'status': job_status(job),
+        })
+
+
+class JobStatusView(LoginRequiredMixin, View):
+    """
+    Status of the job as json, for polling.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request, pk):
+        return JsonResponse(job_status(get_object_or_404(Job, pk=pk)))
+
+
+class JobRetryView(LoginRequiredMixin, View):
+    """
+    Queues a failed job again.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def post(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        if not jobs.retry(job):
+            messages.error(request, 'Ponowić można tylko zadanie zakończone błędem')
+        return redirect('job-details', pk=job.pk)
+
+
+class JobDownloadView(LoginRequiredMixin, View):
+    """
+    File made by the job: export, zip of report cards or errors of an import.
+    """
+    login_url = '/'
+    redirect_field_name = 'index'
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        if not job.output:
+            raise Http404('Zadanie nie utworzyło pliku')
+        return FileResponse(job.output.open('rb'), as_attachment=True, filename=job.output.name.rsplit('/', 1)[-1])
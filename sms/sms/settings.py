@@ -35,10 +35,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'main_app',
 ]
 
 MIDDLEWARE = [
+    'main_app.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +83,47 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Model version stamps (main_app.versioning) behind API ETags and cached pages live here, so every worker process
+# has to see the same cache: files on disk are shared by all processes of one machine, with more machines use
+# RedisCache or PyMemcacheCache. LocMemCache is per process and refused when DEBUG is off.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('SMS_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('SMS_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('SMS_CACHE_MAX_ENTRIES', 5000))},
+    }
+}
+
+# Lists and class details are cached until data shown on them changes (main_app.page_cache), keys contain
+# model version stamps so entries are never invalidated, only expire after this many seconds; 0 turns it off.
+# Off by default with a per-process cache, where one process would not see changes made by another.
+# Hit/miss counters: 'manage.py page_cache_stats'
+
+PAGE_CACHE_TIMEOUT = int(os.environ.get(
+    'SMS_PAGE_CACHE_TIMEOUT', 0 if CACHES['default']['BACKEND'].endswith('.LocMemCache') else 3600))
+
+# Sessions and authentication
+# cached_db keeps sessions in the cache with the database as a fallback, signed_cookies needs no storage at all
+# (then logout cannot revoke a copied cookie). Users are kept in the cache above for AUTH_USER_CACHE_TIMEOUT
+# seconds (main_app.auth.CachedModelBackend), 0 reads auth_user on every request.
+
+SESSION_ENGINE = os.environ.get('SMS_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+AUTHENTICATION_BACKENDS = ['main_app.auth.CachedModelBackend']
+
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('SMS_AUTH_USER_CACHE_TIMEOUT', 30))
+
+# Login attempts allowed before hashing the password, per client ip and per username: (burst, refill per minute).
+# Buckets live in the cache above, use a shared backend to limit all worker processes together.
+
+LOGIN_THROTTLE = {
+    'ip': (30, 30),
+    'username': (5, 5),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -119,9 +162,68 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# Files of background jobs (uploaded rosters, exports, report cards), served only through job views.
+# Web servers and workers have to share this directory.
+
+MEDIA_ROOT = os.environ.get('SMS_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login/'
+
+# Keyset pagination of list views, can be changed per request with ?page_size=
+
+LIST_PAGE_SIZE = 50
+
+LIST_MAX_PAGE_SIZE = 200
+
+
+# Dashboard counters, missing counters are seeded from PostgreSQL planner estimate instead of COUNT(*)
+# Run 'manage.py reconcile_counters' periodically (e.g. from cron) to fix drift
+
+COUNTER_USE_ESTIMATE = True
+
+
+# Request profiling (main_app.middleware.ProfilingMiddleware): fraction of requests which get Server-Timing
+# header and a json log line with SQL, template and view times, 0 turns it off
+
+PROFILING_SAMPLE_RATE = float(os.environ.get('SMS_PROFILING_SAMPLE_RATE', 0.05))
+
+# Query shapes executed at least this many times in one request are reported as duplicates (N+1)
+
+PROFILING_DUPLICATE_THRESHOLD = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'main_app.profiling': {
+            'handlers': ['console'],
+            'level': os.environ.get('SMS_PROFILING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# TrueType font with Polish characters used in PDF report cards, skipped when the file does not exist
+
+REPORT_CARD_FONT = os.environ.get('SMS_REPORT_CARD_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+# Last level of the school, classes with this number (e.g. 4A) graduate during the school year rollover
+
+SCHOOL_FINAL_GRADE = int(os.environ.get('SMS_SCHOOL_FINAL_GRADE', 4))
+
+# Background jobs (main_app.jobs): first retry of a failed job after JOB_RETRY_DELAY seconds, doubled with
+# every next attempt; a running job without heartbeat for JOB_STALE_TIMEOUT seconds lost its worker
+
+JOB_RETRY_DELAY = int(os.environ.get('SMS_JOB_RETRY_DELAY', 30))
+
+JOB_STALE_TIMEOUT = int(os.environ.get('SMS_JOB_STALE_TIMEOUT', 300))
@@ -19,10 +19,16 @@ from django.views.generic import RedirectView
 from django.templatetags.static import static
 
 
+from main_app.api import API_VERSION, ApiListView
+from main_app.async_views import AsyncBaseView, AsyncTeacherListView, AsyncStudentListView, \
+    AsyncSchoolClassListView, AsyncStudentDetailsView, AsyncStudentClassDetailsView
 from main_app.views import LoginView, LogoutView, BaseView, TeacherListView, TeacherFormView, StudentListView, \
     StudentFormView, StudentDetailsView, SchoolClassFormView, SchoolClassListView, SchoolClassModify, \
     StudentClassDetailsView, SubjectFormView, create_user, change_password, DeleteStudentView, DeleteTeacherView, \
-    AddTopicToSubject, GradesFormView, StudentTopicGradeSubjectView
+    AddTopicToSubject, GradesFormView, StudentTopicGradeSubjectView, RosterImportView, \
+    ExportView, RollCallView, AttendanceReportView, SearchView, GradebookView, RolloverView, \
+    ClassGradesView, ArchivedStudentListView, ArchivedStudentDetailsView, ReportCardsView, JobListView, \
+    JobDetailsView, JobStatusView, JobRetryView, JobDownloadView
 
 
 
@@ -32,6 +38,7 @@ urlpatterns = [
     path('', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('index/', BaseView.as_view(), name='index'),
+    path('search/', SearchView.as_view(), name='search'),
     path('new_user/', create_user, name='new-user'),
     path('change_password/', change_password, name='change-password'),
     path('teacher/list', TeacherListView.as_view(), name='teacher-list'),
@@ -42,13 +49,35 @@ urlpatterns = [
     path('student/add', StudentFormView.as_view(), name='student-add'),
     path('student/delete/<int:pk>', DeleteStudentView.as_view(template_name='student_confirm_delete.html'),
          name='student-delete'),
+    path('student/import', RosterImportView.as_view(), name='roster-import'),
     path('student/<int:student_id>', StudentDetailsView.as_view(), name='student-details'),
+    path('archive/', ArchivedStudentListView.as_view(), name='archive-list'),
+    path('archive/<int:pk>', ArchivedStudentDetailsView.as_view(), name='archive-details'),
     path('class/add', SchoolClassFormView.as_view(), name='class-add'),
     path('class/list', SchoolClassListView.as_view(), name='class-list'),
     path('class/edit/<int:pk>', SchoolClassModify.as_view(template_name='school_class_update_form.html'), name='class-modify'),
+    path('class/rollover', RolloverView.as_view(), name='class-rollover'),
     path('class/details/<int:class_id>', StudentClassDetailsView.as_view(), name='class-details'),
+    path('class/<int:class_id>/attendance', RollCallView.as_view(), name='roll-call'),
+    path('class/<int:class_id>/gradebook', GradebookView.as_view(), name='gradebook'),
+    path('class/<int:class_id>/grades/add', ClassGradesView.as_view(), name='class-grades'),
+    path('report-cards/', ReportCardsView.as_view(), name='report-cards'),
+    path('jobs/', JobListView.as_view(), name='job-list'),
+    path('jobs/<int:pk>', JobDetailsView.as_view(), name='job-details'),
+    path('jobs/<int:pk>/status', JobStatusView.as_view(), name='job-status'),
+    path('jobs/<int:pk>/retry', JobRetryView.as_view(), name='job-retry'),
+    path('jobs/<int:pk>/download', JobDownloadView.as_view(), name='job-download'),
+    path('attendance/report', AttendanceReportView.as_view(), name='attendance-report'),
     path('subject/add', SubjectFormView.as_view(), name='subject-add'),
     path('topcic/add', AddTopicToSubject.as_view(), name='topic-add'),
     path('grades/add', GradesFormView.as_view(), name='grades-add'),
     path('grades/subject/list', StudentTopicGradeSubjectView.as_view(), name='grades-list'),
+    path('export/<str:kind>', ExportView.as_view(), name='export'),
+    path(f'api/{API_VERSION}/<str:resource>', ApiListView.as_view(), name='api-list'),
+    path('async/index/', AsyncBaseView.as_view(), name='async-index'),
+    path('async/teacher/list', AsyncTeacherListView.as_view(), name='async-teacher-list'),
+    path('async/student/list', AsyncStudentListView.as_view(), name='async-student-list'),
+    path('async/student/<int:student_id>', AsyncStudentDetailsView.as_view(), name='async-student-details'),
+    path('async/class/list', AsyncSchoolClassListView.as_view(), name='async-class-list'),
+    path('async/class/details/<int:class_id>', AsyncStudentClassDetailsView.as_view(), name='async-class-details'),
 ]